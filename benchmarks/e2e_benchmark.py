@@ -0,0 +1,465 @@
+"""
+Сквозной бенчмарк обработчиков бота на синтетических обновлениях Telegram.
+
+Обновления проходят через Application.process_update (те же обработчики,
+что и в боте) с подмененным транспортом Bot API и локальной БД; LLM -
+заглушка llm_stub_server.py в том же процессе или сервер из --llm-url.
+Для каждого сценария (создание, удаление, просмотр расписания, цель,
+ежедневное расписание) считаются p50/p95/p99 задержки и сообщений в
+секунду. Результат сохраняется в JSON, чтобы сравнивать версии.
+
+Запуск:
+    python benchmarks/e2e_benchmark.py --users 200 --messages 10 --concurrency 32
+    python benchmarks/e2e_benchmark.py --llm-latency extract=lognormal:5.5:0.4 \\
+        --baseline benchmarks/results/e2e_20260101_120000_abc1234.json
+
+Бенчмарк создает пользователей с ID от --user-base и удаляет их вместе с
+событиями в конце прогона.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from http import HTTPStatus
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+TOPICS = [
+    "встреча", "созвон", "тренировка", "обед", "ужин", "прогулка", "консультация", "репетиция",
+    "экскурсия", "лекция", "собеседование", "планерка", "семинар", "примерка", "поездка",
+]
+PEOPLE = [
+    "с Анной", "с Борисом", "с Вероникой", "с Григорием", "с Дарьей", "с Евгением", "с Жанной",
+    "с Захаром", "с Ириной", "с Кириллом", "с Людмилой", "с Максимом", "с Натальей", "с Олегом",
+    "с Полиной", "с Романом", "с Светланой", "с Тимуром", "с Ульяной", "с Федором",
+]
+MONTHS = [
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря",
+]
+GOALS = [
+    "Выучить испанский язык за три месяца",
+    "Пробежать полумарафон через два месяца",
+    "Прочитать двенадцать книг за год",
+    "Научиться играть на гитаре за полгода",
+]
+# Ответы обработчиков, означающие ошибку
+ERROR_MARKERS = ("⚠️", "❌", "Извините")
+
+
+class FakeBotAPI:
+    """Ответы Bot API без обращения к Telegram: сообщения запоминаются по чатам"""
+
+    BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+    def __init__(self):
+        self.calls = {}
+        self.last_reply = {}
+        self._message_id = 0
+
+    def handle(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return self.BOT_USER
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params["chat_id"])
+            self.last_reply[chat_id] = params
+            self._message_id += 1
+            return {
+                "message_id": params.get("message_id", self._message_id),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": self.BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return True
+
+
+def create_request(api: FakeBotAPI):
+    from telegram.request import BaseRequest
+
+    class FakeRequest(BaseRequest):
+        """HTTP-транспорт PTB, отвечающий через FakeBotAPI"""
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                             connect_timeout=None, pool_timeout=None):
+            params = request_data.json_parameters if request_data else {}
+            result = api.handle(url.rsplit("/", 1)[-1], params)
+            return HTTPStatus.OK, json.dumps({"ok": True, "result": result}).encode()
+
+    return FakeRequest()
+
+
+class PathStats:
+    """Задержки и ошибки одного сценария"""
+
+    def __init__(self):
+        self.latencies = []
+        self.updates = 0
+        self.errors = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def summary(self) -> dict:
+        wall = (self.finished_at - self.started_at) if self.started_at else 0.0
+        result = {
+            "count": len(self.latencies),
+            "updates": self.updates,
+            "errors": self.errors,
+            "wall_seconds": round(wall, 3),
+            "messages_per_second": round(self.updates / wall, 1) if wall else 0.0,
+        }
+        if len(self.latencies) >= 2:
+            percentiles = statistics.quantiles(self.latencies, n=100, method="inclusive")
+            result.update({
+                "p50_ms": round(percentiles[49] * 1000, 2),
+                "p95_ms": round(percentiles[94] * 1000, 2),
+                "p99_ms": round(percentiles[98] * 1000, 2),
+                "mean_ms": round(statistics.fmean(self.latencies) * 1000, 2),
+                "max_ms": round(max(self.latencies) * 1000, 2),
+            })
+        return result
+
+
+class Benchmark:
+    def __init__(self, args, application, api: FakeBotAPI):
+        self.args = args
+        self.application = application
+        self.api = api
+        self.rng = random.Random(args.seed)
+        self.user_ids = [args.user_base + index for index in range(args.users)]
+        # Созданные события пользователя (описания) - их удаляет сценарий delete
+        self.created = {user_id: [] for user_id in self.user_ids}
+        self.paths = {}
+        self._update_id = 0
+
+    # --- Синтетические обновления ---
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Bench{user_id}", "username": f"bench{user_id}"}
+
+    def _message(self, user_id: int, text: str) -> dict:
+        self._update_id += 1
+        message = {
+            "message_id": self._update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": self._update_id, "message": message}
+
+    def _callback(self, user_id: int, data: str) -> dict:
+        self._update_id += 1
+        return {
+            "update_id": self._update_id,
+            "callback_query": {
+                "id": str(self._update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": self._update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": FakeBotAPI.BOT_USER,
+                    "text": "📅 Ваше расписание",
+                },
+            },
+        }
+
+    async def send(self, payload: dict) -> dict:
+        """Обрабатывает обновление и возвращает последний ответ бота в чат"""
+        from telegram import Update
+
+        update = Update.de_json(payload, self.application.bot)
+        chat_id = update.effective_chat.id
+        self.api.last_reply.pop(chat_id, None)
+        await self.application.process_update(update)
+        return self.api.last_reply.get(chat_id) or {}
+
+    # --- Сценарии ---
+
+    def _stats(self, name: str) -> PathStats:
+        return self.paths.setdefault(name, PathStats())
+
+    async def _timed(self, name: str, payloads: list) -> dict:
+        """Отправляет обновления одного действия подряд и записывает общую задержку"""
+        stats = self._stats(name)
+        reply = {}
+        started = time.perf_counter()
+        for payload in payloads:
+            reply = await self.send(payload)
+            stats.updates += 1
+            if str(reply.get("text", "")).startswith(ERROR_MARKERS):
+                stats.errors += 1
+        stats.latencies.append(time.perf_counter() - started)
+        return reply
+
+    async def run_phase(self, names: list, user_scenario):
+        """Запускает сценарий для всех пользователей с ограничением параллельности"""
+        slots = asyncio.Semaphore(self.args.concurrency)
+
+        async def run_user(user_id: int):
+            async with slots:
+                await user_scenario(user_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user_id) for user_id in self.user_ids))
+        finished = time.perf_counter()
+        for name in names:
+            stats = self._stats(name)
+            stats.started_at, stats.finished_at = started, finished
+
+    async def create_events(self, user_id: int):
+        today = date.today()
+        combinations = [(topic, person) for topic in TOPICS for person in PEOPLE]
+        self.rng.shuffle(combinations)
+        for topic, person in combinations[:self.args.messages]:
+            description = f"{topic} {person}"
+            if self.rng.random() < self.args.llm_share:
+                # Фраза без даты и времени - уходит в LLM
+                text = f"надо бы как-нибудь {description}"
+                path = "create_llm"
+            else:
+                day = today + timedelta(days=self.rng.randint(0, 30))
+                text = (
+                    f"{description} {day.day} {MONTHS[day.month - 1]} "
+                    f"в {self.rng.randint(8, 21)}:{self.rng.choice(('00', '15', '30', '45'))}"
+                )
+                path = "create"
+                self.created[user_id].append(description)
+            await self._timed(path, [self._message(user_id, text)])
+
+    async def view_schedule(self, user_id: int):
+        reply = await self._timed("schedule", [self._message(user_id, "Посмотреть расписание")])
+        for _ in range(self.args.pages):
+            # Вложенные объекты PTB передает в Bot API строкой JSON
+            markup = json.loads(reply.get("reply_markup") or "{}")
+            buttons = markup.get("inline_keyboard") or [[]]
+            next_data = [button["callback_data"] for button in buttons[0] if ":next:" in button["callback_data"]]
+            if not next_data:
+                break
+            reply = await self._timed("schedule_page", [self._callback(user_id, next_data[0])])
+
+    async def goal_flow(self, user_id: int):
+        # Задержка сценария - все три шага: /goal, текст цели, подтверждение плана
+        await self._timed("goal", [
+            self._message(user_id, "/goal"),
+            self._message(user_id, self.rng.choice(GOALS)),
+            self._message(user_id, "✅ Принять"),
+        ])
+
+    async def digest(self, user_id: int):
+        from scheduler import scheduler_instance
+
+        stats = self._stats("digest")
+        started = time.perf_counter()
+        await scheduler_instance.send_user_daily_schedule(user_id)
+        stats.latencies.append(time.perf_counter() - started)
+        stats.updates += 1
+
+    async def delete_events(self, user_id: int):
+        descriptions = self.created[user_id]
+        for description in descriptions[:max(1, len(descriptions) // 2)]:
+            await self._timed("delete", [self._message(user_id, f"удали {description}")])
+
+    async def digest_prerender(self):
+        """Ночная подготовка текстов расписания на сегодня для всех пользователей БД"""
+        from scheduler import scheduler_instance
+
+        stats = self._stats("digest_prerender")
+        stats.started_at = time.perf_counter()
+        await scheduler_instance.prerender_daily_digests(datetime.now().date())
+        stats.finished_at = time.perf_counter()
+        stats.latencies.append(stats.finished_at - stats.started_at)
+        stats.updates = 1
+
+    async def digest_broadcast(self):
+        """Рассылка ежедневного расписания всем пользователям БД одним проходом"""
+        from scheduler import scheduler_instance
+
+        stats = self._stats("digest_broadcast")
+        sent_before = self.api.calls.get("sendMessage", 0)
+        stats.started_at = time.perf_counter()
+        await scheduler_instance.send_daily_schedule()
+        stats.finished_at = time.perf_counter()
+        stats.latencies.append(stats.finished_at - stats.started_at)
+        stats.updates = self.api.calls.get("sendMessage", 0) - sent_before
+
+    async def run(self) -> dict:
+        phases = [
+            (["create", "create_llm"], self.create_events),
+            (["schedule", "schedule_page"], self.view_schedule),
+            (["goal"], self.goal_flow),
+            (["digest"], self.digest),
+            (["delete"], self.delete_events),
+        ]
+        for names, scenario in phases:
+            print(f"▶️ {', '.join(names)}...")
+            await self.run_phase(names, scenario)
+        if self.args.broadcast:
+            print("▶️ digest_prerender, digest_broadcast...")
+            await self.digest_prerender()
+            await self.digest_broadcast()
+        return {name: stats.summary() for name, stats in self.paths.items() if stats.latencies}
+
+
+def prepare_users(user_ids: list):
+    from database import db
+
+    cleanup_users(user_ids)
+    for user_id in user_ids:
+        db.user_exists(user_id, f"bench{user_id}")
+
+
+def cleanup_users(user_ids: list):
+    from database import db
+
+    with db.cursor() as cur:
+        for table in ("reminders", "daily_digests", "events", "goals", "users"):
+            cur.execute(f"DELETE FROM {table} WHERE user_id = ANY(%s)", (user_ids,))
+    for user_id in user_ids:
+        db.schedule_cache.invalidate(user_id)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(paths: dict, baseline: dict = None):
+    print(f"\n{'сценарий':<18}{'N':>7}{'ошибки':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'сообщ/с':>10}")
+    for name, summary in paths.items():
+        line = (
+            f"{name:<18}{summary['count']:>7}{summary['errors']:>8}{summary.get('p50_ms', '-'):>10}"
+            f"{summary.get('p95_ms', '-'):>10}{summary.get('p99_ms', '-'):>10}{summary['messages_per_second']:>10}"
+        )
+        previous = (baseline or {}).get(name)
+        if previous and previous.get("p95_ms") and summary.get("p95_ms"):
+            p95_change = (summary["p95_ms"] / previous["p95_ms"] - 1) * 100
+            rate_change = (
+                (summary["messages_per_second"] / previous["messages_per_second"] - 1) * 100
+                if previous["messages_per_second"] else 0.0
+            )
+            line += f"   p95 {p95_change:+.0f}%, сообщ/с {rate_change:+.0f}%"
+        print(line)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main_async(args, stub_port: int):
+    import uvicorn
+    from llm_stub_server import build_stub, create_app, parse_args as parse_stub_args
+    import main as bot
+
+    stub_server = None
+    if stub_port:
+        stub_args = ["--seed", str(args.seed)]
+        for latency in args.llm_latency:
+            stub_args += ["--latency", latency]
+        stub_server = uvicorn.Server(uvicorn.Config(
+            create_app(build_stub(parse_stub_args(stub_args))), host="127.0.0.1", port=stub_port, log_level="warning"
+        ))
+        stub_task = asyncio.create_task(stub_server.serve())
+        while not stub_server.started:
+            await asyncio.sleep(0.05)
+
+    api = FakeBotAPI()
+    application = bot.build_application(create_request(api))
+    benchmark = Benchmark(args, application, api)
+    prepare_users(benchmark.user_ids)
+    try:
+        async with application:
+            await application.post_init(application)
+            try:
+                paths = await benchmark.run()
+            finally:
+                cleanup_users(benchmark.user_ids)
+                await application.post_shutdown(application)
+    finally:
+        if stub_server:
+            stub_server.should_exit = True
+            await stub_task
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк обработчиков бота")
+    parser.add_argument("--users", type=int, default=100, help="Число синтетических пользователей")
+    parser.add_argument("--messages", type=int, default=10, help="Сообщений о событиях на пользователя")
+    parser.add_argument("--pages", type=int, default=2, help="Сколько раз листать расписание вперед")
+    parser.add_argument("--concurrency", type=int, default=32, help="Пользователей, отправляющих сообщения одновременно")
+    parser.add_argument("--llm-share", type=float, default=0.1, help="Доля сообщений, которые разбирает LLM")
+    parser.add_argument("--llm-url", help="Внешний LLM API (по умолчанию заглушка в том же процессе)")
+    parser.add_argument("--llm-latency", action="append", default=[], help="Задержка заглушки, как --latency в llm_stub_server.py")
+    parser.add_argument("--no-broadcast", dest="broadcast", action="store_false", help="Не замерять рассылку всем пользователям БД")
+    parser.add_argument("--user-base", type=int, default=990_000_000, help="Первый ID синтетического пользователя")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results"))
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Окружение задается до импорта config: состояние диалогов только в памяти,
+    # лимиты Telegram не замеряем, LLM - заглушка
+    os.environ.setdefault("STATE_BACKEND", "memory")
+    os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+    os.environ.setdefault("TELEGRAM_CHAT_RATE", "1000000")
+    stub_port = None
+    if args.llm_url:
+        os.environ["LLM_API_URL"] = args.llm_url
+    else:
+        stub_port = free_port()
+        os.environ["LLM_API_URL"] = f"http://127.0.0.1:{stub_port}/v1/chat/completions"
+
+    started_at = datetime.now()
+    paths = asyncio.run(main_async(args, stub_port))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["paths"]
+    print_report(paths, baseline)
+
+    commit = git_commit()
+    os.makedirs(args.output, exist_ok=True)
+    result_path = os.path.join(args.output, f"e2e_{started_at:%Y%m%d_%H%M%S}_{commit}.json")
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "started_at": started_at.isoformat(timespec="seconds"),
+            "commit": commit,
+            "parameters": vars(args),
+            "paths": paths,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Результаты сохранены: {result_path}")
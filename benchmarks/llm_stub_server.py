@@ -0,0 +1,240 @@
+"""
+Локальная замена LLM API (OpenAI-совместимый /v1/chat/completions) для
+нагрузочных тестов и замеров задержек без обращения к DeepSeek.
+
+Запуск:
+    python benchmarks/llm_stub_server.py --port 8080 --recordings benchmarks/llm_recordings.jsonl \\
+        --latency extract=lognormal:5.5:0.4 --latency plan=uniform:800:2000 --error-rate 0.01 --seed 1
+    LLM_API_URL=http://127.0.0.1:8080/v1/chat/completions python main.py
+
+Запись ответов настоящего API (запросы проксируются, ответы дописываются в файл):
+    python benchmarks/llm_stub_server.py --record --upstream https://api.deepseek.com/v1/chat/completions \\
+        --recordings benchmarks/llm_recordings.jsonl
+
+Запросы распознаются по промптам LLMClient: extract (extract_event_info),
+plan (generate_training_plan), reply (generate_human_response) и goal
+(is_meaningful_goal). Записанный ответ ищется по типу и ключу (текст
+сообщения, цель, описание события); если записи нет, ответ строится
+детерминированно на стороне заглушки.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from event_parser import FastEventParser
+
+KINDS = ("extract", "plan", "reply", "goal")
+
+# Признаки промптов LLMClient и извлечение ключа записи
+_EXTRACT_RE = re.compile(r'извлекай информацию о событии\. Текст: "(.*?)"\s*\n', re.S)
+_PLAN_RE = re.compile(r"Пользователь поставил себе цель: '(.*?)'\.", re.S)
+_GOAL_RE = re.compile(r'Ты - фильтр целей.*?Цель: "(.*?)"', re.S)
+_REPLY_RE = re.compile(r"Ты только что успешно.*?- Описание: (.*?)\n", re.S)
+
+
+def classify(messages: list) -> tuple:
+    """Возвращает (тип запроса, ключ записи) по промпту"""
+    prompt = "\n".join(message.get("content", "") for message in messages)
+    for kind, pattern in (("extract", _EXTRACT_RE), ("plan", _PLAN_RE), ("goal", _GOAL_RE), ("reply", _REPLY_RE)):
+        match = pattern.search(prompt)
+        if match:
+            return kind, match.group(1).strip()
+    return "unknown", prompt[:200]
+
+
+def parse_latency(spec: str):
+    """Распределение задержки в миллисекундах.
+
+    fixed:MS, uniform:MIN:MAX, normal:MEAN:STD, lognormal:MU:SIGMA (параметры
+    логарифма миллисекунд, например lognormal:5.5:0.4 - медиана ~245 мс).
+    """
+    name, *params = spec.split(":")
+    values = [float(value) for value in params]
+    if name == "fixed":
+        return lambda rng: values[0]
+    if name == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if name == "lognormal":
+        return lambda rng: rng.lognormvariate(values[0], values[1])
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+class StubLLM:
+    """Ответы заглушки: записи, синтетические ответы, задержки и ошибки"""
+
+    def __init__(self, recordings_path: str, latencies: dict, error_rate: float, error_statuses: list,
+                 seed: int = None, upstream: str = None):
+        self.recordings_path = recordings_path
+        self.latencies = latencies
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.rng = random.Random(seed)
+        self.upstream = upstream
+        self.parser = FastEventParser()
+        self.recordings = {}
+        self.stats = defaultdict(lambda: {"requests": 0, "replayed": 0, "synthesized": 0, "recorded": 0, "errors": 0})
+        self._http = None
+        self.load()
+
+    def load(self):
+        if not self.recordings_path or not os.path.exists(self.recordings_path):
+            return
+        with open(self.recordings_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.recordings[(entry["kind"], entry["key"])] = entry["response"]
+        print(f"✅ Загружено {len(self.recordings)} записанных ответов из {self.recordings_path}")
+
+    def save(self, kind: str, key: str, response: str):
+        self.recordings[(kind, key)] = response
+        if self.recordings_path:
+            with open(self.recordings_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"kind": kind, "key": key, "response": response}, ensure_ascii=False) + "\n")
+
+    def synthesize(self, kind: str, key: str) -> str:
+        """Детерминированный правдоподобный ответ для запроса без записи"""
+        today = datetime.now().date()
+        if kind == "extract":
+            result = self.parser.parse(key, today)
+            if result.event is None:
+                # Фраза, которую локальный разбор не понял: событие на сегодня в полдень
+                return json.dumps(
+                    {"date": today.isoformat(), "time": "12:00:00", "description": key, "priority": 2},
+                    ensure_ascii=False
+                )
+            return json.dumps(result.event.model_dump(exclude_none=True), ensure_ascii=False)
+        if kind == "plan":
+            steps = [
+                {"date": (today + timedelta(days=day + 1)).isoformat(), "description": f"Шаг {day + 1}: {key}"}
+                for day in range(10)
+            ]
+            return json.dumps(steps, ensure_ascii=False)
+        if kind == "goal":
+            return "ДА"
+        if kind == "reply":
+            return f"Готово, {key} в расписании. Хорошего дня!"
+        return "OK"
+
+    async def complete(self, payload: dict, headers: dict) -> tuple:
+        """Возвращает (HTTP-статус, текст ответа или None)"""
+        kind, key = classify(payload.get("messages", []))
+        stats = self.stats[kind]
+        stats["requests"] += 1
+
+        if self.upstream:
+            # Режим записи: ответ настоящего API без искусственных задержек и ошибок
+            if self._http is None:
+                self._http = httpx.AsyncClient(timeout=120)
+            response = await self._http.post(
+                self.upstream, json=payload, headers={"Authorization": headers.get("authorization", "")}
+            )
+            if response.status_code != 200:
+                stats["errors"] += 1
+                return response.status_code, None
+            content = response.json()["choices"][0]["message"]["content"]
+            self.save(kind, key, content)
+            stats["recorded"] += 1
+            return 200, content
+
+        latency = self.latencies.get(kind) or self.latencies.get("default")
+        if latency:
+            await asyncio.sleep(latency(self.rng) / 1000)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            stats["errors"] += 1
+            return self.rng.choice(self.error_statuses), None
+
+        content = self.recordings.get((kind, key))
+        if content is None:
+            content = self.synthesize(kind, key)
+            stats["synthesized"] += 1
+        else:
+            stats["replayed"] += 1
+        return 200, content
+
+
+def create_app(stub: StubLLM) -> Starlette:
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        status, content = await stub.complete(payload, request.headers)
+        if content is None:
+            return JSONResponse({"error": {"message": "stub error", "code": status}}, status_code=status)
+        return JSONResponse({
+            "id": f"stub-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        })
+
+    async def stats(request: Request):
+        return JSONResponse(dict(stub.stats))
+
+    return Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", stats, methods=["GET"]),
+    ])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная замена LLM API для бенчмарков")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--recordings", help="JSONL-файл записанных ответов")
+    parser.add_argument(
+        "--latency", action="append", default=[],
+        help="Задержка ТИП=РАСПРЕДЕЛЕНИЕ, тип: extract, plan, reply, goal или default "
+             "(например extract=lognormal:5.5:0.4)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля запросов, завершающихся ошибкой")
+    parser.add_argument("--error-statuses", default="500,503,429", help="HTTP-статусы ошибок через запятую")
+    parser.add_argument("--seed", type=int, help="Зерно генератора для повторяемых прогонов")
+    parser.add_argument("--record", action="store_true", help="Проксировать запросы в --upstream и записывать ответы")
+    parser.add_argument("--upstream", help="Адрес настоящего API для режима записи")
+    return parser.parse_args(argv)
+
+
+def build_stub(args) -> StubLLM:
+    latencies = {}
+    for item in args.latency:
+        kind, _, spec = item.partition("=")
+        if kind not in KINDS + ("default",):
+            raise ValueError(f"Неизвестный тип запроса: {kind}")
+        latencies[kind] = parse_latency(spec)
+    if args.record and not args.upstream:
+        raise ValueError("Для --record нужен --upstream")
+    return StubLLM(
+        args.recordings,
+        latencies,
+        args.error_rate,
+        [int(status) for status in args.error_statuses.split(",")],
+        seed=args.seed,
+        upstream=args.upstream if args.record else None,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    stub = build_stub(args)
+    print(f"🚀 Заглушка LLM: http://{args.host}:{args.port}/v1/chat/completions")
+    uvicorn.run(create_app(stub), host=args.host, port=args.port, log_level="warning")
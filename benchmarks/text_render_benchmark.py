@@ -0,0 +1,104 @@
+"""
+Микро-бенчмарк вывода расписания: стоимость одного события при рендеринге
+10 000 событий (очистка описания и сборка сообщения).
+
+Сравниваются прежняя реализация (шаблон компилируется при каждом вызове,
+диапазон - через re.sub с нескомпилированной строкой, конкатенация строк)
+и текущие text_processing.clean_description и daily_digest.format_daily_schedule.
+Сейчас очистка выполняется один раз при сохранении события (display_description),
+поэтому в рендеринг расписания передаются уже очищенные описания.
+
+Запуск:
+    python benchmarks/text_render_benchmark.py --events 10000 --repeat 20
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from daily_digest import format_daily_schedule
+from text_processing import clean_description, display_description
+
+DESCRIPTIONS = [
+    "встреча с командой", "в 10 созвон с клиентом", "10:00 - планерка", "с 9 до 11 утра тренировка",
+    "завтра в 9 зарядка", "обед", "с 14:30 до 16 семинар", "8.30 бег", "ужин с друзьями",
+    "позвонить маме", "в 19 кино", "купить продукты",
+]
+
+
+def legacy_clean(description: str) -> str:
+    """Очистка описания так, как она была в format_daily_schedule"""
+    time_prefix_re = re.compile(r"^\s*(в\s*)?([01]?\d|2[0-3])([:.]\d{2})?\s*[-—:]?\s*", re.IGNORECASE)
+    description = time_prefix_re.sub("", description).strip()
+    return re.sub(
+        r"^\s*с\s*\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*(до|–|-|—)\s*"
+        r"\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*",
+        "", description, flags=re.IGNORECASE
+    ).strip()
+
+
+def legacy_render(events: list) -> str:
+    """Прежний format_daily_schedule"""
+    message = "📅 Ваше расписание на сегодня:\n\n"
+    for event in events:
+        event_id, event_description, start_time, end_time, event_priority, is_all_day = event
+        if is_all_day:
+            event_time_str = "📅 Весь день"
+        else:
+            event_time_str = start_time.strftime("%H:%M")
+            event_description = legacy_clean(event_description)
+        message += f"• {event_time_str} - {event_description}\n"
+    message += "\nХорошего дня! 🚀"
+    return message
+
+
+def make_events(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    events = []
+    for event_id in range(count):
+        start = day + timedelta(minutes=rng.randrange(0, 24 * 60, 15))
+        is_all_day = rng.random() < 0.1
+        events.append((event_id, rng.choice(DESCRIPTIONS), start, None, 2, is_all_day))
+    return events
+
+
+def measure(func, argument, repeat: int) -> float:
+    """Лучшее время одного вызова из repeat"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(argument)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарк рендеринга расписания")
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.seed)
+    descriptions = [event[1] for event in events]
+
+    print(f"🧪 Рендеринг {args.events} событий (лучшее из {args.repeat})\n")
+    legacy = measure(lambda items: [legacy_clean(text) for text in items], descriptions, args.repeat)
+    current = measure(lambda items: [clean_description(text) for text in items], descriptions, args.repeat)
+    print(f"⏱ Очистка описания: было {legacy / args.events * 1e9:.0f} нс, стало {current / args.events * 1e9:.0f} нс на событие")
+
+    # Описания в том виде, в каком их возвращает БД (display_description)
+    stored = [event[:1] + (display_description(event[1], event[5]),) + event[2:] for event in events]
+    legacy = measure(legacy_render, events, args.repeat)
+    current = measure(format_daily_schedule, stored, args.repeat)
+    print(f"⏱ Ежедневное расписание: было {legacy / args.events * 1e9:.0f} нс, стало {current / args.events * 1e9:.0f} нс на событие")
+
+
+if __name__ == "__main__":
+    main()
@@ -120,7 +120,73 @@ def check_users_table():
     except Exception as e:
         print(f"Ошибка: {e}")
 
+# Частые запросы к events и индексы, которые они должны использовать
+# (дубликаты в save_event проверяет сам уникальный индекс через ON CONFLICT)
+HOT_QUERIES = [
+    ("get_user_events", "idx_events_user_start_id", """
+        SELECT event_id, COALESCE(display_description, description_event), start_time, end_time, priority_event, is_all_day
+        FROM events
+        WHERE user_id = %(user_id)s
+        AND (start_time IS NULL OR start_time BETWEEN %(day)s::timestamp AND %(day)s::timestamp + interval '1 day')
+        ORDER BY start_time NULLS LAST
+    """),
+    ("get_user_events_page", "idx_events_user_start_id", """
+        SELECT event_id, COALESCE(display_description, description_event), start_time, end_time, priority_event, is_all_day
+        FROM events
+        WHERE user_id = %(user_id)s
+        AND start_time BETWEEN %(day)s::timestamp AND %(day)s::timestamp + interval '365 days'
+        AND (is_all_day OR start_time >= %(day)s::timestamp)
+        AND (start_time, event_id) > (%(day)s::timestamp, 0)
+        ORDER BY start_time, event_id
+        LIMIT 16
+    """),
+    ("check_event_exists / delete_event", "idx_events_user_start_date", """
+        SELECT COUNT(*) FROM events
+        WHERE user_id = %(user_id)s AND description_event ILIKE '%%тест%%' AND start_time::date = %(day)s::date
+    """),
+]
+
+def check_query_plans():
+    """Проверяет через EXPLAIN, что частые запросы используют индексы"""
+    try:
+        conn = psycopg2.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            dbname=Config.DB_NAME,
+            user=Config.DB_USER,
+            password=Config.DB_PASSWORD
+        )
+        
+        cur = conn.cursor()
+        
+        # На маленькой таблице планировщик предпочтет полный просмотр -
+        # запрещаем его, чтобы проверить, что индекс вообще применим
+        cur.execute("SET enable_seqscan = off")
+        cur.execute("SELECT user_id FROM events LIMIT 1")
+        row = cur.fetchone()
+        params = {"user_id": row[0] if row else 0, "day": "2025-01-01"}
+        
+        print("\nПланы частых запросов:")
+        all_ok = True
+        for name, index_name, query in HOT_QUERIES:
+            cur.execute("EXPLAIN " + query, params)
+            plan = "\n".join(line[0] for line in cur.fetchall())
+            uses_index = index_name in plan
+            all_ok = all_ok and uses_index
+            print(f"  {'✅' if uses_index else '❌'} {name}: {index_name}")
+            if not uses_index:
+                print("     " + plan.replace("\n", "\n     "))
+        
+        cur.close()
+        conn.close()
+        return all_ok
+        
+    except Exception as e:
+        print(f"Ошибка: {e}")
+        return False
+
 if __name__ == "__main__":
     check_events_table()
     check_goals_table()
-    check_users_table()
\ No newline at end of file
+    check_users_table()
+    check_query_plans()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 from urllib.parse import urlparse
@@ -9,6 +10,32 @@ class Config:
     # TelegramGBIB YF HECCRJV
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+    # Прием обновлений: с WEBHOOK_URL (публичный адрес сервиса) - webhook, без него - polling
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+    # Секрет, который Telegram присылает в заголовке; по умолчанию выводится из токена,
+    # чтобы у всех реплик за балансировщиком он совпадал
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(
+        (TELEGRAM_BOT_TOKEN or "").encode()
+    ).hexdigest()
+    # HTTP-сервер (webhook, health check и метрики)
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    PORT = int(os.getenv("PORT", 8000))
+    # Обновления разных чатов обрабатываются параллельно (внутри чата - по порядку):
+    # одновременно выполняемых и всего принятых в обработку
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 32))
+    UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", 1024))
+
+    # Хранилище состояния диалогов (user_data): postgres, sqlite или memory (только в памяти)
+    STATE_BACKEND = os.getenv("STATE_BACKEND", "postgres")
+    STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "conversation_state.db")
+    # Брошенные диалоги (без изменений дольше STATE_TTL секунд) забываются
+    STATE_TTL = float(os.getenv("STATE_TTL", 7 * 86400))
+    # Как часто (в секундах) измененные состояния записываются пакетом
+    STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", 5))
+    # Перечитывать состояние перед каждым обновлением (несколько реплик бота)
+    STATE_SHARED = os.getenv("STATE_SHARED", "false").lower() in ("1", "true", "yes")
+
     # Database
     DATABASE_URL = os.getenv("DATABASE_URL")
     
@@ -28,12 +55,75 @@ class Config:
         DB_USER = os.getenv("DB_USER")
         DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+    # Пул соединений с базой данных (простаивающие соединения сверх DB_POOL_MIN закрываются)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 5))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+    # Простаивающее дольше этого (в секундах) соединение проверяется перед выдачей
+    DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", 30))
+    # Кэш предстоящих событий пользователей: всего событий в памяти, срок жизни (сек) и окно (дней)
+    SCHEDULE_CACHE_MAX_EVENTS = int(os.getenv("SCHEDULE_CACHE_MAX_EVENTS", 100000))
+    SCHEDULE_CACHE_TTL = float(os.getenv("SCHEDULE_CACHE_TTL", 300))
+    SCHEDULE_CACHE_DAYS = int(os.getenv("SCHEDULE_CACHE_DAYS", 365))
+    # Пользователи с большим числом событий в окне не кэшируются - их страницы читаются из БД
+    SCHEDULE_CACHE_MAX_USER_EVENTS = int(os.getenv("SCHEDULE_CACHE_MAX_USER_EVENTS", 1000))
+    # Кэш сбрасывается только записями своего процесса: при нескольких репликах
+    # (STATE_SHARED) по умолчанию выключен, иначе расписание устаревает до SCHEDULE_CACHE_TTL
+    SCHEDULE_CACHE_ENABLED = os.getenv(
+        "SCHEDULE_CACHE_ENABLED", "false" if STATE_SHARED else "true"
+    ).lower() in ("1", "true", "yes")
+    # Событий на одной странице расписания
+    SCHEDULE_PAGE_SIZE = int(os.getenv("SCHEDULE_PAGE_SIZE", 15))
+
     # LLM Service
     LLM_API_KEY = os.getenv("LLM_API_KEY")
     LLM_API_URL = os.getenv(
         "LLM_API_URL", "https://api.deepseek.com/v1/chat/completions"
     )
     LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-chat")
+    # Пул HTTP-соединений к LLM (keep-alive, общий для всех запросов)
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+    # Минимальная уверенность быстрого локального разбора, при которой LLM не вызывается
+    FAST_PARSE_MIN_CONFIDENCE = float(os.getenv("FAST_PARSE_MIN_CONFIDENCE", 0.8))
+    # Кэш ответов LLM для извлечения событий (путь к файлу - для сохранения между перезапусками)
+    LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 5000))
+    LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 86400))
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+    # Формулировать подтверждения через LLM (по умолчанию - локальные шаблоны)
+    LLM_HUMAN_RESPONSES = os.getenv("LLM_HUMAN_RESPONSES", "false").lower() in ("1", "true", "yes")
 
     # Настройки планировщика уведомлений
     TIMEZONE = os.getenv("TIMEZONE", "Europe/Moscow")
+    # Сколько секунд после назначенного времени напоминание еще стоит отправить
+    REMINDER_GRACE_SECONDS = int(os.getenv("REMINDER_GRACE_SECONDS", 1800))
+    # Напоминания, наступающие в пределах одного тика, отправляются одной пачкой
+    REMINDER_TICK_SECONDS = float(os.getenv("REMINDER_TICK_SECONDS", 1))
+    # Через сколько секунд повторить напоминание, не отправленное из-за сбоя сети или flood control
+    REMINDER_RETRY_SECONDS = float(os.getenv("REMINDER_RETRY_SECONDS", 30))
+
+    # Несколько реплик бота: ID реплики (по умолчанию хост и PID), период отметки о том,
+    # что реплика жива, и срок, после которого молчащая реплика считается остановленной
+    REPLICA_ID = os.getenv("REPLICA_ID")
+    REPLICA_HEARTBEAT_SECONDS = float(os.getenv("REPLICA_HEARTBEAT_SECONDS", 10))
+    REPLICA_TTL_SECONDS = float(os.getenv("REPLICA_TTL_SECONDS", 30))
+
+    # Рассылка ежедневного расписания: пользователей в порции чтения из БД и одновременных отправок
+    DIGEST_BATCH_SIZE = int(os.getenv("DIGEST_BATCH_SIZE", 500))
+    DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", 30))
+    # Час рассылки ежедневного расписания и час ночной подготовки текстов на следующий
+    # день - по местному времени пользователя (users.timezone, по умолчанию TIMEZONE)
+    DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", 10))
+    DIGEST_PRERENDER_HOUR = int(os.getenv("DIGEST_PRERENDER_HOUR", 3))
+
+    # Заполнение описаний для вывода у событий, созданных до миграции 8: строк за транзакцию
+    DISPLAY_BACKFILL_BATCH = int(os.getenv("DISPLAY_BACKFILL_BATCH", 1000))
+
+    # Лимиты Telegram: сообщений в секунду всего и в один чат
+    TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+    TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+    # Сколько сообщений подряд можно отправить в чат без ожидания (ответ из нескольких сообщений)
+    TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 3))
+    # Повторов отправки после RetryAfter, прежде чем считать сообщение неотправленным
+    TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from telegram.ext import BasePersistence, PersistenceInput
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def dump_state(data: dict) -> str:
+    """Компактная сериализация user_data (планы, описания, флаги ожидания)"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class PostgresStateStore:
+    """Хранилище состояния диалогов в таблице conversation_state (миграция 7).
+
+    Каждая запись увеличивает version строки - по нему реплики понимают,
+    что состояние изменил кто-то другой.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def load(self, since: datetime) -> Dict[int, Tuple[str, int]]:
+        with self.database.cursor() as cur:
+            cur.execute(
+                "SELECT user_id, data, version FROM conversation_state WHERE updated_at >= %s", (since,)
+            )
+            return {user_id: (data, version) for user_id, data, version in cur.fetchall()}
+
+    def load_newer(self, user_id: int, version: int) -> Optional[Tuple[str, int]]:
+        with self.database.cursor() as cur:
+            cur.execute(
+                "SELECT data, version FROM conversation_state WHERE user_id = %s AND version > %s",
+                (user_id, version)
+            )
+            return cur.fetchone()
+
+    def save_many(self, items: Dict[int, str]) -> Dict[int, int]:
+        # Все состояния одним запросом: массивы разворачиваются через unnest
+        with self.database.cursor() as cur:
+            cur.execute("""
+                INSERT INTO conversation_state (user_id, data, version, updated_at)
+                SELECT user_id, data, 1, NOW() FROM unnest(%s::bigint[], %s::text[]) AS t(user_id, data)
+                ON CONFLICT (user_id) DO UPDATE
+                    SET data = EXCLUDED.data,
+                        version = conversation_state.version + 1,
+                        updated_at = EXCLUDED.updated_at
+                RETURNING user_id, version
+            """, (list(items), list(items.values())))
+            return dict(cur.fetchall())
+
+    def delete_many(self, user_ids: Iterable[int]):
+        with self.database.cursor() as cur:
+            cur.execute("DELETE FROM conversation_state WHERE user_id = ANY(%s)", (list(user_ids),))
+
+    def purge(self, older_than: datetime) -> int:
+        with self.database.cursor() as cur:
+            cur.execute("DELETE FROM conversation_state WHERE updated_at < %s", (older_than,))
+            return cur.rowcount
+
+
+class SQLiteStateStore:
+    """Хранилище состояния диалогов в локальном файле SQLite (для одного процесса)"""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_state (
+                    user_id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            """)
+
+    def load(self, since: datetime) -> Dict[int, Tuple[str, int]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, data, version FROM conversation_state WHERE updated_at >= ?",
+                (since.isoformat(sep=" "),)
+            ).fetchall()
+        return {user_id: (data, version) for user_id, data, version in rows}
+
+    def load_newer(self, user_id: int, version: int) -> Optional[Tuple[str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT data, version FROM conversation_state WHERE user_id = ? AND version > ?",
+                (user_id, version)
+            ).fetchone()
+
+    def save_many(self, items: Dict[int, str]) -> Dict[int, int]:
+        now = datetime.now().isoformat(sep=" ")
+        versions = {}
+        with self._lock, self._conn:
+            for user_id, data in items.items():
+                versions[user_id] = self._conn.execute("""
+                    INSERT INTO conversation_state (user_id, data, version, updated_at) VALUES (?, ?, 1, ?)
+                    ON CONFLICT (user_id) DO UPDATE
+                        SET data = excluded.data, version = version + 1, updated_at = excluded.updated_at
+                    RETURNING version
+                """, (user_id, data, now)).fetchone()[0]
+        return versions
+
+    def delete_many(self, user_ids: Iterable[int]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM conversation_state WHERE user_id = ?", [(user_id,) for user_id in user_ids]
+            )
+
+    def purge(self, older_than: datetime) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM conversation_state WHERE updated_at < ?", (older_than.isoformat(sep=" "),)
+            ).rowcount
+
+
+class ConversationPersistence(BasePersistence):
+    """Хранение context.user_data во внешнем хранилище с отложенной записью.
+
+    PTB раз в update_interval передает user_data измененных пользователей;
+    они копятся в буфере и записываются одним пакетом. Состояния, не
+    менявшиеся дольше ttl_seconds (брошенные диалоги), не загружаются и
+    удаляются. С shared=True перед каждым обновлением проверяется, не
+    записала ли другая реплика более новую версию состояния пользователя.
+    """
+
+    # Как часто удалять просроченные состояния, секунды
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, store, ttl_seconds: float, update_interval: float, shared: bool = False):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        # Отложенные записи: user_id -> user_data (None - удалить)
+        self._pending: Dict[int, Optional[dict]] = {}
+        # Версия состояния в хранилище, с которой совпадают данные в памяти
+        self._versions: Dict[int, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Пакеты пишутся строго по очереди, чтобы старое состояние не перезаписало новое
+        self._flush_lock = asyncio.Lock()
+        self._last_purge = 0.0
+        self.stats = {"flushes": 0, "written": 0, "deleted": 0, "purged": 0}
+
+    def _cutoff(self) -> datetime:
+        return datetime.now() - timedelta(seconds=self.ttl_seconds)
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        await self._purge_expired()
+        rows = await asyncio.to_thread(self.store.load, self._cutoff())
+        logger.info(f"✅ Загружено состояние диалогов для {len(rows)} пользователей")
+        self._versions = {user_id: version for user_id, (_, version) in rows.items()}
+        return {user_id: json.loads(data) for user_id, (data, _) in rows.items()}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # PTB передает копию данных, поэтому ее можно держать в буфере до записи
+        self._pending[user_id] = data
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending[user_id] = None
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # Свои незаписанные изменения новее, чем данные в хранилище
+        if not self.shared or user_id in self._pending:
+            return
+        row = await asyncio.to_thread(self.store.load_newer, user_id, self._versions.get(user_id, 0))
+        if row:
+            data, version = row
+            user_data.clear()
+            user_data.update(json.loads(data))
+            self._versions[user_id] = version
+
+    def _schedule_flush(self):
+        # PTB вызывает update_user_data для всех пользователей подряд через gather,
+        # поэтому запись, запланированная первым вызовом, заберет весь пакет
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения пакетами, пока буфер не опустеет"""
+        async with self._flush_lock:
+            while self._pending:
+                pending, self._pending = self._pending, {}
+                to_save = {user_id: dump_state(data) for user_id, data in pending.items() if data}
+                to_delete = [user_id for user_id, data in pending.items() if not data]
+                try:
+                    if to_save:
+                        self._versions.update(await asyncio.to_thread(self.store.save_many, to_save))
+                    if to_delete:
+                        await asyncio.to_thread(self.store.delete_many, to_delete)
+                        for user_id in to_delete:
+                            self._versions.pop(user_id, None)
+                except Exception as e:
+                    # Не теряем изменения: вернем их в буфер, если новее ничего не пришло
+                    for user_id, data in pending.items():
+                        self._pending.setdefault(user_id, data)
+                    logger.error(f"❌ Ошибка записи состояния диалогов: {e}")
+                    return
+
+                self.stats["flushes"] += 1
+                self.stats["written"] += len(to_save)
+                self.stats["deleted"] += len(to_delete)
+        await self._purge_expired()
+
+    async def _purge_expired(self):
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        try:
+            purged = await asyncio.to_thread(self.store.purge, self._cutoff())
+            self.stats["purged"] += purged
+            if purged:
+                logger.info(f"🧹 Удалено {purged} брошенных состояний диалогов")
+        except Exception as e:
+            logger.error(f"⚠️ Ошибка очистки состояния диалогов: {e}")
+
+    # Остальные данные PTB (bot_data, chat_data, callback_data, ConversationHandler) не храним
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+def create_persistence() -> Optional[ConversationPersistence]:
+    """Создает хранилище состояния по STATE_BACKEND (memory - только в памяти процесса)"""
+    backend = Config.STATE_BACKEND.lower()
+    if backend == "memory":
+        return None
+    if backend == "sqlite":
+        store = SQLiteStateStore(Config.STATE_SQLITE_PATH)
+    elif backend == "postgres":
+        from database import db
+        store = PostgresStateStore(db)
+    else:
+        raise ValueError(f"Неизвестное хранилище состояния диалогов: {Config.STATE_BACKEND}")
+    return ConversationPersistence(store, Config.STATE_TTL, Config.STATE_FLUSH_INTERVAL, Config.STATE_SHARED)
+
+
+# Глобальный экземпляр
+conversation_persistence = create_persistence()
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Awaitable, Callable, List, Tuple
+from config import Config
+from database import db
+from metrics import REPLICAS, REPLICA_LEADER
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Аренда лидера: задания по расписанию (рассылка и подготовка ежедневного расписания)
+LEADER_LEASE = "scheduler"
+
+
+class Coordinator:
+    """Координация нескольких реплик бота через Postgres.
+
+    Каждая реплика раз в heartbeat_seconds отмечается в таблице replicas и
+    пытается взять или продлить аренду лидера в таблице leases. Лидер -
+    единственный, кто выполняет задания по расписанию. Напоминания делятся
+    между живыми репликами по user_id % число реплик (номер реплики - ее
+    позиция в отсортированном списке); когда реплика появляется или
+    пропадает дольше чем на ttl_seconds, состав меняется, и каждая реплика
+    перечитывает свою часть. Окна, когда две реплики считают пользователя
+    своим, закрывает захват напоминания в БД перед отправкой.
+    """
+
+    def __init__(self, replica_id: str, heartbeat_seconds: float, ttl_seconds: float):
+        self.replica_id = replica_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.ttl_seconds = ttl_seconds
+        # Пока не было отметки, реплика считает себя единственной, но не лидером
+        self.replicas: List[str] = [replica_id]
+        self._leader_until = 0.0
+        self.stats = {"heartbeats": 0, "rebalances": 0, "errors": 0, "leader_changes": 0}
+        REPLICAS.set_function(lambda: len(self.replicas))
+        REPLICA_LEADER.set_function(lambda: int(self.is_leader))
+
+    @property
+    def is_leader(self) -> bool:
+        """Аренда лидера у этой реплики и еще не могла истечь"""
+        return time.monotonic() < self._leader_until
+
+    @property
+    def partition(self) -> Tuple[int, int]:
+        """(номер реплики, число реплик) для деления напоминаний"""
+        return self.replicas.index(self.replica_id), len(self.replicas)
+
+    def owns(self, user_id: int) -> bool:
+        """Напоминания пользователя отправляет эта реплика"""
+        index, count = self.partition
+        return user_id % count == index
+
+    def heartbeat(self) -> bool:
+        """Отмечает реплику живой и продлевает аренду лидера. True - состав реплик изменился"""
+        started = time.monotonic()
+        replicas = db.heartbeat_replica(self.replica_id, self.ttl_seconds)
+        if self.replica_id not in replicas:
+            replicas = sorted(replicas + [self.replica_id])
+
+        was_leader = self.is_leader
+        if db.acquire_lease(LEADER_LEASE, self.replica_id, self.ttl_seconds):
+            # Локально считаем себя лидером с запасом в один период: аренда в БД
+            # истекает через ttl_seconds после продления
+            self._leader_until = started + self.ttl_seconds - self.heartbeat_seconds
+        else:
+            self._leader_until = 0.0
+        if was_leader != self.is_leader:
+            self.stats["leader_changes"] += 1
+            logger.info(f"👑 Реплика {self.replica_id} {'стала лидером' if self.is_leader else 'больше не лидер'}")
+
+        self.stats["heartbeats"] += 1
+        changed = replicas != self.replicas
+        if changed:
+            self.stats["rebalances"] += 1
+            logger.info(f"🔀 Состав реплик изменился: {replicas}")
+        self.replicas = replicas
+        return changed
+
+    async def run(self, on_heartbeat: Callable[[bool], Awaitable[None]]):
+        """Периодические отметки; on_heartbeat(rebalanced) вызывается после каждой успешной"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                rebalanced = await asyncio.to_thread(self.heartbeat)
+                await on_heartbeat(rebalanced)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Аренда лидера истечет сама: is_leader сравнивает с локальным сроком
+                self.stats["errors"] += 1
+                logger.error(f"❌ Ошибка координации реплик: {e}")
+
+    def stop(self):
+        """Освобождает аренду и место в списке реплик, чтобы остальные не ждали ttl_seconds"""
+        self._leader_until = 0.0
+        db.release_replica(self.replica_id)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "replica_id": self.replica_id,
+            "replicas": len(self.replicas),
+            "is_leader": self.is_leader,
+        }
+
+
+# Глобальный экземпляр
+coordinator = Coordinator(
+    Config.REPLICA_ID or f"{socket.gethostname()}:{os.getpid()}",
+    Config.REPLICA_HEARTBEAT_SECONDS,
+    Config.REPLICA_TTL_SECONDS,
+)
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set
+from zoneinfo import ZoneInfo, available_timezones
+
+# Рассылка идет сдвигами по 15 минут: все смещения от UTC кратны четверти часа
+SLOT_MINUTES = 15
+
+_zones: Dict[str, ZoneInfo] = {}
+
+
+def format_daily_schedule(events: list) -> str:
+    """Формирует текст ежедневного расписания"""
+    if not events:
+        # Нет событий на сегодня
+        return "📅 На сегодня у вас нет запланированных событий. Хорошего дня! 🌞"
+
+    # Описания уже очищены при сохранении (display_description) - только собираем строки
+    lines = ["📅 Ваше расписание на сегодня:\n"]
+    for event in events:
+        event_id, event_description, start_time, end_time, event_priority, is_all_day = event
+
+        if is_all_day:
+            event_time_str = "📅 Весь день"
+        else:
+            event_time_str = f"{start_time.hour:02d}:{start_time.minute:02d}"
+
+        lines.append(f"• {event_time_str} - {event_description}")
+
+    lines.append("\nХорошего дня! 🚀")
+    return "\n".join(lines)
+
+
+def digest_window(today: date = None) -> List[date]:
+    """Дни, для которых хранятся готовые расписания.
+
+    Местные "сегодня" и "завтра" пользователей в других часовых поясах
+    отстоят от даты сервера не больше чем на день: окно - со вчера по послезавтра.
+    """
+    today = today or datetime.now().date()
+    return [today + timedelta(days=offset) for offset in range(-1, 3)]
+
+
+def affected_days(start_times: Iterable[Optional[datetime]], today: date = None) -> Set[date]:
+    """Дни окна готовых расписаний, которые затрагивают события с указанным началом.
+
+    Событие без времени начала выводится в расписании любого дня.
+    """
+    window = digest_window(today)
+    days = set()
+    for start_time in start_times:
+        if start_time is None:
+            return set(window)
+        if start_time.date() in window:
+            days.add(start_time.date())
+    return days
+
+
+def is_valid_timezone(name: str) -> bool:
+    """Пояс из списка, по которому идет рассылка (ZoneInfo принимает и posixrules, right/UTC и т.п.)"""
+    return name in _all_zones()
+
+
+def _all_zones() -> Dict[str, ZoneInfo]:
+    if not _zones:
+        for name in available_timezones():
+            _zones[name] = ZoneInfo(name)
+    return _zones
+
+
+def current_slot(now: datetime = None) -> datetime:
+    """Начало текущего 15-минутного слота в UTC (запоздавший тик попадает в свой слот)"""
+    now = now or datetime.now(timezone.utc)
+    return now.replace(minute=now.minute - now.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+
+def zones_at_hour(hour: int, slot: datetime) -> Dict[date, List[str]]:
+    """Часовые пояса, в которых слот slot начинается в hour:00 по местному времени,
+    сгруппированные по местной дате.
+
+    Пояса со смещениями, различающимися на сутки (Pacific/Honolulu и
+    Pacific/Kiritimati), встречают один и тот же час в разные даты.
+    """
+    zones: Dict[date, List[str]] = {}
+    for name, zone in _all_zones().items():
+        local = slot.astimezone(zone)
+        if local.hour == hour and local.minute < SLOT_MINUTES:
+            zones.setdefault(local.date(), []).append(name)
+    return zones
+
+
+def zones_before_hour(hour: int, now: datetime = None) -> Dict[date, List[str]]:
+    """Часовые пояса, где сегодня еще не наступил hour:00, сгруппированные по местной дате"""
+    now = now or datetime.now(timezone.utc)
+    pending: Dict[date, List[str]] = {}
+    for name, zone in _all_zones().items():
+        local = now.astimezone(zone)
+        if local.hour < hour:
+            pending.setdefault(local.date(), []).append(name)
+    return pending
@@ -1,43 +1,79 @@
 import psycopg2
+from psycopg2 import pool
 from config import Config
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Optional, List, Tuple
 from models import EventConflict
+from migrations import apply_migrations, backfill_display_descriptions
+from schedule_cache import ScheduleCache
+from metrics import timed_query
+from text_processing import display_description
+from daily_digest import affected_days, digest_window, format_daily_schedule
+import asyncio
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Database:
     def __init__(self):
-        self.conn = None
+        self.pool = None
+        # Ограничивает число одновременно выданных соединений: ThreadedConnectionPool
+        # при исчерпании бросает ошибку, а нам нужно дождаться свободного соединения
+        self._pool_slots = threading.BoundedSemaphore(Config.DB_POOL_MAX)
+        # Время последнего использования соединений (id соединения -> time.monotonic())
+        self._last_used = {}
+        # Кэш предстоящих событий: чтение через get_user_events, сброс при записи
+        self.schedule_cache = ScheduleCache(
+            Config.SCHEDULE_CACHE_MAX_EVENTS,
+            Config.SCHEDULE_CACHE_TTL,
+            Config.SCHEDULE_CACHE_DAYS,
+            Config.SCHEDULE_CACHE_MAX_USER_EVENTS,
+            Config.SCHEDULE_CACHE_ENABLED
+        )
         self.connect()
         # Названия таблиц и колонок
         self.table_users = "users"
         self.table_events = "events"
         self.column_user_id = "user_id"
         self.column_name = "name"
+        self.column_timezone = "timezone"
         self.column_description = "description_event"
         self.column_start_time = "start_time"
         self.column_end_time = "end_time"
         self.column_is_all_day = "is_all_day"
         self.column_priority = "priority_event"
         self.column_status = "status"
+        self.column_display_description = "display_description"
+        # Описание для вывода: у строк, которые еще не заполнил backfill, - исходное
+        self.display_description = f"COALESCE({self.column_display_description}, {self.column_description})"
+        
+        self.table_reminders = "reminders"
+        self.table_daily_digests = "daily_digests"
         
         # Проверяем структуру таблицы
         self.check_table_structure()
+        self.run_migrations()
 
     def connect(self):
+        """Создает пул соединений с базой данных"""
         try:
             if Config.DATABASE_URL:
                 # Подключение через строку подключения (для Render и других облачных платформ)
                 # Учитываем необходимость SSL для облачных баз данных
-                self.conn = psycopg2.connect(
+                self.pool = pool.ThreadedConnectionPool(
+                    Config.DB_POOL_MIN,
+                    Config.DB_POOL_MAX,
                     Config.DATABASE_URL,
                     sslmode='require'  # Для безопасности при подключении к облачным БД
                 )
             else:
                 # Подключение через отдельные параметры (для локальной разработки)
-                self.conn = psycopg2.connect(
+                self.pool = pool.ThreadedConnectionPool(
+                    Config.DB_POOL_MIN,
+                    Config.DB_POOL_MAX,
                     host=Config.DB_HOST,
                     port=Config.DB_PORT,
                     dbname=Config.DB_NAME,
@@ -45,11 +81,91 @@ class Database:
                     password=Config.DB_PASSWORD,
                     sslmode='prefer'  # Опциональное SSL-подключение для локальной разработки
                 )
-            logger.info("✅ Подключение к базе данных установлено успешно")
+            logger.info(f"✅ Пул соединений с базой данных создан (до {Config.DB_POOL_MAX} соединений)")
         except Exception as e:
             logger.error(f"❌ Ошибка подключения к базе данных: {e}")
             raise
 
+    def _is_healthy(self, conn) -> bool:
+        """Проверяет соединение: закрытые отбрасываем, давно простаивающие пингуем"""
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0)
+        if idle < Config.DB_HEALTHCHECK_INTERVAL:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _release(self, conn, broken: bool = False):
+        """Возвращает соединение в пул; разорванные соединения закрываются"""
+        broken = broken or conn.closed != 0
+        try:
+            self.pool.putconn(conn, close=broken)
+        finally:
+            self._pool_slots.release()
+        # Пул закрывает соединения сверх DB_POOL_MIN - их время больше не отслеживаем
+        if conn.closed:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+
+    @contextmanager
+    def connection(self):
+        """Выдает проверенное соединение из пула и возвращает его после использования"""
+        self._pool_slots.acquire()
+        try:
+            conn = self.pool.getconn()
+            # Соединение, разорванное сервером или сетью, заменяем новым
+            while not self._is_healthy(conn):
+                logger.warning("⚠️ Соединение с БД разорвано, переподключаемся")
+                self._last_used.pop(id(conn), None)
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+        except Exception:
+            self._pool_slots.release()
+            raise
+
+        broken = False
+        try:
+            yield conn
+        finally:
+            try:
+                # Незавершенная транзакция не должна попасть к следующему пользователю соединения
+                if not conn.closed:
+                    conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+            self._release(conn, broken)
+
+    @contextmanager
+    def cursor(self):
+        """Курсор в отдельной транзакции: фиксируется при успехе, откатывается при ошибке"""
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+            conn.commit()
+
+    @timed_query
+    def ping(self) -> bool:
+        """Проверяет доступность базы данных"""
+        try:
+            with self.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception as e:
+            logger.error(f"❌ База данных недоступна: {e}")
+            return False
+
+    def close(self):
+        """Закрывает все соединения пула"""
+        if self.pool is not None:
+            self.pool.closeall()
+
     def check_table_structure(self):
         """Проверяет структуру таблицы events"""
         try:
@@ -59,7 +175,7 @@ class Database:
             WHERE table_name = 'events'
             """
             
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query)
                 columns = cur.fetchall()
                 
@@ -70,6 +186,22 @@ class Database:
         except Exception as e:
             logger.error(f"❌ Ошибка проверки структуры таблицы: {e}")
 
+    def run_migrations(self):
+        """Применяет миграции схемы (таблицы и индексы)"""
+        try:
+            apply_migrations(self)
+        except Exception as e:
+            logger.error(f"❌ Ошибка применения миграций: {e}")
+            return
+        # Описания для вывода у старых событий заполняются в фоне порциями
+        threading.Thread(
+            target=backfill_display_descriptions,
+            args=(self, Config.DISPLAY_BACKFILL_BATCH),
+            name="display-backfill",
+            daemon=True,
+        ).start()
+
+    @timed_query
     def check_time_conflict(
         self, user_id: int, event_date: str, event_time: str, duration_minutes: int = 30
     ) -> EventConflict:
@@ -78,6 +210,7 @@ class Database:
         logger.info("⚠️ Проверка конфликтов времени отключена")
         return EventConflict(is_conflict=False)
 
+    @timed_query
     def save_event(
         self,
         user_id: int,
@@ -88,91 +221,257 @@ class Database:
         is_all_day: bool = False,
         goal_id: int = None
     ) -> int:
-        """Сохраняет событие в базу данных"""
+        """Сохраняет событие в базу данных.
+
+        Возвращает ID события или -1, если такое событие уже есть.
+        Дубликат определяется уникальным индексом (user_id, описание, начало)
+        в том же запросе, что и вставка. Описание для вывода в расписании
+        (без даты и времени в начале) вычисляется здесь один раз.
+        """
         try:
-            # Проверяем на дубликаты
-            if start_time:
-                duplicate_check = f"""
-                SELECT COUNT(*) FROM {self.table_events} 
-                WHERE {self.column_user_id} = %s 
-                AND {self.column_description} = %s 
-                AND {self.column_start_time} = %s
-                """
-                with self.conn.cursor() as cur:
-                    cur.execute(duplicate_check, (user_id, description, start_time))
-                    count = cur.fetchone()[0]
-                    if count > 0:
-                        logger.warning(f"⚠️ Дубликат события найден, пропускаем сохранение: {description}")
-                        return -1  # Возвращаем специальный код для дубликата
-            
             # Устанавливаем статус по умолчанию
             status = 'активно'
             
             query = f"""
             INSERT INTO {self.table_events} 
-            ({self.column_user_id}, goal_id, {self.column_description}, {self.column_start_time}, {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}, {self.column_status}) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ({self.column_user_id}, goal_id, {self.column_description}, {self.column_display_description}, {self.column_start_time}, {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}, {self.column_status}) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT ({self.column_user_id}, {self.column_description}, {self.column_start_time}) DO NOTHING
             RETURNING event_id
             """
 
             logger.info(f"💾 Сохраняем событие в БД: user_id={user_id}, description='{description}', "
                        f"start_time={start_time}, end_time={end_time}, priority={priority}, is_all_day={is_all_day}, status={status}")
 
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(
-                    query, (user_id, goal_id, description, start_time, end_time, priority, is_all_day, status)
+                    query, (
+                        user_id, goal_id, description, display_description(description, is_all_day),
+                        start_time, end_time, priority, is_all_day, status
+                    )
                 )
-                event_id = cur.fetchone()[0]
-                self.conn.commit()
+                row = cur.fetchone()
+
+            if row is None:
+                logger.warning(f"⚠️ Дубликат события найден, пропускаем сохранение: {description}")
+                return -1  # Возвращаем специальный код для дубликата
 
+            event_id = row[0]
+            self.schedule_cache.invalidate(user_id)
+            self.refresh_daily_digests(user_id, affected_days([start_time]))
             logger.info(f"✅ Событие успешно сохранено, ID: {event_id}")
             return event_id
             
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения события: {e}")
-            self.conn.rollback()
             raise
 
+    @timed_query
+    def save_events_bulk(
+        self, user_id: int, events: List[Tuple], goal_id: int = None
+    ) -> List[Optional[int]]:
+        """Сохраняет несколько событий одним запросом и одной транзакцией.
+
+        events - кортежи (описание, начало, конец, приоритет, на весь день).
+        Возвращает список той же длины: ID нового события или None, если такое
+        событие уже есть в базе или повторяется внутри пакета.
+        """
+        if not events:
+            return []
+
+        descriptions, start_times, end_times, priorities, all_day_flags = map(list, zip(*events))
+        display_descriptions = [
+            display_description(description, is_all_day)
+            for description, is_all_day in zip(descriptions, all_day_flags)
+        ]
+        # Строки пакета передаются массивами и разворачиваются через unnest;
+        # повторы внутри пакета отсекает DISTINCT ON, уже сохраненные - ON CONFLICT
+        query = f"""
+        WITH input AS (
+            SELECT * FROM unnest(%s::text[], %s::text[], %s::timestamp[], %s::timestamp[], %s::int[], %s::boolean[])
+                WITH ORDINALITY AS t(description, display, start_time, end_time, priority, is_all_day, ord)
+        ),
+        fresh AS (
+            SELECT DISTINCT ON (description, start_time) *
+            FROM input
+            ORDER BY description, start_time, ord
+        ),
+        inserted AS (
+            INSERT INTO {self.table_events}
+            ({self.column_user_id}, goal_id, {self.column_description}, {self.column_display_description}, {self.column_start_time}, {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}, {self.column_status})
+            SELECT %s, %s, description, display, start_time, end_time, priority, is_all_day, 'активно'
+            FROM fresh
+            ORDER BY ord
+            ON CONFLICT ({self.column_user_id}, {self.column_description}, {self.column_start_time}) DO NOTHING
+            RETURNING event_id, {self.column_description}, {self.column_start_time}
+        )
+        SELECT f.ord, ins.event_id
+        FROM fresh f
+        JOIN inserted ins
+            ON ins.{self.column_description} = f.description
+            AND ins.{self.column_start_time} IS NOT DISTINCT FROM f.start_time
+        """
+
+        try:
+            with self.cursor() as cur:
+                cur.execute(query, (
+                    descriptions, display_descriptions, start_times, end_times, priorities, all_day_flags,
+                    user_id, goal_id
+                ))
+                inserted = dict(cur.fetchall())
+
+            if inserted:
+                self.schedule_cache.invalidate(user_id)
+                self.refresh_daily_digests(
+                    user_id, affected_days(start_times[ord - 1] for ord in inserted)
+                )
+            event_ids = [inserted.get(ord) for ord in range(1, len(events) + 1)]
+            logger.info(f"✅ Пакетно сохранено {len(inserted)} из {len(events)} событий для пользователя {user_id}")
+            return event_ids
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного сохранения событий: {e}")
+            raise
+
+    @timed_query
     def get_user_events(
         self, user_id: int, start_date: datetime, end_date: datetime
     ) -> List[Tuple]:
-        """Получает события пользователя за период"""
+        """Получает события пользователя за период (предстоящие - через кэш)"""
+        events = self.schedule_cache.get(user_id, start_date, end_date)
+        if events is not None:
+            return events
+
         try:
-            query = f"""
-            SELECT event_id, {self.column_description}, {self.column_start_time}, 
-                   {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}
-            FROM {self.table_events} 
-            WHERE {self.column_user_id} = %s 
-            AND ({self.column_start_time} IS NULL OR {self.column_start_time} BETWEEN %s AND %s)
-            ORDER BY {self.column_start_time} NULLS LAST
-            """
+            if (
+                not self.schedule_cache.covers(start_date, end_date)
+                or self.schedule_cache.is_oversized(user_id)
+            ):
+                return self._select_user_events(user_id, start_date, end_date)
 
-            with self.conn.cursor() as cur:
-                cur.execute(query, (user_id, start_date, end_date))
-                events = cur.fetchall()
-                logger.info(f"📋 Получено {len(events)} событий для пользователя {user_id}")
-                return events
+            # Загружаем в кэш все окно, чтобы следующие запросы не ходили в БД
+            generation = self.schedule_cache.generation(user_id)
+            window = self.schedule_cache.window()
+            events = self._select_user_events(
+                user_id, *window, limit=self.schedule_cache.max_user_events + 1
+            )
+            self.schedule_cache.put(user_id, window, events, generation)
+            if len(events) > self.schedule_cache.max_user_events:
+                # Окно не поместилось целиком - запрашиваем только нужный период
+                return self._select_user_events(user_id, start_date, end_date)
+            return [
+                event for event in events
+                if event[2] is None or start_date <= event[2] <= end_date
+            ]
         except Exception as e:
             logger.error(f"⚠️ Ошибка получения событий пользователя: {e}")
             return []
 
+    def _select_user_events(
+        self, user_id: int, start_date: datetime, end_date: datetime, limit: int = None
+    ) -> List[Tuple]:
+        """Запрос событий пользователя за период к БД"""
+        query = f"""
+        SELECT event_id, {self.display_description}, {self.column_start_time}, 
+               {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}
+        FROM {self.table_events} 
+        WHERE {self.column_user_id} = %s 
+        AND ({self.column_start_time} IS NULL OR {self.column_start_time} BETWEEN %s AND %s)
+        ORDER BY {self.column_start_time} NULLS LAST
+        LIMIT %s
+        """
+
+        with self.cursor() as cur:
+            cur.execute(query, (user_id, start_date, end_date, limit))
+            events = cur.fetchall()
+        logger.info(f"📋 Получено {len(events)} событий для пользователя {user_id}")
+        return events
+
+    @timed_query
+    def get_user_events_page(
+        self,
+        user_id: int,
+        since: datetime,
+        until: datetime,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        backward: bool = False,
+        limit: int = 15
+    ) -> Tuple[List[Tuple], bool]:
+        """Страница предстоящих событий пользователя (keyset по (start_time, event_id)).
+
+        cursor - ключ последнего события предыдущей страницы (первого при
+        backward=True). Возвращает события страницы по возрастанию и признак
+        того, что в направлении обхода есть еще события.
+        """
+        now = datetime.now()
+        page = self.schedule_cache.get_page(user_id, since, until, now, cursor, backward, limit)
+        if page is not None:
+            return page
+
+        # Первая страница легкого пользователя загружает в кэш все окно,
+        # у тяжелых пользователей читается только сама страница
+        if cursor is None and not self.schedule_cache.is_oversized(user_id) and self.schedule_cache.covers(since, until):
+            self.get_user_events(user_id, since, until)
+            page = self.schedule_cache.get_page(user_id, since, until, now, cursor, backward, limit)
+            if page is not None:
+                return page
+
+        conditions = [
+            f"{self.column_user_id} = %s",
+            f"{self.column_start_time} BETWEEN %s AND %s",
+            # Прошедшие события с временем не показываем, события на весь день - до конца дня
+            f"({self.column_is_all_day} OR {self.column_start_time} >= %s)",
+        ]
+        params = [user_id, since, until, now]
+        if cursor:
+            conditions.append(f"({self.column_start_time}, event_id) {'<' if backward else '>'} (%s, %s)")
+            params.extend(cursor)
+        order = "DESC" if backward else "ASC"
+        query = f"""
+        SELECT event_id, {self.display_description}, {self.column_start_time}, 
+               {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}
+        FROM {self.table_events} 
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {self.column_start_time} {order}, event_id {order}
+        LIMIT %s
+        """
+        params.append(limit + 1)
+
+        try:
+            with self.cursor() as cur:
+                cur.execute(query, params)
+                events = cur.fetchall()
+        except Exception as e:
+            logger.error(f"⚠️ Ошибка получения страницы расписания: {e}")
+            return [], False
+
+        has_more = len(events) > limit
+        events = events[:limit]
+        if backward:
+            events.reverse()
+        return events, has_more
+
+    @timed_query
     def user_exists(self, user_id: int, username: str):
         """Проверяет существование пользователя, создает если нет"""
         try:
             query = f"SELECT {self.column_user_id} FROM {self.table_users} WHERE {self.column_user_id} = %s"
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, (user_id,))
                 if not cur.fetchone():
                     insert_query = f"INSERT INTO {self.table_users} ({self.column_user_id}, {self.column_name}) VALUES (%s, %s)"
                     cur.execute(insert_query, (user_id, username))
-                    self.conn.commit()
                     logger.info(f"✅ Создан новый пользователь: {user_id} - {username}")
         except Exception as e:
             logger.error(f"⚠️ Ошибка проверки/создания пользователя: {e}")
-            self.conn.rollback()
 
     def delete_event(self, user_id: int, description: str, date: str = None) -> bool:
         """Удаляет событие по описанию и дате"""
+        return len(self.delete_events(user_id, description, date)) > 0
+
+    @timed_query
+    def delete_events(self, user_id: int, description: str, date: str = None) -> List[int]:
+        """Удаляет события по описанию и дате и возвращает ID удаленных событий"""
         try:
             if date:
                 query = f"""
@@ -180,6 +479,7 @@ class Database:
                 WHERE {self.column_user_id} = %s 
                 AND {self.column_description} ILIKE %s 
                 AND {self.column_start_time}::date = %s
+                RETURNING event_id, {self.column_start_time}
                 """
                 # Используем полное совпадение описания, а не частичное
                 params = (user_id, f"%{description}%", date)
@@ -188,23 +488,28 @@ class Database:
                 DELETE FROM {self.table_events} 
                 WHERE {self.column_user_id} = %s 
                 AND {self.column_description} ILIKE %s
+                RETURNING event_id, {self.column_start_time}
                 """
                 # Используем полное совпадение описания, а не частичное
                 params = (user_id, f"%{description}%")
 
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, params)
-                deleted_count = cur.rowcount
-                self.conn.commit()
+                deleted = cur.fetchall()
+            deleted_ids = [row[0] for row in deleted]
+
+            if deleted_ids:
+                self.schedule_cache.invalidate(user_id)
+                self.refresh_daily_digests(user_id, affected_days(row[1] for row in deleted))
 
-            logger.info(f"Удалено {deleted_count} событий для пользователя {user_id} с описанием '{description}'")
-            return deleted_count > 0
+            logger.info(f"Удалено {len(deleted_ids)} событий для пользователя {user_id} с описанием '{description}'")
+            return deleted_ids
 
         except Exception as e:
             logger.error(f"❌ Ошибка удаления события: {e}")
-            self.conn.rollback()
-            return False
+            return []
 
+    @timed_query
     def clear_user_events(self, user_id: int) -> int:
         """Удаляет все события пользователя"""
         try:
@@ -213,23 +518,25 @@ class Database:
             WHERE {self.column_user_id} = %s
             """
 
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, (user_id,))
                 deleted_count = cur.rowcount
-                self.conn.commit()
 
+            self.schedule_cache.invalidate(user_id)
+            if deleted_count:
+                self.refresh_daily_digests(user_id, digest_window())
             return deleted_count
 
         except Exception as e:
             logger.error(f"❌ Ошибка очистки событий пользователя: {e}")
-            self.conn.rollback()
             return 0
 
+    @timed_query
     def get_all_users(self):
         """Получает список всех пользователей из базы данных"""
         try:
             query = f"SELECT {self.column_user_id} FROM {self.table_users}"
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query)
                 users = [row[0] for row in cur.fetchall()]
                 logger.info(f"👥 Получено {len(users)} пользователей из БД")
@@ -238,16 +545,304 @@ class Database:
             logger.error(f"❌ Ошибка получения пользователей: {e}")
             return []
 
+    def _timezone_filter(self, timezones: Optional[List[str]]) -> Tuple[str, list]:
+        """Условие WHERE по часовым поясам пользователей (u) и его параметры; None - все пользователи"""
+        if timezones is None:
+            return "", []
+        return (
+            f"WHERE (u.{self.column_timezone} = ANY(%s) OR (u.{self.column_timezone} IS NULL AND %s))",
+            [list(timezones), Config.TIMEZONE in timezones],
+        )
+
+    def iter_daily_schedule(self, day: datetime, batch_size: int = 500, timezones: List[str] = None):
+        """Потоково отдает события всех пользователей за день, сгруппированные по user_id.
+
+        Один запрос с серверным курсором вместо запроса на каждого пользователя.
+        Генерирует списки пар (user_id, события) размером до batch_size пользователей;
+        пользователи без событий на этот день приходят с пустым списком.
+        timezones ограничивает выборку пользователями этих часовых поясов.
+        """
+        start_of_day = datetime.combine(day, datetime.min.time())
+        end_of_day = datetime.combine(day, datetime.max.time())
+        where, where_params = self._timezone_filter(timezones)
+        query = f"""
+        SELECT u.{self.column_user_id}, e.event_id,
+               COALESCE(e.{self.column_display_description}, e.{self.column_description}), e.{self.column_start_time},
+               e.{self.column_end_time}, e.{self.column_priority}, e.{self.column_is_all_day}
+        FROM {self.table_users} u
+        LEFT JOIN {self.table_events} e
+            ON e.{self.column_user_id} = u.{self.column_user_id}
+            AND (e.{self.column_start_time} IS NULL OR e.{self.column_start_time} BETWEEN %s AND %s)
+        {where}
+        ORDER BY u.{self.column_user_id}, e.{self.column_start_time} NULLS LAST
+        """
+
+        with self.connection() as conn:
+            # Именованный курсор читает результат с сервера порциями по itersize строк
+            with conn.cursor(name="daily_schedule") as cur:
+                cur.itersize = batch_size
+                cur.execute(query, [start_of_day, end_of_day, *where_params])
+
+                batch = []
+                current_user, current_events = None, []
+                for row in cur:
+                    user_id, event = row[0], row[1:]
+                    if user_id != current_user:
+                        if current_user is not None:
+                            batch.append((current_user, current_events))
+                            if len(batch) >= batch_size:
+                                yield batch
+                                batch = []
+                        current_user, current_events = user_id, []
+                    if event[0] is not None:
+                        current_events.append(event)
+
+                if current_user is not None:
+                    batch.append((current_user, current_events))
+                if batch:
+                    yield batch
+
+    def _upsert_daily_digests(self, day, digests: List[Tuple[int, str]], rendered_at: datetime):
+        """Сохраняет готовые тексты расписания на день одним запросом.
+
+        Текст, отрисованный позже rendered_at, не перезаписывается: ночной
+        проход не затирает правку, сделанную пока он читал события.
+        """
+        query = f"""
+        INSERT INTO {self.table_daily_digests} ({self.column_user_id}, digest_date, message, rendered_at)
+        SELECT t.user_id, %s, t.message, %s
+        FROM unnest(%s::bigint[], %s::text[]) AS t(user_id, message)
+        ON CONFLICT ({self.column_user_id}, digest_date) DO UPDATE
+            SET message = EXCLUDED.message, rendered_at = EXCLUDED.rendered_at
+            WHERE {self.table_daily_digests}.rendered_at <= EXCLUDED.rendered_at
+        """
+        with self.cursor() as cur:
+            cur.execute(query, (
+                day, rendered_at, [user_id for user_id, _ in digests], [message for _, message in digests]
+            ))
+
+    @timed_query
+    def prerender_daily_digests(self, day, batch_size: int = 500, timezones: List[str] = None) -> int:
+        """Отрисовывает расписание на день для пользователей и сохраняет тексты.
+
+        Запускается ночью (по местному времени пользователей из timezones) на
+        следующий день; в 10:00 рассылка только читает готовые строки. Заодно
+        удаляет тексты прошедших дней. Возвращает число пользователей.
+        """
+        rendered_at = datetime.now()
+        total = 0
+        for batch in self.iter_daily_schedule(day, batch_size, timezones):
+            self._upsert_daily_digests(
+                day, [(user_id, format_daily_schedule(events)) for user_id, events in batch], rendered_at
+            )
+            total += len(batch)
+
+        with self.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM {self.table_daily_digests} WHERE digest_date < %s", (digest_window()[0],)
+            )
+        logger.info(f"✅ Подготовлено расписание на {day} для {total} пользователей")
+        return total
+
+    def refresh_daily_digests(self, user_id: int, days):
+        """Перерисовывает готовое расписание пользователя на указанные дни после изменения событий.
+
+        Трогает только дни, для которых текст уже подготовлен: один запрос
+        читает эти тексты вместе с событиями их дней, второй (только если
+        тексты нашлись) записывает новые тексты всех дней разом.
+        """
+        days = sorted(days)
+        if not days:
+            return
+        try:
+            rendered_at = datetime.now()
+            query = f"""
+            SELECT d.digest_date, e.event_id,
+                   COALESCE(e.{self.column_display_description}, e.{self.column_description}), e.{self.column_start_time},
+                   e.{self.column_end_time}, e.{self.column_priority}, e.{self.column_is_all_day}
+            FROM {self.table_daily_digests} d
+            LEFT JOIN {self.table_events} e
+                ON e.{self.column_user_id} = d.{self.column_user_id}
+                AND (
+                    e.{self.column_start_time} IS NULL
+                    OR (e.{self.column_start_time} >= d.digest_date AND e.{self.column_start_time} < d.digest_date + 1)
+                )
+            WHERE d.{self.column_user_id} = %s AND d.digest_date = ANY(%s::date[])
+            ORDER BY d.digest_date, e.{self.column_start_time} NULLS LAST
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (user_id, days))
+                rows = cur.fetchall()
+            if not rows:
+                return
+
+            events_by_day = {}
+            for row in rows:
+                day_events = events_by_day.setdefault(row[0], [])
+                if row[1] is not None:
+                    day_events.append(row[1:])
+
+            # Текст, отрисованный позже rendered_at (параллельная правка), не перезаписывается
+            query = f"""
+            UPDATE {self.table_daily_digests} d
+            SET message = t.message, rendered_at = %s
+            FROM unnest(%s::date[], %s::text[]) AS t(digest_date, message)
+            WHERE d.{self.column_user_id} = %s AND d.digest_date = t.digest_date AND d.rendered_at <= %s
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (
+                    rendered_at, list(events_by_day),
+                    [format_daily_schedule(events) for events in events_by_day.values()],
+                    user_id, rendered_at
+                ))
+        except Exception as e:
+            # Устаревший текст не оставляем: без него в 10:00 расписание соберется из событий
+            logger.error(f"⚠️ Ошибка обновления готового расписания пользователя {user_id} на {days}: {e}")
+            self._drop_daily_digests(user_id, days)
+
+    def _drop_daily_digests(self, user_id: int, days: list):
+        try:
+            with self.cursor() as cur:
+                cur.execute(
+                    f"DELETE FROM {self.table_daily_digests} WHERE {self.column_user_id} = %s AND digest_date = ANY(%s::date[])",
+                    (user_id, days)
+                )
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления готового расписания: {e}")
+
+    def iter_daily_digests(self, day, batch_size: int = 500, timezones: List[str] = None):
+        """Потоково отдает готовые тексты расписания на день порциями пар (user_id, текст).
+
+        Для пользователей без готового текста (зарегистрировались после
+        ночной подготовки или она не выполнялась) текст - None.
+        timezones ограничивает выборку пользователями этих часовых поясов.
+        """
+        where, where_params = self._timezone_filter(timezones)
+        query = f"""
+        SELECT u.{self.column_user_id}, d.message
+        FROM {self.table_users} u
+        LEFT JOIN {self.table_daily_digests} d
+            ON d.{self.column_user_id} = u.{self.column_user_id} AND d.digest_date = %s
+        {where}
+        ORDER BY u.{self.column_user_id}
+        """
+
+        with self.connection() as conn:
+            with conn.cursor(name="daily_digests") as cur:
+                cur.itersize = batch_size
+                cur.execute(query, [day, *where_params])
+                while True:
+                    batch = cur.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+
+    @timed_query
+    def get_user(self, user_id: int):
+        """Получает запись пользователя по ID"""
+        try:
+            query = f"SELECT * FROM {self.table_users} WHERE {self.column_user_id} = %s"
+            with self.cursor() as cur:
+                cur.execute(query, (user_id,))
+                return cur.fetchone()
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения пользователя: {e}")
+            raise
+
+    @timed_query
+    def set_user_timezone(self, user_id: int, timezone: str):
+        """Сохраняет часовой пояс пользователя (имя IANA)"""
+        try:
+            query = f"UPDATE {self.table_users} SET {self.column_timezone} = %s WHERE {self.column_user_id} = %s"
+            with self.cursor() as cur:
+                cur.execute(query, (timezone, user_id))
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения часового пояса: {e}")
+            raise
+
+    @timed_query
+    def get_user_timezone(self, user_id: int) -> str:
+        """Часовой пояс пользователя (Config.TIMEZONE, если не задан)"""
+        try:
+            query = f"SELECT {self.column_timezone} FROM {self.table_users} WHERE {self.column_user_id} = %s"
+            with self.cursor() as cur:
+                cur.execute(query, (user_id,))
+                row = cur.fetchone()
+            return row[0] if row and row[0] else Config.TIMEZONE
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения часового пояса: {e}")
+            return Config.TIMEZONE
+
+    @timed_query
+    def heartbeat_replica(self, replica_id: str, ttl_seconds: float) -> List[str]:
+        """Отмечает реплику живой и возвращает отсортированный список живых реплик.
+
+        Реплики без отметки дольше ttl_seconds считаются остановленными и удаляются.
+        Время берется из БД, чтобы реплики на разных машинах видели одни часы.
+        """
+        with self.cursor() as cur:
+            cur.execute("""
+                INSERT INTO replicas (replica_id, heartbeat_at) VALUES (%s, NOW())
+                ON CONFLICT (replica_id) DO UPDATE SET heartbeat_at = NOW()
+            """, (replica_id,))
+            cur.execute(
+                "DELETE FROM replicas WHERE heartbeat_at < NOW() - %s * interval '1 second'", (ttl_seconds,)
+            )
+            cur.execute("SELECT replica_id FROM replicas ORDER BY replica_id")
+            return [row[0] for row in cur.fetchall()]
+
+    @timed_query
+    def claim_job_slot(self, name: str, slot: datetime) -> Tuple[bool, Optional[datetime]]:
+        """Отмечает слот задания name обработанным.
+
+        Возвращает (True, предыдущий отмеченный слот или None) и (False, None),
+        если этот или более поздний слот уже отмечен другой репликой. Строка
+        задания блокируется до конца транзакции: две реплики не получат один слот.
+        """
+        with self.cursor() as cur:
+            cur.execute("INSERT INTO job_runs (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (name,))
+            cur.execute("SELECT last_slot FROM job_runs WHERE name = %s FOR UPDATE", (name,))
+            previous = cur.fetchone()[0]
+            if previous is not None and previous >= slot:
+                return False, None
+            cur.execute("UPDATE job_runs SET last_slot = %s WHERE name = %s", (slot, name))
+        return True, previous
+
+    @timed_query
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> bool:
+        """Берет или продлевает аренду name на ttl_seconds. True - аренда у holder"""
+        with self.cursor() as cur:
+            cur.execute("""
+                INSERT INTO leases (name, holder, expires_at)
+                VALUES (%s, %s, NOW() + %s * interval '1 second')
+                ON CONFLICT (name) DO UPDATE
+                    SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+                    WHERE leases.holder = EXCLUDED.holder OR leases.expires_at < NOW()
+                RETURNING holder
+            """, (name, holder, ttl_seconds))
+            return cur.fetchone() is not None
+
+    @timed_query
+    def release_replica(self, replica_id: str):
+        """Удаляет реплику и ее аренды при остановке: остальные перераспределят работу сразу"""
+        try:
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM leases WHERE holder = %s", (replica_id,))
+                cur.execute("DELETE FROM replicas WHERE replica_id = %s", (replica_id,))
+        except Exception as e:
+            logger.error(f"❌ Ошибка освобождения реплики: {e}")
+
+    @timed_query
     def get_event_by_id(self, event_id: int):
         """Получает событие по ID"""
         try:
             query = f"""
-            SELECT event_id, {self.column_description}, {self.column_start_time}, 
+            SELECT event_id, {self.display_description}, {self.column_start_time}, 
                    {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}
             FROM {self.table_events} 
             WHERE event_id = %s
             """
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, (event_id,))
                 event = cur.fetchone()
                 if event:
@@ -259,6 +854,133 @@ class Database:
             logger.error(f"❌ Ошибка получения события: {e}")
             return None
 
+    @timed_query
+    def save_reminder(self, event_id: int, user_id: int, remind_at: datetime):
+        """Сохраняет (или переносит) напоминание о событии"""
+        try:
+            query = f"""
+            INSERT INTO {self.table_reminders} (event_id, {self.column_user_id}, remind_at)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (event_id) DO UPDATE SET remind_at = EXCLUDED.remind_at, sent_at = NULL, updated_at = NOW()
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (event_id, user_id, remind_at))
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения напоминания: {e}")
+            raise
+
+    @timed_query
+    def save_reminders_bulk(self, user_id: int, reminders: List[Tuple[int, datetime]]):
+        """Сохраняет (или переносит) напоминания пользователя одним запросом: пары (event_id, remind_at)"""
+        if not reminders:
+            return
+        try:
+            query = f"""
+            INSERT INTO {self.table_reminders} (event_id, {self.column_user_id}, remind_at)
+            SELECT t.event_id, %s, t.remind_at
+            FROM unnest(%s::int[], %s::timestamp[]) AS t(event_id, remind_at)
+            ON CONFLICT (event_id) DO UPDATE SET remind_at = EXCLUDED.remind_at, sent_at = NULL, updated_at = NOW()
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (
+                    user_id, [event_id for event_id, _ in reminders], [remind_at for _, remind_at in reminders]
+                ))
+        except Exception as e:
+            logger.error(f"❌ Ошибка пакетного сохранения напоминаний: {e}")
+            raise
+
+    @timed_query
+    def get_pending_reminders(
+        self, since: datetime, partition: Tuple[int, int] = None, updated_since: datetime = None
+    ) -> List[Tuple]:
+        """Получает все неотправленные напоминания начиная с since одним запросом по индексу remind_at.
+
+        partition - (номер, число реплик): только напоминания пользователей
+        с user_id % число = номер. updated_since - только созданные или
+        перенесенные после этого времени.
+        """
+        try:
+            conditions = ["sent_at IS NULL", "remind_at >= %s"]
+            params = [since]
+            if partition is not None:
+                conditions.append(f"{self.column_user_id} %% %s = %s")
+                params.extend((partition[1], partition[0]))
+            if updated_since is not None:
+                conditions.append("updated_at >= %s")
+                params.append(updated_since)
+            query = f"""
+            SELECT event_id, {self.column_user_id}, remind_at
+            FROM {self.table_reminders}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY remind_at
+            """
+            with self.cursor() as cur:
+                cur.execute(query, params)
+                reminders = cur.fetchall()
+                logger.info(f"⏰ Получено {len(reminders)} ожидающих напоминаний")
+                return reminders
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения напоминаний: {e}")
+            return []
+
+    @timed_query
+    def claim_reminders(self, event_ids: List[int], due_before: datetime) -> dict:
+        """Отмечает наступившие напоминания отправленными перед отправкой (event_id -> remind_at).
+
+        Напоминание получает только одна реплика: уже отправленные, удаленные
+        и перенесенные на более позднее время в результат не попадают.
+        """
+        try:
+            query = f"""
+            UPDATE {self.table_reminders} SET sent_at = NOW()
+            WHERE event_id = ANY(%s) AND sent_at IS NULL AND remind_at <= %s
+            RETURNING event_id, remind_at
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (list(event_ids), due_before))
+                return dict(cur.fetchall())
+        except Exception as e:
+            logger.error(f"❌ Ошибка захвата напоминаний: {e}")
+            return {}
+
+    @timed_query
+    def release_reminders(self, event_ids: List[int]):
+        """Снимает отметку об отправке с напоминаний, которые не удалось доставить"""
+        try:
+            query = f"UPDATE {self.table_reminders} SET sent_at = NULL WHERE event_id = ANY(%s)"
+            with self.cursor() as cur:
+                cur.execute(query, (list(event_ids),))
+        except Exception as e:
+            logger.error(f"❌ Ошибка возврата напоминаний: {e}")
+
+    @timed_query
+    def delete_reminder(self, event_id: int):
+        """Удаляет напоминание о событии"""
+        try:
+            query = f"DELETE FROM {self.table_reminders} WHERE event_id = %s"
+            with self.cursor() as cur:
+                cur.execute(query, (event_id,))
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления напоминания: {e}")
+
+    @timed_query
+    def get_events_by_ids(self, event_ids: List[int]) -> dict:
+        """Получает события по списку ID одним запросом (event_id -> событие)"""
+        try:
+            query = f"""
+            SELECT event_id, {self.display_description}, {self.column_start_time}, 
+                   {self.column_end_time}, {self.column_priority}, {self.column_is_all_day}
+            FROM {self.table_events} 
+            WHERE event_id = ANY(%s)
+            """
+            with self.cursor() as cur:
+                cur.execute(query, (list(event_ids),))
+                return {event[0]: event for event in cur.fetchall()}
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения событий по ID: {e}")
+            return {}
+
+    @timed_query
     def check_event_exists(self, user_id: int, description: str, date: str) -> bool:
         """Проверяет, существует ли событие"""
         try:
@@ -271,7 +993,7 @@ class Database:
             
             logger.info(f"🔍 Проверяем существование события: user_id={user_id}, description='{description}', date={date}")
             
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, (user_id, f"%{description}%", date))
                 count = cur.fetchone()[0]
                 
@@ -283,6 +1005,7 @@ class Database:
             logger.error(f"❌ Ошибка проверки существования события: {e}")
             return False
 
+    @timed_query
     def save_goal(self, user_id: int, description: str, priority: int = 2) -> int:
         """Сохраняет цель в базу данных"""
         try:
@@ -295,19 +1018,42 @@ class Database:
 
             logger.info(f"💾 Сохраняем цель в БД: user_id={user_id}, description='{description}', priority={priority}")
 
-            with self.conn.cursor() as cur:
+            with self.cursor() as cur:
                 cur.execute(query, (user_id, description, priority))
                 goal_id = cur.fetchone()[0]
-                self.conn.commit()
 
             logger.info(f"✅ Цель успешно сохранена, ID: {goal_id}")
             return goal_id
             
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения цели: {e}")
-            self.conn.rollback()
             raise
 
 
+class AsyncDatabase:
+    """Асинхронный интерфейс к Database с теми же методами.
+
+    Каждый вызов выполняется в пуле потоков на отдельном соединении из пула,
+    поэтому запросы разных пользователей не блокируют event loop и друг друга.
+    """
+
+    def __init__(self, database: Database):
+        self._db = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
+
+
 # Глобальный экземпляр базы данных
-db = Database()
\ No newline at end of file
+db = Database()
+# Асинхронный доступ к той же базе для обработчиков бота и планировщика
+adb = AsyncDatabase(db)
\ No newline at end of file
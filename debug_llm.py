@@ -1,4 +1,5 @@
 import os
+import asyncio
 import sys
 
 sys.path.append(".")
@@ -28,7 +29,7 @@ def test_llm_with_text(text):
         print(f"✅ API URL: {Config.LLM_API_URL}")
 
         # Пробуем сделать запрос
-        result = client.extract_event_info(text)
+        result = asyncio.run(client.extract_event_info(text))
         print(f"✅ Успех! Результат: {result}")
 
     except Exception as e:
@@ -0,0 +1,261 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+from models import LLMResponse, FastParseResult
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Индикаторы части суток, уточняющие час ("в 7 вечера" -> 19:00)
+# (длинные формы раньше коротких: "вечером" не должно совпасть как "вечер")
+_PERIOD = r"(утра|утром|дня|днем|днём|вечера|вечером|вечер|ночи|ночью)"
+
+_MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
+    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
+}
+
+_WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "среду": 2, "четверг": 3,
+    "пятницу": 4, "субботу": 5, "воскресенье": 6,
+}
+
+# Относительные даты. "после завтра" стоит раньше "завтра", чтобы совпасть первым
+_RELATIVE_DATE_RE = re.compile(r"\b(послезавтра|после\s+завтра|сегодня|завтра)\b")
+_WEEKDAY_RE = re.compile(r"\bв(?:о)?\s+(" + "|".join(_WEEKDAYS) + r")\b")
+_DAY_MONTH_RE = re.compile(r"\b(\d{1,2})\s+(" + "|".join(_MONTHS) + r")\b(?:\s+(\d{4})(?:\s*г(?:ода|\.)?)?)?")
+_ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_NUMERIC_DATE_RE = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4}|\d{2})\b")
+
+# Диапазон времени "с 9 до 18", "с 9:30 - 11"
+_RANGE_RE = re.compile(
+    r"\bс\s*(\d{1,2})(?:[:.](\d{2}))?\s*" + _PERIOD + r"?\s*(?:до|–|-|—)\s*"
+    r"(\d{1,2})(?:[:.](\d{2}))?(?:\s*" + _PERIOD + r"\b)?"
+)
+# Время с предлогом "в 15", "в 19.00", "в 7 утра", "в 15 часов"
+_AT_TIME_RE = re.compile(
+    r"\bв(?:о)?\s+(\d{1,2})(?:[:.](\d{2}))?(?!\d)(?:\s*(часов|часа|час|ч)\b)?(?:\s*" + _PERIOD + r"\b)?"
+)
+# Место или мера после "в N": число - номер или количество, а не час ("в 3 корпусе", "в 2 раза")
+_PLACE_AFTER_HOUR_RE = re.compile(
+    r"\s*(?:корпус|кабинет|каб\b|аудитори|ауд\b|зал|класс|этаж|комнат|офис|квартир|кв\b|подъезд|"
+    r"палат|вагон|школ|групп|секци|строени|блок|ряд[уае]?\b|раз[а]?\b|км\b|километр|метр|минут|секунд|"
+    r"рубл|процент)"
+)
+# Ранний час без минут и части суток ("в 3") может быть и 03:00, и 15:00
+_AMBIGUOUS_HOUR_MAX = 6
+# Время без предлога, но с двоеточием "15:30"
+_CLOCK_TIME_RE = re.compile(r"\b(\d{1,2}):(\d{2})\b(?:\s*" + _PERIOD + r"\b)?")
+
+# Слова части суток без цифр ("утром", "вечером") - не считаются временем
+_VAGUE_PERIOD_RE = re.compile(r"\b(утром|днем|днём|вечером|ночью)\b")
+# Конструкции, которые быстрый разбор не поддерживает - их оставляем LLM
+_UNSUPPORTED_RE = re.compile(
+    r"\b(через|каждый|каждую|каждое|каждые|ежедневно|неделе|неделю|месяце|выходных|выходные|вчера|"
+    r"спланируй|план|что|когда|как|почему|зачем)\b"
+)
+_LEADING_FILLER_RE = re.compile(
+    r"^(?:(?:запланируй(?:те)?|напомни(?:те)?|добавь(?:те)?|мне|нужно|надо|я|и)\s+)+", re.IGNORECASE
+)
+_DIGIT_RE = re.compile(r"\d")
+_SPACES_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " .,!;:-—–"
+
+_LETTERS_RE = re.compile(r"[a-zа-яё]+")
+# Пять и более согласных подряд в русских и английских словах почти не встречаются
+_CONSONANT_RUN_RE = re.compile(r"[бвгджзйклмнпрстфхцчшщbcdfghjklmnpqrstvwxz]{5,}")
+_VOWEL_RE = re.compile(r"[аеёиоуыэюяaeiouy]")
+
+
+def _apply_period(hour: int, period: Optional[str]) -> int:
+    """Переводит час в 24-часовой формат по индикатору части суток"""
+    if period in ("дня", "днем", "днём", "вечера", "вечером", "вечер") and 1 <= hour <= 11:
+        return hour + 12
+    if period in ("ночи", "ночью") and hour == 12:
+        return 0
+    return hour
+
+
+def _format_time(hour: int, minutes: Optional[str]) -> Optional[str]:
+    """Возвращает время в формате HH:MM:SS или None, если время некорректно"""
+    minute = int(minutes) if minutes else 0
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        return None
+    return f"{hour:02d}:{minute:02d}:00"
+
+
+def _cut(text: str, span: Optional[tuple]) -> str:
+    """Вырезает из текста найденный фрагмент (span - его границы)"""
+    if span is None:
+        return text
+    return text[:span[0]] + " " + text[span[1]:]
+
+
+def _looks_meaningful(description: str) -> bool:
+    """Проверяет, что описание состоит из похожих на слова сочетаний букв"""
+    words = [word for word in _LETTERS_RE.findall(description) if len(word) >= 3]
+    if not words:
+        return False
+    return all(_VOWEL_RE.search(word) and not _CONSONANT_RUN_RE.search(word) for word in words)
+
+
+class FastEventParser:
+    """Детерминированный разбор типовых русских фраз о событиях без обращения к LLM"""
+
+    # Уверенность для фраз с явной датой и временем, только с датой и только со временем
+    CONFIDENCE_DATE_TIME = 0.95
+    CONFIDENCE_DATE = 0.85
+    CONFIDENCE_TIME = 0.8
+    CONFIDENCE_NO_ANCHOR = 0.2
+    # Потолок уверенности для фраз с неоднозначностями
+    CONFIDENCE_AMBIGUOUS = 0.4
+
+    def parse(self, text: str, today: date = None) -> FastParseResult:
+        """Разбирает текст и возвращает событие с оценкой уверенности"""
+        today = today or datetime.now().date()
+        source = text.strip()
+        # Шаблоны ищутся в нижнем регистре, а описание вырезается из исходного текста
+        # по тем же позициям (lower() почти всегда сохраняет длину строки)
+        work = source.lower()
+        original = source if len(source) == len(work) else work
+
+        if not work or "?" in work:
+            return FastParseResult(confidence=0.0)
+
+        event_date, span = self._extract_date(work, today)
+        if event_date is False:
+            return FastParseResult(confidence=0.0)
+        work, original = _cut(work, span), _cut(original, span)
+
+        times, span, ambiguous_hour = self._extract_time(work)
+        if times is False:
+            return FastParseResult(confidence=0.0)
+        work, original = _cut(work, span), _cut(original, span)
+        event_time, event_end_time = times if times else ("???", None)
+
+        description = _LEADING_FILLER_RE.sub("", _SPACES_RE.sub(" ", original).strip(_EDGE_PUNCT))
+        description = description.strip(_EDGE_PUNCT)
+        lowered = description.lower()
+        if not description or not _looks_meaningful(lowered):
+            return FastParseResult(confidence=0.0)
+
+        if event_date and times:
+            confidence = self.CONFIDENCE_DATE_TIME
+        elif event_date:
+            confidence = self.CONFIDENCE_DATE
+        elif times:
+            confidence = self.CONFIDENCE_TIME
+        else:
+            confidence = self.CONFIDENCE_NO_ANCHOR
+
+        # Оставшиеся цифры, размытое время и неподдерживаемые конструкции отдаем LLM
+        if _DIGIT_RE.search(lowered) or _UNSUPPORTED_RE.search(lowered):
+            confidence = min(confidence, self.CONFIDENCE_AMBIGUOUS)
+        if _VAGUE_PERIOD_RE.search(lowered):
+            confidence = min(confidence, self.CONFIDENCE_AMBIGUOUS)
+        # "в 3 корпусе", "в 3" - число может быть не временем или не тем часом
+        if ambiguous_hour:
+            confidence = min(confidence, self.CONFIDENCE_AMBIGUOUS)
+
+        event = LLMResponse(
+            date=(event_date or today).strftime("%Y-%m-%d"),
+            time=event_time,
+            end_time=event_end_time,
+            description=description,
+            priority=2,
+            original_text=source
+        )
+        return FastParseResult(event=event, confidence=confidence)
+
+    @staticmethod
+    def _extract_date(work: str, today: date):
+        """Находит дату в тексте. Возвращает (дата или None, границы совпадения); False - некорректная дата"""
+        match = _RELATIVE_DATE_RE.search(work)
+        if match:
+            word = match.group(1)
+            if word == "сегодня":
+                offset = 0
+            elif word == "завтра":
+                offset = 1
+            else:
+                offset = 2
+            return today + timedelta(days=offset), match.span()
+
+        match = _WEEKDAY_RE.search(work)
+        if match:
+            # Ближайший будущий день недели (сегодняшний день недели - через неделю)
+            offset = (_WEEKDAYS[match.group(1)] - today.weekday()) % 7 or 7
+            return today + timedelta(days=offset), match.span()
+
+        try:
+            match = _ISO_DATE_RE.search(work)
+            if match:
+                parsed = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                return parsed, match.span()
+
+            match = _NUMERIC_DATE_RE.search(work)
+            if match:
+                year = int(match.group(3))
+                if year < 100:
+                    year += 2000
+                parsed = date(year, int(match.group(2)), int(match.group(1)))
+                return parsed, match.span()
+
+            match = _DAY_MONTH_RE.search(work)
+            if match:
+                month = _MONTHS[match.group(2)]
+                if match.group(3):
+                    parsed = date(int(match.group(3)), month, int(match.group(1)))
+                else:
+                    parsed = date(today.year, month, int(match.group(1)))
+                    # Без года прошедшая дата означает следующий год
+                    if parsed < today:
+                        parsed = parsed.replace(year=today.year + 1)
+                return parsed, match.span()
+        except ValueError:
+            return False, None
+
+        return None, None
+
+    @staticmethod
+    def _extract_time(work: str):
+        """Находит время или диапазон.
+
+        Возвращает ((начало, конец) или None, границы совпадения, сомнительный час);
+        False - некорректное время. Сомнительный час - "в N" без минут и части
+        суток, за которым идет место или мера ("в 3 корпусе"), или ранний
+        час 0-6 ("в 3" - ночью или днем).
+        """
+        match = _RANGE_RE.search(work)
+        if match:
+            start_period = match.group(3)
+            end_period = match.group(6) or start_period
+            start = _format_time(_apply_period(int(match.group(1)), start_period), match.group(2))
+            end = _format_time(_apply_period(int(match.group(4)), end_period), match.group(5))
+            if not start or not end:
+                return False, None, False
+            return (start, end), match.span(), False
+
+        match = _AT_TIME_RE.search(work)
+        if match:
+            start = _format_time(_apply_period(int(match.group(1)), match.group(4)), match.group(2))
+            if not start:
+                return False, None, False
+            ambiguous_hour = not (match.group(2) or match.group(4)) and (
+                int(match.group(1)) <= _AMBIGUOUS_HOUR_MAX
+                or (not match.group(3) and _PLACE_AFTER_HOUR_RE.match(work, match.end()) is not None)
+            )
+            return (start, None), match.span(), ambiguous_hour
+
+        match = _CLOCK_TIME_RE.search(work)
+        if match:
+            start = _format_time(_apply_period(int(match.group(1)), match.group(3)), match.group(2))
+            if not start:
+                return False, None, False
+            return (start, None), match.span(), False
+
+        return None, None, False
+
+
+# Глобальный экземпляр
+fast_parser = FastEventParser()
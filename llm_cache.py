@@ -0,0 +1,112 @@
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+from models import LLMResponse
+import logging
+
+logger = logging.getLogger(__name__)
+
+_SPACES_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " .,!?;:-—–\"'«»"
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к каноническому виду для ключа кэша"""
+    text = text.lower().replace("ё", "е")
+    return _SPACES_RE.sub(" ", text).strip(_EDGE_PUNCT)
+
+
+class EventInfoCache:
+    """Ограниченный LRU-кэш с TTL для результатов извлечения событий через LLM.
+
+    Ключ - нормализованный текст и дата запроса: относительные даты
+    ("завтра", "в пятницу") зависят от текущего дня.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        # ключ -> (время истечения по time.time(), данные LLMResponse)
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        if self.path:
+            self.load()
+
+    @staticmethod
+    def make_key(text: str, today: date) -> str:
+        return f"{today.isoformat()}|{normalize_text(text)}"
+
+    def get(self, text: str, today: date) -> Optional[LLMResponse]:
+        """Возвращает копию закэшированного ответа или None"""
+        key = self.make_key(text, today)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        expires_at, data = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        # Новый объект на каждое обращение: вызывающий код может менять поля ответа
+        return LLMResponse(**{**data, "original_text": text})
+
+    def put(self, text: str, today: date, response: LLMResponse):
+        """Сохраняет ответ LLM в кэш"""
+        key = self.make_key(text, today)
+        self._entries[key] = (time.time() + self.ttl_seconds, response.model_dump())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику попаданий"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return {**self.stats, "size": len(self._entries), "hit_rate": round(hit_rate, 4)}
+
+    def load(self):
+        """Загружает кэш с диска, пропуская устаревшие записи"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            now = time.time()
+            today_prefix = f"{date.today().isoformat()}|"
+            for key, expires_at, data in entries:
+                # Записи за прошедшие дни больше никогда не совпадут с ключом запроса
+                if expires_at > now and key >= today_prefix:
+                    self._entries[key] = (expires_at, data)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            logger.info(f"✅ Загружено {len(self._entries)} записей кэша LLM из {self.path}")
+        except Exception as e:
+            logger.error(f"⚠️ Ошибка загрузки кэша LLM: {e}")
+
+    def save(self):
+        """Сохраняет кэш на диск (атомарно, через временный файл)"""
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    [[key, expires_at, data] for key, (expires_at, data) in self._entries.items()],
+                    f, ensure_ascii=False, separators=(",", ":")
+                )
+            os.replace(tmp_path, self.path)
+            logger.info(f"💾 Кэш LLM сохранен: {len(self._entries)} записей")
+        except Exception as e:
+            logger.error(f"⚠️ Ошибка сохранения кэша LLM: {e}")
@@ -1,21 +1,151 @@
-import requests
+import asyncio
+import httpx
 import json
-import re
+import time
 from datetime import datetime, timedelta
 from config import Config
 from models import LLMResponse
+from event_parser import fast_parser
+from llm_cache import EventInfoCache
+from reply_templates import ReplyGenerator
+from metrics import EVENT_PARSE_TOTAL, LLM_REQUEST_SECONDS
+import text_processing as tp
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+class LLMTransport:
+    """Асинхронный транспорт к LLM API с общим пулом keep-alive соединений"""
+
+    def __init__(self, api_url: str, api_key: str, model: str):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.limits = httpx.Limits(
+            max_connections=Config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY,
+        )
+        self._client = None
+        self._loop = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Возвращает HTTP-клиент, привязанный к текущему event loop"""
+        loop = asyncio.get_running_loop()
+        # Пул соединений httpx нельзя разделять между разными event loop
+        # (например, при нескольких asyncio.run в отладочных скриптах)
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+            )
+            self._loop = loop
+        return self._client
+
+    async def chat(
+        self, messages: list[dict], temperature: float, max_tokens: int, timeout: float, method: str = "chat"
+    ) -> str:
+        """Отправляет chat completion запрос и возвращает текст ответа.
+
+        method - метод LLMClient, от имени которого идет запрос (метка метрик).
+        """
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            content = await self._post(messages, temperature, max_tokens, timeout)
+            outcome = "success"
+            return content
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.labels(method, outcome).observe(time.perf_counter() - started)
+
+    async def _post(self, messages: list[dict], temperature: float, max_tokens: int, timeout: float) -> str:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+        client = self._get_client()
+        response = await client.post(
+            self.api_url,
+            json=payload,
+            timeout=httpx.Timeout(timeout, connect=Config.LLM_CONNECT_TIMEOUT),
+        )
+        response.raise_for_status()
+
+        llm_data = response.json()
+        return llm_data['choices'][0]['message']['content'].strip()
+
+    async def aclose(self):
+        """Закрывает пул соединений"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._loop = None
+
+
 class LLMClient:
     def __init__(self):
         self.api_key = Config.LLM_API_KEY
         self.api_url = Config.LLM_API_URL
         self.model = Config.LLM_MODEL
+        self.transport = LLMTransport(self.api_url, self.api_key, self.model)
+        self.fast_parser = fast_parser
+        self.cache = EventInfoCache(Config.LLM_CACHE_SIZE, Config.LLM_CACHE_TTL, Config.LLM_CACHE_PATH)
+        self.reply_generator = ReplyGenerator()
+        # Счетчики путей извлечения событий: быстрый разбор, запрос к LLM, fallback при ошибке LLM
+        self.stats = {"fast_path_hits": 0, "llm_calls": 0, "llm_fallbacks": 0}
+
+    async def aclose(self):
+        """Освобождает HTTP-соединения клиента и сохраняет кэш"""
+        await self.transport.aclose()
+        self.cache.save()
     
-    def extract_event_info(self, text: str) -> LLMResponse:
+    def get_stats(self) -> dict:
+        """Возвращает счетчики извлечения событий и долю запросов, обработанных без LLM"""
+        cache_stats = self.cache.get_stats()
+        total = self.stats["fast_path_hits"] + cache_stats["hits"] + self.stats["llm_calls"]
+        hit_rate = self.stats["fast_path_hits"] / total if total else 0.0
+        return {**self.stats, "fast_path_hit_rate": round(hit_rate, 4), "cache": cache_stats}
+
+    async def extract_event_info(self, text: str) -> LLMResponse:
+        """Извлекает структурированную информацию: сначала локальным разбором, затем через LLM"""
+        fast_result = self.fast_parser.parse(text)
+        if fast_result.event and fast_result.confidence >= Config.FAST_PARSE_MIN_CONFIDENCE:
+            self.stats["fast_path_hits"] += 1
+            EVENT_PARSE_TOTAL.labels("fast").inc()
+            logger.debug(f"Быстрый разбор без LLM (уверенность {fast_result.confidence}): {text}")
+            return fast_result.event
+
+        today = datetime.now().date()
+        cached = self.cache.get(text, today)
+        if cached is not None:
+            logger.debug(f"Ответ LLM взят из кэша: {text}")
+            EVENT_PARSE_TOTAL.labels("cache").inc()
+            return cached
+
+        self.stats["llm_calls"] += 1
+        EVENT_PARSE_TOTAL.labels("llm").inc()
+        try:
+            result = await self._extract_event_info_llm(text)
+        except Exception:
+            self.stats["llm_fallbacks"] += 1
+            EVENT_PARSE_TOTAL.labels("fallback").inc()
+            # Fallback на упрощенный парсинг
+            return self.simple_event_parse(text)
+
+        self.cache.put(text, today, result)
+        return result
+
+    async def _extract_event_info_llm(self, text: str) -> LLMResponse:
         """Отправляет запрос к LLM для извлечения структурированной информации"""
         try:
             prompt = f"""
@@ -63,25 +193,15 @@ class LLMClient:
             "абырвалг" → description: "???"
             """
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.1,
-                "max_tokens": 500
-            }
-
             logger.debug(f"Отправляю запрос к LLM для извлечения данных: {text}")
             
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            llm_data = response.json()
-            content = llm_data['choices'][0]['message']['content'].strip()
+            content = await self.transport.chat(
+                [{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=500,
+                timeout=30,
+                method="extract_event_info"
+            )
             logger.debug(f"Ответ LLM для извлечения: {content}")
             
             # Очищаем ответ от markdown
@@ -104,10 +224,9 @@ class LLMClient:
             
         except Exception as e:
             logger.error(f"Ошибка извлечения данных LLM: {e}")
-            # Fallback на упрощенный парсинг
-            return self.simple_event_parse(text)
+            raise
 
-    def generate_training_plan(self, goal: str) -> list[dict]:
+    async def generate_training_plan(self, goal: str) -> list[dict]:
         """Генерирует план тренировок для достижения цели"""
         try:
             prompt = f"""
@@ -132,25 +251,15 @@ class LLMClient:
             Верни ТОЛЬКО JSON-массив.
             """
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "system", "content": "Ты — ассистент по планированию."}, {"role": "user", "content": prompt}],
-                "temperature": 0.5,
-                "max_tokens": 1000
-            }
-
             logger.debug(f"Отправляю запрос к LLM для генерации плана: {goal}")
             
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            
-            llm_data = response.json()
-            content = llm_data['choices'][0]['message']['content'].strip()
+            content = await self.transport.chat(
+                [{"role": "system", "content": "Ты — ассистент по планированию."}, {"role": "user", "content": prompt}],
+                temperature=0.5,
+                max_tokens=1000,
+                timeout=60,
+                method="generate_training_plan"
+            )
             logger.debug(f"Ответ LLM для генерации плана: {content}")
             
             cleaned_content = content.replace('```json', '').replace('```', '').strip()
@@ -207,9 +316,8 @@ class LLMClient:
                 event_date = today.strftime("%Y-%m-%d")
             
             # Проверяем, есть ли указание времени (в том числе диапазон "с HH[:MM] [индикатор] до HH[:MM] [индикатор]")
-            range_pattern = r"(?:с\s*)?(\d{1,2})(?:[.:](\d{2}))?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*(?:до|–|-|—)\s*(\d{1,2})(?:[.:](\d{2}))?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?"
-            range_match = re.search(range_pattern, text_lower)
-            time_match = re.search(r'(\d{1,2})[.:]?\s*(\d{2})?', text)
+            range_match = tp.TIME_RANGE_RE.search(text_lower)
+            time_match = tp.LOOSE_TIME_RE.search(text)
             has_time_indicators = any(word in text_lower for word in ['в ', 'во ', 'часов', 'час', 'утра', 'дня', 'вечера', 'вечер', 'ночи', 'ночью'])
             
             # Если есть цифры времени или явные указатели времени - парсим время
@@ -263,13 +371,13 @@ class LLMClient:
             description = text
             
             # Убираем только временные слова и местоимения в начале
-            description = re.sub(r'^(сегодня|завтра|послезавтра|после завтра|я)\s+', '', description, flags=re.IGNORECASE)
+            description = tp.LEADING_DATE_WORD_RE.sub('', description)
             
             # Убираем время в формате "в XX"
-            description = re.sub(r'\bв\s+\d{1,2}\b', '', description)
+            description = tp.HOUR_WORD_RE.sub('', description)
             
             # Убираем лишние пробелы
-            description = re.sub(r'\s+', ' ', description).strip()
+            description = tp.collapse_spaces(description)
             
             # Если описание получилось пустым, используем fallback
             if not description or len(description) < 3:
@@ -300,8 +408,8 @@ class LLMClient:
                 original_text=text
             )
     
-    def generate_human_response(self, event_data: dict, conflict: bool = False, user_text: str = "") -> str:
-        """Генерирует человеческий ответ через LLM"""
+    async def generate_human_response(self, event_data: dict, conflict: bool = False, user_text: str = "") -> str:
+        """Генерирует человеческий ответ: по шаблонам или, если включено LLM_HUMAN_RESPONSES, через LLM"""
         
         if not event_data or not event_data.get('description') or event_data.get('description') == "???":
             # Для некорректных запросов возвращаем жестко заданный ответ
@@ -311,6 +419,10 @@ class LLMClient:
             # Запрос к LLM для генерации ответа о конфликте (НЕ ИСПОЛЬЗУЕТСЯ - конфликты отключены)
             return f"❌ Время {event_data.get('time')} на {event_data.get('date')} уже занято. Попробуйте другое время."
         
+        if not Config.LLM_HUMAN_RESPONSES:
+            # Второй запрос к LLM ради формулировки не нужен - отвечаем по шаблону
+            return self.reply_generator.render(event_data)
+
         # Запрос к LLM для генерации подтверждения планирования
         if event_data.get('time') == "???":
             # Для событий без времени
@@ -344,26 +456,16 @@ class LLMClient:
             Не используй эмодзи, будь позитивным. Не используй шаблонные фразы. Используй не более 3 предложений.
             """
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.8,
-            "max_tokens": 150
-        }
-
         try:
             logger.debug(f"Отправляю запрос к LLM для генерации ответа")
             
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            llm_data = response.json()
-            content = llm_data['choices'][0]['message']['content'].strip()
+            content = await self.transport.chat(
+                [{"role": "user", "content": prompt}],
+                temperature=0.8,
+                max_tokens=150,
+                timeout=30,
+                method="generate_human_response"
+            )
             logger.debug(f"Сгенерированный ответ LLM: {content}")
             
             return content
@@ -376,49 +478,43 @@ class LLMClient:
             elif not event_data or not event_data.get('description'):
                 return "Не совсем понял запрос. Попробуйте сказать, например: 'завтра встреча в 15:00' или 'завтра нужно помедитировать'"
             else:
-                if event_data.get('time') == "???":
-                    return f"✅ Запланировано на весь день: {event_data.get('description')} на {event_data.get('date')}"
-                else:
-                    time_str = event_data.get('time', '').replace(':00', '') if event_data.get('time') else ''
-                    return f"✅ Запланировано: {event_data.get('description')} на {event_data.get('date')} в {time_str}"
+                # Тот же ответ, что и без LLM_HUMAN_RESPONSES
+                return self.reply_generator.render(event_data)
 
     def is_delete_command(self, text: str) -> bool:
         """Проверяет, является ли текст командой удаления"""
-        delete_keywords = ['удали', 'убери', 'remove', 'delete', 'отмени']
         text_lower = text.lower()
-        return any(keyword in text_lower for keyword in delete_keywords)
+        return any(keyword in text_lower for keyword in tp.DELETE_KEYWORDS)
 
     def extract_event_from_delete(self, text: str) -> str:
         """Извлекает название события из команды удаления"""
         text_lower = text.lower()
-        for keyword in ['удали', 'убери', 'remove', 'delete', 'отмени']:
+        for keyword in tp.DELETE_KEYWORDS:
             if keyword in text_lower:
                 return text_lower.replace(keyword, '').strip()
         return text.strip()
 
     def extract_delete_intent(self, text: str) -> dict:
         """Определяет intent удаления события"""
-        delete_keywords = ['удали', 'убери', 'remove', 'delete', 'отмени', 'отмена']
         text_lower = text.lower()
         
-        if any(keyword in text_lower for keyword in delete_keywords):
+        # Здесь командой удаления считается и «отмена»
+        if any(keyword in text_lower for keyword in tp.DELETE_KEYWORDS + ("отмена",)):
             # Извлекаем описание события для удаления и возможную дату
-            pattern = r'(удали|убери|remove|delete|отмени|отмена)\s+(.*)'
-            match = re.search(pattern, text_lower)
+            match = tp.DELETE_COMMAND_RE.search(text_lower)
             
             if match:
                 full_description = match.group(2).strip()
                 
                 # Ищем дату в описании
-                date_pattern = r'(сегодня|завтра|послезавтра|после завтра)'
-                date_match = re.search(date_pattern, full_description)
+                date_match = tp.DELETE_RELATIVE_DATE_RE.search(full_description)
                 
                 if date_match:
                     date_text = date_match.group(1)
-                    event_description = re.sub(date_pattern, '', full_description).strip()
+                    event_description = tp.DELETE_RELATIVE_DATE_RE.sub('', full_description).strip()
                     # Убираем лишние пробелы и союзы
-                    event_description = re.sub(r'^в\s*', '', event_description)
-                    event_description = re.sub(r'^на\s*', '', event_description)
+                    event_description = tp.LEADING_V_RE.sub('', event_description)
+                    event_description = tp.LEADING_NA_RE.sub('', event_description)
                     
                     # Преобразуем текстовую дату в формат YYYY-MM-DD
                     today = datetime.now().date()
@@ -439,27 +535,21 @@ class LLMClient:
                     }
                 else:
                     # Проверяем, может быть, в описании есть дата в формате DD.MM.YYYY или YYYY-MM-DD
-                    date_patterns = [
-                        r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD
-                        r'(\d{2}\.\d{2}\.\d{4})',  # DD.MM.YYYY
-                        r'(\d{2}/\d{2}/\d{4})'   # DD/MM/YYYY
-                    ]
-                    
-                    for date_pattern in date_patterns:
-                        date_match = re.search(date_pattern, full_description)
+                    for date_pattern in tp.DELETE_DATE_RES:
+                        date_match = date_pattern.search(full_description)
                         if date_match:
                             event_date = date_match.group(1)
                             # Конвертируем DD.MM.YYYY или DD/MM/YYYY в YYYY-MM-DD, если нужно
                             if '.' in event_date or '/' in event_date:
-                                parts = re.split(r'[.\-/]', event_date)
+                                parts = tp.DATE_SEPARATOR_RE.split(event_date)
                                 if len(parts) == 3:
                                     if len(parts[2]) == 4:  # Год в формате YYYY
                                         event_date = f"{parts[2]}-{parts[1]:>02s}-{parts[0]:>02s}"
                             
-                            event_description = re.sub(date_pattern, '', full_description).strip()
+                            event_description = date_pattern.sub('', full_description).strip()
                             # Убираем лишние пробелы и союзы
-                            event_description = re.sub(r'^в\s*', '', event_description)
-                            event_description = re.sub(r'^на\s*', '', event_description)
+                            event_description = tp.LEADING_V_RE.sub('', event_description)
+                            event_description = tp.LEADING_NA_RE.sub('', event_description)
                             
                             return {
                                 'intent': 'delete',
@@ -476,7 +566,7 @@ class LLMClient:
         
         return {'intent': 'unknown'}
 
-    def is_meaningful_goal(self, goal_text: str) -> bool:
+    async def is_meaningful_goal(self, goal_text: str) -> bool:
         """Проверяет, является ли цель осмысленной"""
         try:
             # Простая эвристика для определения бессмыслицы
@@ -543,25 +633,15 @@ class LLMClient:
             Ответь: ДА или НЕТ
             """
 
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-
-            payload = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.1,
-                "max_tokens": 100
-            }
-
             logger.debug(f"Отправляю запрос к LLM для проверки осмысленности цели: {goal_text}")
             
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            llm_data = response.json()
-            content = llm_data['choices'][0]['message']['content'].strip()
+            content = await self.transport.chat(
+                [{"role": "user", "content": prompt}],
+                temperature=0.1,
+                max_tokens=100,
+                timeout=30,
+                method="is_meaningful_goal"
+            )
             logger.debug(f"Ответ LLM для проверки осмысленности: {content}")
             
             return "ДА" in content.upper()
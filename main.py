@@ -2,23 +2,29 @@ import logging
 import asyncio
 import os
 from datetime import datetime, timedelta
-from telegram import Update, ReplyKeyboardMarkup, Bot
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup, Bot
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
     ContextTypes,
     filters,
 )
-from flask import Flask, jsonify
-from threading import Thread
+from telegram.request import BaseRequest
  
 from config import Config
-from database import db
+from database import db, adb
 from llm_client import LLMClient
 from models import LLMResponse
 from scheduler import scheduler_instance
-import re
+from webhook_server import serve
+from update_processor import update_processor
+from rate_limiter import telegram_rate_limiter
+from conversation_state import conversation_persistence
+from coordination import coordinator
+from daily_digest import is_valid_timezone
+import text_processing
  
 
 # Настройка логирования
@@ -35,6 +41,11 @@ logger = logging.getLogger(__name__)
 # Инициализация клиентов
 llm_client = LLMClient()
 
+# Кнопки листания расписания: "schedule:<next|prev>:<event_id>:<start_time>"
+SCHEDULE_CALLBACK_PREFIX = "schedule"
+# Длинные описания обрезаются, чтобы страница помещалась в одно сообщение
+SCHEDULE_DESCRIPTION_LIMIT = 200
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
@@ -108,7 +119,8 @@ async def handle_clear_confirmation(update: Update, context: ContextTypes.DEFAUL
     if user_text == "✅ Да, очистить":
         try:
             # Очищаем события пользователя
-            deleted_count = db.clear_user_events(user_id)
+            deleted_count = await adb.clear_user_events(user_id)
+            scheduler_instance.cancel_user_notifications(user_id)
 
             # Восстанавливаем обычную клавиатуру
             keyboard = [["Посмотреть расписание", "Обновить расписание"]]
@@ -145,22 +157,34 @@ async def debug_db(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     try:
+        # Показываем долю сообщений, разобранных без обращения к LLM
+        stats = llm_client.get_stats()
+        await update.message.reply_text(
+            f"⚡ Быстрый разбор: {stats['fast_path_hits']}, запросов к LLM: {stats['llm_calls']}, "
+            f"fallback: {stats['llm_fallbacks']}, доля без LLM: {stats['fast_path_hit_rate']:.0%}\n"
+            f"🗄 Кэш LLM: попаданий {stats['cache']['hits']}, промахов {stats['cache']['misses']}, "
+            f"записей {stats['cache']['size']}, доля попаданий {stats['cache']['hit_rate']:.0%}"
+        )
+        schedule_stats = db.schedule_cache.get_stats()
+        await update.message.reply_text(
+            f"📅 Кэш расписания: попаданий {schedule_stats['hits']}, промахов {schedule_stats['misses']}, "
+            f"пользователей {schedule_stats['users']}, событий {schedule_stats['events']}, "
+            f"доля попаданий {schedule_stats['hit_rate']:.0%}"
+        )
+
         # Показываем все события пользователя
-        events = db.get_user_events(user_id, datetime.now() - timedelta(days=30), datetime.now() + timedelta(days=30))
+        events = await adb.get_user_events(user_id, datetime.now() - timedelta(days=30), datetime.now() + timedelta(days=30))
         
         if not events:
             await update.message.reply_text("📭 В базе данных нет событий для этого пользователя")
             
             # Покажем также информацию о пользователе
             try:
-                query = f"SELECT * FROM users WHERE user_id = %s"
-                with db.conn.cursor() as cur:
-                    cur.execute(query, (user_id,))
-                    user = cur.fetchone()
-                    if user:
-                        await update.message.reply_text(f"👤 Пользователь найден: ID={user[0]}, Имя={user[1]}")
-                    else:
-                        await update.message.reply_text("❌ Пользователь не найден в таблице users")
+                user = await adb.get_user(user_id)
+                if user:
+                    await update.message.reply_text(f"👤 Пользователь найден: ID={user[0]}, Имя={user[1]}")
+                else:
+                    await update.message.reply_text("❌ Пользователь не найден в таблице users")
             except Exception as e:
                 await update.message.reply_text(f"❌ Ошибка проверки пользователя: {e}")
                 
@@ -181,6 +205,38 @@ async def goal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Какую глобальную цель вы хотите поставить? Например: 'Выучить 100 английских слов за 30 дней' или 'Заниматься спортом 4 раза в неделю в течение 30 дней'.")
     context.user_data['awaiting_goal'] = True
 
+async def timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик команды /timezone: часовой пояс для ежедневного расписания в 10:00"""
+    user_id = update.effective_user.id
+    username = update.effective_user.username or update.effective_user.first_name
+
+    if not context.args:
+        timezone = await adb.get_user_timezone(user_id)
+        await update.message.reply_text(
+            f"🕙 Ваш часовой пояс: {timezone}. Ежедневное расписание приходит в "
+            f"{Config.DIGEST_HOUR}:00 по местному времени.\n"
+            "Чтобы изменить, отправьте, например: /timezone Europe/Berlin"
+        )
+        return
+
+    timezone = context.args[0]
+    if not is_valid_timezone(timezone):
+        await update.message.reply_text(
+            f"⚠️ Не знаю часовой пояс «{timezone}». Укажите его в формате Регион/Город, например Asia/Yekaterinburg."
+        )
+        return
+
+    try:
+        await adb.user_exists(user_id, username)
+        await adb.set_user_timezone(user_id, timezone)
+        await update.message.reply_text(
+            f"✅ Часовой пояс сохранен: {timezone}. Ежедневное расписание будет приходить в "
+            f"{Config.DIGEST_HOUR}:00 по местному времени."
+        )
+    except Exception as e:
+        logger.error(f"Ошибка сохранения часового пояса: {e}")
+        await update.message.reply_text("⚠️ Извините, не удалось сохранить часовой пояс.")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     user_text = update.message.text
@@ -227,7 +283,7 @@ async def handle_goal_creation(update: Update, context: ContextTypes.DEFAULT_TYP
     # Прежде чем генерировать план, проверим, является ли цель осмысленной
     try:
         # Проверяем осмысленность цели с помощью LLM
-        is_meaningful = llm_client.is_meaningful_goal(goal_description)
+        is_meaningful = await llm_client.is_meaningful_goal(goal_description)
         
         if not is_meaningful:
             await update.message.reply_text(
@@ -241,7 +297,7 @@ async def handle_goal_creation(update: Update, context: ContextTypes.DEFAULT_TYP
         
         await update.message.reply_text(f"Отлично! Ваша цель: '{goal_description}'. Я уже работаю над планом для ее достижения...")
 
-        plan = llm_client.generate_training_plan(goal_description)
+        plan = await llm_client.generate_training_plan(goal_description)
 
         if not plan:
             await update.message.reply_text("К сожалению, мне не удалось составить план для вашей цели. Попробуйте сформулировать ее по-другому.")
@@ -293,20 +349,38 @@ async def handle_goal_confirmation(update: Update, context: ContextTypes.DEFAULT
             await update.message.reply_text("Что-то пошло не так, я не смог найти план. Попробуйте еще раз.", reply_markup=reply_markup)
         else:
             # Save the goal
-            goal_id = db.save_goal(user_id, goal_description, 2) # priority = 2 (default)
+            goal_id = await adb.save_goal(user_id, goal_description, 2) # priority = 2 (default)
 
+            llm_responses = []
+            failed = 0
             for event in plan:
-                llm_response = LLMResponse(
-                    date=event['date'],
-                    time="???",
-                    description=event['description'],
-                    priority=2,
-                    original_text=event['description']
+                try:
+                    llm_responses.append(LLMResponse(
+                        date=event['date'],
+                        time="???",
+                        description=event['description'],
+                        priority=2,
+                        original_text=event['description']
+                    ))
+                except (KeyError, ValueError) as e:
+                    logger.warning(f"⚠️ Некорректный шаг плана пропущен: {event} ({e})")
+                    failed += 1
+
+            # Все шаги плана сохраняются одним запросом
+            results = await asyncio.to_thread(
+                scheduler_instance.process_events_bulk, user_id, llm_responses, username, goal_id
+            )
+            failed += sum(1 for result in results if not result.get("success"))
+
+            if failed == len(plan):
+                await update.message.reply_text("Не удалось добавить план в расписание. Попробуйте еще раз.", reply_markup=reply_markup)
+            elif failed:
+                await update.message.reply_text(
+                    f"План добавлен в ваше расписание, но {failed} из {len(plan)} шагов сохранить не удалось.",
+                    reply_markup=reply_markup
                 )
-                # Pass goal_id to process_event
-                await asyncio.to_thread(scheduler_instance.process_event, user_id, llm_response, username, goal_id)
-            
-            await update.message.reply_text("Отлично! План добавлен в ваше расписание.", reply_markup=reply_markup)
+            else:
+                await update.message.reply_text("Отлично! План добавлен в ваше расписание.", reply_markup=reply_markup)
             context.user_data.pop('generated_plan', None)
             context.user_data.pop('goal_description', None)
 
@@ -324,21 +398,13 @@ async def process_natural_language(
         logger.info(f"📨 Обрабатываю запрос: '{text}'")
 
         # Извлекаем структурированную информацию с помощью LLM
-        llm_response = llm_client.extract_event_info(text)
+        llm_response = await llm_client.extract_event_info(text)
 
         # Если есть время, но нет явной даты – используем последнюю дату из контекста
         text_lower = text.lower()
-        has_explicit_date = (
-            re.search(r"\b(сегодня|завтра|послезавтра|после завтра)\b", text_lower)
-            or re.search(r"\b(январ|феврал|март|апрел|ма[йi]|июн|июл|август|сентябр|октябр|ноябр|декабр)\w*\b", text_lower)
-            or re.search(r"\b\d{4}-\d{2}-\d{2}\b", text_lower)
-            or re.search(r"\b\d{1,2}[./-]\d{1,2}(?:[./-]\d{2,4})?\b", text_lower)
-        )
-        has_time = re.search(r"\b\d{1,2}([:.]\d{2})?\b", text_lower) is not None or any(
-            w in text_lower for w in ["час", "часов"]
-        )
+        explicit_date = text_processing.has_explicit_date(text_lower)
         last_date = context.user_data.get("last_date") if hasattr(context, "user_data") else None
-        if not has_explicit_date and has_time and last_date and llm_response.time != "???":
+        if not explicit_date and text_processing.has_time(text_lower) and last_date and llm_response.time != "???":
             llm_response.date = last_date
         logger.info(f"📊 Извлеченные данные: date={llm_response.date}, time='{llm_response.time}', desc='{llm_response.description}'")
         logger.info(f"🔍 Тип события: {'БЕЗ ВРЕМЕНИ' if llm_response.time == '???' else 'С ВРЕМЕНЕМ'}")
@@ -349,19 +415,13 @@ async def process_natural_language(
         if has_event:
             try:
                 # Сохраняем в базу данных
-                result = scheduler_instance.process_event(user_id, llm_response, username)
+                result = await asyncio.to_thread(scheduler_instance.process_event, user_id, llm_response, username)
                 logger.info(f"📋 Результат сохранения: {result}")
 
-                # Проверяем, действительно ли событие сохранилось
-                if result.get("success", False):
-                    # Проверяем существование события в БД
-                    event_exists = db.check_event_exists(user_id, llm_response.description, llm_response.date)
-                    logger.info(f"🔍 Событие существует в БД: {event_exists}")
-                    
-                    if not event_exists:
-                        logger.error("❌ Событие не было сохранено в БД!")
-                        await update.message.reply_text("⚠️ Не удалось сохранить событие в базу данных. Попробуйте еще раз.")
-                        return
+                # Запрос сохранения сам сообщает, было ли такое событие раньше
+                if result.get("duplicate"):
+                    await update.message.reply_text(f"ℹ️ {result['message']}")
+                    return
 
                 # Подготавливаем данные для ответа
                 response_data = {
@@ -369,6 +429,8 @@ async def process_natural_language(
                     "time": llm_response.time,
                     "end_time": llm_response.end_time,
                     "date": llm_response.date,
+                    # Упоминать напоминание, только если оно действительно запланировано
+                    "reminder": result.get("reminder", False),
                 }
 
                 # Добавляем информацию о конфликте если есть
@@ -377,7 +439,7 @@ async def process_natural_language(
 
                 # Генерируем человеческий ответ через LLM только если событие успешно сохранено
                 if result["success"]:
-                    human_response = llm_client.generate_human_response(
+                    human_response = await llm_client.generate_human_response(
                         response_data, conflict=False, user_text=text
                     )
                 else:
@@ -387,7 +449,7 @@ async def process_natural_language(
                 await update.message.reply_text(human_response)
 
                 # Сохраняем последнюю явно указанную дату для коротких команд со временем
-                if hasattr(context, "user_data") and llm_response.date and has_explicit_date:
+                if hasattr(context, "user_data") and llm_response.date and explicit_date:
                     context.user_data["last_date"] = llm_response.date
                 
             except Exception as e:
@@ -400,7 +462,7 @@ async def process_natural_language(
                     
         else:
             # Генерируем ответ на некорректный запрос
-            human_response = llm_client.generate_human_response(
+            human_response = await llm_client.generate_human_response(
                 {}, conflict=False, user_text=text
             )
             await update.message.reply_text(human_response)
@@ -417,8 +479,7 @@ async def process_natural_language(
                 date_str = today.strftime("%Y-%m-%d")
                 
             # Извлекаем описание
-            description = re.sub(r'(сегодня|завтра|послезавтра|в\s+\d+[:.]?\d*)', '', text, flags=re.IGNORECASE)
-            description = re.sub(r'\s+', ' ', description).strip()
+            description = text_processing.collapse_spaces(text_processing.DATE_AND_HOUR_RE.sub('', text))
             
             if not description:
                 description = text
@@ -456,7 +517,9 @@ async def handle_delete_event(update: Update, user_id: int, text: str):
             return
 
         # Удаляем событие (с датой, если она указана)
-        success = db.delete_event(user_id, event_description, event_date)
+        deleted_ids = await adb.delete_events(user_id, event_description, event_date)
+        success = len(deleted_ids) > 0
+        scheduler_instance.cancel_queued_notifications(deleted_ids)
 
         if success:
             if event_date:
@@ -484,142 +547,114 @@ async def handle_delete_event(update: Update, user_id: int, text: str):
         )
 
 
+def format_schedule_page(events: list) -> str:
+    """Формирует текст страницы расписания (события уже отсортированы по времени)"""
+    events_by_date = {}
+    for event in events:
+        event_id, event_description, start_time, end_time, event_priority, is_all_day = event
+        event_date = start_time.strftime("%d.%m.%Y")
+
+        if len(event_description) > SCHEDULE_DESCRIPTION_LIMIT:
+            event_description = event_description[:SCHEDULE_DESCRIPTION_LIMIT] + "…"
+
+        if is_all_day:
+            line = f"• Весь день - {event_description}"
+        else:
+            if end_time and end_time > start_time and end_time.date() == start_time.date():
+                event_time_str = f"{start_time.strftime('%H:%M')}–{end_time.strftime('%H:%M')}"
+            else:
+                event_time_str = start_time.strftime("%H:%M")
+            line = f"• {event_time_str} - {event_description}"
+
+        events_by_date.setdefault(event_date, []).append(line)
+
+    schedule_text = "📅 Ваше расписание (предстоящие события):\n\n"
+    for date, lines in events_by_date.items():
+        schedule_text += f"📆 {date}:\n"
+        for line in lines:
+            schedule_text += f"  {line}\n"
+        schedule_text += "\n"
+    return schedule_text.rstrip()
+
+
+async def render_schedule_page(user_id: int, cursor=None, backward: bool = False):
+    """Загружает страницу расписания. Возвращает (текст, кнопки) или None, если событий нет"""
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    until = today_start + timedelta(days=365)
+
+    events, has_more = await adb.get_user_events_page(
+        user_id, today_start, until, cursor, backward, Config.SCHEDULE_PAGE_SIZE
+    )
+    if not events and backward:
+        # Предыдущие события успели удалить - показываем первую страницу
+        events, has_more = await adb.get_user_events_page(
+            user_id, today_start, until, None, False, Config.SCHEDULE_PAGE_SIZE
+        )
+        cursor, backward = None, False
+    if not events:
+        return None
+
+    has_previous = has_more if backward else cursor is not None
+    has_next = True if backward else has_more
+
+    buttons = []
+    if has_previous:
+        first = events[0]
+        buttons.append(InlineKeyboardButton(
+            "◀️ Назад", callback_data=f"{SCHEDULE_CALLBACK_PREFIX}:prev:{first[0]}:{first[2].isoformat()}"
+        ))
+    if has_next:
+        last = events[-1]
+        buttons.append(InlineKeyboardButton(
+            "Вперед ▶️", callback_data=f"{SCHEDULE_CALLBACK_PREFIX}:next:{last[0]}:{last[2].isoformat()}"
+        ))
+    reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+    return format_schedule_page(events), reply_markup
+
+
 async def show_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показать только будущие события пользователя"""
+    """Показать первую страницу предстоящих событий пользователя"""
     user_id = update.effective_user.id
 
     try:
-        # Получаем все события
-        past_date = datetime.now() - timedelta(days=365)
-        future_date = datetime.now() + timedelta(days=365)
-
-        events = db.get_user_events(user_id, past_date, future_date)
-        logger.info(f"Все события из БД: {events}")
-
-        if not events:
+        page = await render_schedule_page(user_id)
+        if page is None:
             await update.message.reply_text(
-                "📅 У вас пока нет запланированных событий!"
+                "📅 У вас пока нет предстоящих событий! Запланируйте новые."
             )
             return
 
-        # Фильтруем: оставляем только будущие события (включая сегодняшние)
-        current_time = datetime.now()
-        future_events = []
+        schedule_text, reply_markup = page
+        await update.message.reply_text(schedule_text, reply_markup=reply_markup)
 
-        for event in events:
-            event_time = event[2]
-            is_all_day = event[5]
-            
-            # Для событий на весь день (без времени) показываем если дата >= сегодня
-            if is_all_day or event_time is None:
-                # Для событий без времени проверяем только дату
-                if event_time is not None:
-                    event_date = event_time.date()
-                else:
-                    # Если event_time None, но событие на весь день, используем текущую дату как fallback
-                    # Но для корректной работы нужно определить дату из события
-                    # В этом случае используем текущую дату как fallback, но это не идеально
-                    # Лучше использовать today(), но для реальных событий нужно получить правильную дату
-                    event_date = datetime.now().date()
-                if event_date >= current_time.date():
-                    future_events.append(event)
-            else:
-                # Для событий с временем проверяем полное время
-                if event_time >= current_time:
-                    future_events.append(event)
+    except Exception as e:
+        logger.error(f"Ошибка получения расписания: {e}")
+        await update.message.reply_text("⚠️ Не удалось загрузить расписание. Попробуйте позже.")
 
-        if not future_events:
-            await update.message.reply_text(
-                "📅 Все ваши события уже прошли! Запланируйте новые."
-            )
-            return
 
-        # Группируем события по датам
-        events_by_date = {}
-        # Регулярка для удаления ведущего времени из описания ("в 9", "08:30", "8.30", и т.п.)
-        time_prefix_re = re.compile(r"^\s*(в\s*)?([01]?\d|2[0-3])([:.]\d{2})?\s*[-—:]?\s*", re.IGNORECASE)
-        for event in future_events:
-            event_id, event_description, start_time, end_time, event_priority, is_all_day = event
-            
-            # Безопасная обработка даты
-            if start_time:
-                event_date = start_time.strftime("%d.%m.%Y")
-            else:
-                event_date = datetime.now().strftime("%d.%m.%Y")
+async def handle_schedule_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание расписания кнопками «Назад» / «Вперед»"""
+    query = update.callback_query
+    await query.answer()
 
-            # Приоритетные эмодзи убраны
+    try:
+        _, direction, event_id, start_time = query.data.split(":", 3)
+        cursor = (datetime.fromisoformat(start_time), int(event_id))
+    except ValueError:
+        logger.warning(f"⚠️ Некорректные данные кнопки расписания: {query.data}")
+        return
 
-            if is_all_day:
-                # Событие на весь день
-                if event_date not in events_by_date:
-                    events_by_date[event_date] = []
-                events_by_date[event_date].append(f"• Весь день - {event_description}")
-            else:
-                # Событие с временем
-                if end_time and end_time > start_time and end_time.date() == start_time.date():
-                    event_time_str = f"{start_time.strftime('%H:%M')}–{end_time.strftime('%H:%M')}"
-                else:
-                    event_time_str = start_time.strftime("%H:%M")
-                # Убираем возможное повторение времени в начале описания
-                event_description = time_prefix_re.sub("", event_description).strip()
-                # Убираем шаблон диапазона "с .. до .." в начале описания
-                event_description = re.sub(r"^\s*с\s*\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*(до|–|-|—)\s*\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*", "", event_description, flags=re.IGNORECASE).strip()
-                if event_date not in events_by_date:
-                    events_by_date[event_date] = []
-                events_by_date[event_date].append(f"• {event_time_str} - {event_description}")
-
-        # Формируем текст расписания
-        schedule_text = "📅 Ваше расписание (предстоящие события):\n\n"
-
-        # Сортируем даты в хронологическом порядке
-        sorted_dates = sorted(
-            events_by_date.keys(), key=lambda x: datetime.strptime(x, "%d.%m.%Y")
-        )
+    try:
+        page = await render_schedule_page(query.from_user.id, cursor, backward=direction == "prev")
+        if page is None:
+            await query.edit_message_text("📅 У вас пока нет предстоящих событий! Запланируйте новые.")
+            return
 
-        for date in sorted_dates:
-            schedule_text += f"📆 {date}:\n"
-            
-            # Выводим все события для этой даты
-            for event in events_by_date[date]:
-                schedule_text += f"  {event}\n"
-            
-            schedule_text += "\n"
-
-        # Добавляем информацию о количестве событий
-        schedule_text += f"Всего предстоящих событий: {len(future_events)}"
-
-        # Если расписание слишком длинное, разбиваем на части
-        if len(schedule_text) > 4000:
-            parts = [
-                schedule_text[i : i + 4000] for i in range(0, len(schedule_text), 4000)
-            ]
-            for part in parts:
-                await update.message.reply_text(part)
-        else:
-            await update.message.reply_text(schedule_text)
+        schedule_text, reply_markup = page
+        await query.edit_message_text(schedule_text, reply_markup=reply_markup)
 
     except Exception as e:
-        logger.error(f"Ошибка получения расписания: {e}")
-        import traceback
-        logger.error(f"Полная ошибка: {traceback.format_exc()}")
-        
-        # Попробуем простой запрос для отладки
-        try:
-            simple_events = db.get_user_events(user_id, datetime.now() - timedelta(days=1), datetime.now() + timedelta(days=30))
-            logger.info(f"Простой запрос вернул: {simple_events}")
-            
-            if simple_events:
-                simple_text = "📅 Ваши события:\n\n"
-                for event in simple_events:
-                    event_desc = event[1] if len(event) > 1 else "Неизвестное событие"
-                    event_time = event[2] if len(event) > 2 and event[2] else "Без времени"
-                    simple_text += f"• {event_desc} - {event_time}\n"
-                await update.message.reply_text(simple_text)
-            else:
-                await update.message.reply_text("📅 У вас нет запланированных событий!")
-        except Exception as simple_e:
-            logger.error(f"Даже простой запрос не работает: {simple_e}")
-            await update.message.reply_text(f"❌ Критическая ошибка БД: {str(e)[:200]}")
+        logger.error(f"Ошибка листания расписания: {e}")
 
 
 async def post_init(application: Application):
@@ -631,77 +666,75 @@ async def post_init(application: Application):
     logger.info("✅ Планировщик уведомлений инициализирован")
 
 
-def main():
-    """Запуск бота"""
-    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
+async def post_shutdown(application: Application):
+    """Освобождение ресурсов при остановке бота"""
+    # Закрываем пул HTTP-соединений к LLM
+    await llm_client.aclose()
+    # Останавливаем планировщик и закрываем пул соединений с базой данных
+    scheduler_instance.stop()
+    await adb.close()
+
+
+def build_application(request: BaseRequest = None) -> Application:
+    """Создает приложение бота со всеми обработчиками.
+
+    request подменяет HTTP-транспорт Bot API (например, в бенчмарках без Telegram).
+    """
+    # Разные пользователи обрабатываются параллельно, сообщения одного чата - строго по порядку
+    builder = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).concurrent_updates(update_processor)
+    # Все отправки идут через общий лимит: ответы пользователям раньше рассылок, RetryAfter - с повтором
+    builder = builder.rate_limiter(telegram_rate_limiter)
+    if request:
+        builder = builder.request(request).get_updates_request(request)
+    if conversation_persistence:
+        # Состояние диалогов (план цели, флаги ожидания) переживает перезапуск
+        builder = builder.persistence(conversation_persistence)
+    if Config.WEBHOOK_URL:
+        # Обновления приходят в webhook_server, Updater для polling не нужен
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Добавляем обработчики
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("clear", clear_schedule))
     application.add_handler(CommandHandler("goal", goal_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
     application.add_handler(CommandHandler("debug", debug_db))
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
+        CallbackQueryHandler(handle_schedule_page, pattern=f"^{SCHEDULE_CALLBACK_PREFIX}:")
     )
-    
-    # Добавляем post-инициализацию
-    application.post_init = post_init
-
-
-def run_bot():
-    """Запуск бота с polling"""
-    application = Application.builder().token(Config.TELEGRAM_BOT_TOKEN).build()
-    
-    # Добавляем обработчики
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("clear", clear_schedule))
-    application.add_handler(CommandHandler("goal", goal_command))
-    application.add_handler(CommandHandler("debug", debug_db))
     application.add_handler(
         MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
     )
     
     # Добавляем post-инициализацию
     application.post_init = post_init
+    application.post_shutdown = post_shutdown
+    return application
 
-    # Запускаем бота
-    logger.info("Бот запускается...")
-    application.run_polling()
-    logger.info("Бот успешно запущен")
-
-
-# Создаем Flask приложение для health check
-flask_app = Flask(__name__)
 
-@flask_app.route('/')
-def health_check():
-    return jsonify({"status": "healthy", "message": "Telegram bot is running"}), 200
+def get_metrics() -> dict:
+    """Внутренние счетчики для эндпоинта /stats"""
+    return {
+        "llm": llm_client.get_stats(),
+        "schedule_cache": db.schedule_cache.get_stats(),
+        "pending_reminders": len(scheduler_instance.reminders),
+        "updates": update_processor.get_stats(),
+        "telegram": telegram_rate_limiter.get_stats(),
+        "conversation_state": conversation_persistence.stats if conversation_persistence else {},
+        "coordination": coordinator.get_stats(),
+    }
 
-@flask_app.route('/health')
-def detailed_health():
-    return jsonify({"status": "ok"}), 200
 
+def run_bot():
+    """Запуск бота: webhook при заданном WEBHOOK_URL, иначе polling"""
+    application = build_application()
 
-def main():
-    """Запуск Flask сервера и бота"""
-    # Запускаем Flask сервер в отдельном потоке
-    from threading import Thread
-    import os
-    
-    port = int(os.environ.get('PORT', 8000))
-    
-    def run_flask():
-        flask_app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
-    
-    # Запускаем Flask в отдельном потоке
-    flask_thread = Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Запускаем бота в основном потоке
-    run_bot()
+    # Запускаем бота и HTTP-сервер (health check, метрики, webhook) в одном event loop
+    logger.info(f"Бот запускается в режиме {'webhook' if Config.WEBHOOK_URL else 'polling'}...")
+    asyncio.run(serve(application, get_metrics))
+    logger.info("Бот остановлен")
 
 
 if __name__ == "__main__":
-    main()
-
-
+    run_bot()
@@ -0,0 +1,66 @@
+import functools
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Границы корзин: запросы к БД - миллисекунды, LLM и обработка обновлений - секунды
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+UPDATE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LLM_REQUEST_SECONDS = Histogram(
+    "planner_llm_request_seconds", "Время запроса к LLM API",
+    ["method", "outcome"], buckets=LLM_BUCKETS,
+)
+EVENT_PARSE_TOTAL = Counter(
+    "planner_event_parse_total",
+    "Разбор сообщений о событиях по пути: fast, cache, llm или fallback (simple_event_parse после ошибки LLM)",
+    ["path"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "planner_db_query_seconds", "Время выполнения методов Database", ["method"], buckets=DB_BUCKETS,
+)
+UPDATE_SECONDS = Histogram(
+    "planner_update_seconds", "Время обработки обновления Telegram (без ожидания очереди чата)",
+    buckets=UPDATE_BUCKETS,
+)
+REMINDER_QUEUE_DEPTH = Gauge("planner_reminder_queue_depth", "Напоминаний в очереди")
+REMINDER_LAG_SECONDS = Histogram(
+    "planner_reminder_lag_seconds", "Опоздание отправки напоминания относительно запланированного времени",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300),
+)
+DIGEST_SECONDS = Histogram(
+    "planner_digest_seconds", "Длительность рассылки ежедневного расписания",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800),
+)
+DIGEST_SENT_TOTAL = Counter("planner_digest_sent_total", "Отправлено ежедневных расписаний")
+DIGEST_LIVE_RENDERS = Counter(
+    "planner_digest_live_renders_total", "Расписаний, собранных при рассылке из-за отсутствия готового текста",
+)
+TELEGRAM_SEND_ERRORS = Counter(
+    "planner_telegram_send_errors_total", "Ошибки отправки сообщений в Telegram", ["kind"],
+)
+REPLICAS = Gauge("planner_replicas", "Живых реплик бота (по таблице replicas)")
+REPLICA_LEADER = Gauge("planner_replica_leader", "1 - эта реплика лидер и выполняет задания по расписанию")
+TELEGRAM_RETRIES = Counter(
+    "planner_telegram_retries_total", "Повторные отправки после flood control (RetryAfter)", ["kind"],
+)
+
+
+def timed_query(func):
+    """Декоратор метода Database: время выполнения в planner_db_query_seconds"""
+    histogram = DB_QUERY_SECONDS.labels(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def render() -> tuple:
+    """Текст метрик в формате Prometheus и его Content-Type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
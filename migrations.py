@@ -0,0 +1,222 @@
+import psycopg2
+import logging
+from text_processing import display_description
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock: несколько экземпляров бота не должны применять миграции одновременно
+MIGRATIONS_LOCK_KEY = 827413
+
+# Версионированные миграции схемы: (версия, название, SQL).
+# Уже примененную миграцию не меняем - добавляем новую с большей версией.
+MIGRATIONS = [
+    (1, "reminders table", """
+        CREATE TABLE IF NOT EXISTS reminders (
+            event_id INTEGER PRIMARY KEY REFERENCES events(event_id) ON DELETE CASCADE,
+            user_id BIGINT NOT NULL,
+            remind_at TIMESTAMP NOT NULL,
+            sent_at TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_reminders_pending_remind_at
+            ON reminders (remind_at) WHERE sent_at IS NULL;
+    """),
+    # get_user_events, дубликаты в save_event и дневная сводка: user_id + диапазон start_time
+    (2, "events (user_id, start_time) index", """
+        CREATE INDEX IF NOT EXISTS idx_events_user_start_time
+            ON events (user_id, start_time);
+    """),
+    # check_event_exists и delete_event с датой: user_id + start_time::date
+    (3, "events (user_id, start_time::date) index", """
+        CREATE INDEX IF NOT EXISTS idx_events_user_start_date
+            ON events (user_id, (start_time::date));
+    """),
+    # Поиск по описанию через ILIKE '%...%'. pg_trgm есть не на всех серверах, а
+    # создать расширение может не хватить прав: тогда миграция ничего не делает
+    # (и не останавливает следующие), запросы работают через индекс по user_id
+    (4, "events description trigram index", """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                BEGIN
+                    CREATE EXTENSION pg_trgm;
+                EXCEPTION WHEN insufficient_privilege OR feature_not_supported OR undefined_file THEN
+                    RAISE NOTICE 'pg_trgm недоступно (%), индекс по описанию не создан', SQLERRM;
+                    RETURN;
+                END;
+            END IF;
+            CREATE INDEX IF NOT EXISTS idx_events_description_trgm
+                ON events USING gin (description_event gin_trgm_ops);
+        END
+        $$;
+    """),
+    # Уникальность событий для INSERT ... ON CONFLICT в save_event.
+    # Накопившиеся дубликаты удаляем, оставляя самую раннюю запись
+    (5, "events unique (user_id, description_event, start_time)", """
+        DELETE FROM events a
+        USING events b
+        WHERE a.user_id = b.user_id
+        AND a.description_event = b.description_event
+        AND a.start_time = b.start_time
+        AND a.event_id > b.event_id;
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_events_user_description_start
+            ON events (user_id, description_event, start_time);
+    """),
+    # Постраничное расписание: keyset по (start_time, event_id) внутри пользователя.
+    # Индекс заменяет (user_id, start_time) из миграции 2
+    (6, "events (user_id, start_time, event_id) index", """
+        CREATE INDEX IF NOT EXISTS idx_events_user_start_id
+            ON events (user_id, start_time, event_id);
+        DROP INDEX IF EXISTS idx_events_user_start_time;
+    """),
+    # Состояние диалогов (context.user_data) для conversation_state.PostgresStateStore
+    (7, "conversation_state table", """
+        CREATE TABLE IF NOT EXISTS conversation_state (
+            user_id BIGINT PRIMARY KEY,
+            data TEXT NOT NULL,
+            version BIGINT NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversation_state_updated_at
+            ON conversation_state (updated_at);
+    """),
+    # Описание для вывода в расписании сохраняется при записи события, а не очищается
+    # при каждом чтении. Старые строки заполняет backfill_display_descriptions
+    (8, "events display_description column", """
+        ALTER TABLE events ADD COLUMN IF NOT EXISTS display_description TEXT;
+    """),
+    # Готовые тексты ежедневного расписания: подготавливаются ночью, правятся при
+    # изменении событий пользователя, в 10:00 рассылка только читает их
+    (9, "daily_digests table", """
+        CREATE TABLE IF NOT EXISTS daily_digests (
+            user_id BIGINT NOT NULL,
+            digest_date DATE NOT NULL,
+            message TEXT NOT NULL,
+            rendered_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, digest_date)
+        );
+    """),
+    # Часовой пояс пользователя (имя IANA, NULL - Config.TIMEZONE): ежедневное
+    # расписание рассылается по поясам в 10:00 по местному времени
+    (10, "users timezone column", """
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS timezone TEXT;
+        CREATE INDEX IF NOT EXISTS idx_users_timezone ON users (timezone);
+    """),
+    # Несколько реплик бота: аренды (лидер выполняет задания по расписанию), живые
+    # реплики (делят напоминания по user_id) и время изменения напоминания, по
+    # которому владелец подхватывает напоминания, созданные другими репликами
+    (11, "leases, replicas and reminders.updated_at", """
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at TIMESTAMP NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS replicas (
+            replica_id TEXT PRIMARY KEY,
+            heartbeat_at TIMESTAMP NOT NULL
+        );
+        ALTER TABLE reminders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT NOW();
+        CREATE INDEX IF NOT EXISTS idx_reminders_pending_updated_at
+            ON reminders (updated_at) WHERE sent_at IS NULL;
+    """),
+    # Последний обработанный слот заданий по расписанию: новый лидер досылает
+    # слоты, пропущенные, пока аренда лидера ни у кого не была
+    (12, "job_runs table", """
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_slot TIMESTAMPTZ
+        );
+    """),
+]
+
+
+def apply_migrations(database) -> int:
+    """Применяет непримененные миграции и возвращает их количество.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью в
+    schema_migrations, поэтому повторный запуск безопасен.
+    """
+    applied_count = 0
+    with database.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                """)
+                cur.execute("SELECT version FROM schema_migrations")
+                applied = {row[0] for row in cur.fetchall()}
+            conn.commit()
+
+            for version, name, sql in MIGRATIONS:
+                if version in applied:
+                    continue
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(sql)
+                        cur.execute(
+                            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (version, name)
+                        )
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    # Следующие миграции могут зависеть от этой - останавливаемся
+                    logger.error(f"❌ Ошибка миграции {version} ({name}): {e}")
+                    break
+                applied_count += 1
+                logger.info(f"✅ Применена миграция {version}: {name}")
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+            conn.commit()
+
+    if applied_count == 0:
+        logger.info("📊 Схема базы данных актуальна")
+    return applied_count
+
+
+def backfill_display_descriptions(database, batch_size: int = 1000) -> int:
+    """Заполняет display_description у событий, сохраненных до миграции 8.
+
+    Каждая порция - отдельная короткая транзакция: строки блокируются через
+    SKIP LOCKED, поэтому несколько экземпляров бота не мешают друг другу
+    и записи пользователей не ждут окончания всего прохода. Пока строка не
+    заполнена, запросы выводят исходное описание. Возвращает число строк.
+    """
+    total = 0
+    try:
+        while True:
+            with database.cursor() as cur:
+                cur.execute("""
+                    SELECT event_id, description_event, is_all_day
+                    FROM events
+                    WHERE display_description IS NULL
+                    ORDER BY event_id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (batch_size,))
+                rows = cur.fetchall()
+                if rows:
+                    cur.execute("""
+                        UPDATE events e
+                        SET display_description = t.display
+                        FROM unnest(%s::int[], %s::text[]) AS t(event_id, display)
+                        WHERE e.event_id = t.event_id
+                    """, (
+                        [row[0] for row in rows],
+                        [display_description(row[1], row[2]) for row in rows],
+                    ))
+            total += len(rows)
+            if len(rows) < batch_size:
+                break
+    except Exception as e:
+        logger.error(f"❌ Ошибка заполнения описаний для вывода: {e}")
+
+    if total:
+        logger.info(f"✅ Заполнены описания для вывода у {total} событий")
+    return total
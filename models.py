@@ -50,3 +50,8 @@ class EventConflict(BaseModel):
     is_conflict: bool
     conflicting_event_description: Optional[str] = None
     conflicting_event_time: Optional[str] = None
+
+
+class FastParseResult(BaseModel):
+    event: Optional[LLMResponse] = None
+    confidence: float = 0.0  # 0..1, уверенность быстрого разбора без LLM
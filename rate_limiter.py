@@ -0,0 +1,184 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.ext import BaseRateLimiter
+from config import Config
+from metrics import TELEGRAM_RETRIES
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты отправки (rate_limit_args): меньше - раньше. Ответы пользователю без аргумента - interactive
+PRIORITIES = {"interactive": 0, "reminder": 1, "digest": 2}
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """Возвращает паузу из RetryAfter в секундах (в разных версиях PTB - int или timedelta)"""
+    value = error.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Ошибку отправки стоит повторить позже: flood control или сбой сети (но не отказ Telegram)"""
+    return isinstance(error, RetryAfter) or (isinstance(error, NetworkError) and not isinstance(error, BadRequest))
+
+
+class TokenBucket:
+    """Асинхронный token bucket: не более rate операций в секунду с запасом capacity"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Ждет, пока в корзине появится токен, и забирает его"""
+        # Lock сохраняет очередность ожидающих: токены выдаются в порядке запросов
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def is_idle(self) -> bool:
+        """Корзина полна и никто не ждет - ее можно удалить"""
+        self._refill()
+        return self.tokens >= self.capacity and not self._lock.locked()
+
+
+class PriorityTokenBucket(TokenBucket):
+    """Token bucket, который при нехватке токенов обслуживает ожидающих по приоритету.
+
+    Пока токены есть, запросы проходят сразу. Иначе они встают в кучу
+    (приоритет, порядок прихода), и одна задача раздает токены по мере
+    пополнения: ответ пользователю обгонит рассылку, которая ждет лимита.
+    pause() останавливает выдачу токенов (flood control Telegram).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        super().__init__(rate, capacity)
+        self._waiters = []
+        self._order = itertools.count()
+        self._paused_until = 0.0
+        self._dispatcher = None
+
+    async def acquire(self, priority: int = 0):
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and time.monotonic() >= self._paused_until:
+            self.tokens -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _dispatch(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            # Отмененный запрос токен не тратит
+            if not waiter.done():
+                self.tokens -= 1
+                waiter.set_result(None)
+
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity and not self._waiters
+
+
+class TelegramRateLimiter(BaseRateLimiter):
+    """Все запросы бота к Telegram проходят здесь (Application.builder().rate_limiter).
+
+    Сообщения в чаты ограничиваются общим лимитом и лимитом на чат; при
+    нехватке общего лимита вперед идут ответы пользователям, затем
+    напоминания, затем ежедневное расписание (приоритет передается через
+    rate_limit_args). На RetryAfter отправка всех сообщений
+    приостанавливается на указанное Telegram время, и запрос повторяется
+    до max_retries раз; после этого ошибка уходит вызывающему коду.
+    """
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, max_retries: int):
+        self.global_bucket = PriorityTokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self.stats = {"sent": 0, "retries": 0, "failed": 0}
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def _acquire(self, chat_id, priority: int):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, capacity=self.chat_burst)
+        await bucket.acquire()
+        await self.global_bucket.acquire(priority)
+        # Не копим корзины неактивных чатов
+        if len(self._chat_buckets) > 10000:
+            self._chat_buckets = {
+                key: value for key, value in self._chat_buckets.items() if not value.is_idle()
+            }
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        kind = rate_limit_args or "interactive"
+        chat_id = data.get("chat_id")
+        for attempt in itertools.count():
+            # Лимиты касаются только сообщений в чаты; getMe, answerCallbackQuery и т.п. идут сразу
+            if chat_id is not None:
+                await self._acquire(chat_id, PRIORITIES.get(kind, 0))
+            try:
+                result = await callback(*args, **kwargs)
+                self.stats["sent"] += 1
+                return result
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                self.global_bucket.pause(delay)
+                if attempt >= self.max_retries:
+                    self.stats["failed"] += 1
+                    logger.error(f"❌ {endpoint} в чат {chat_id}: flood control не снят после {attempt + 1} попыток")
+                    raise
+                self.stats["retries"] += 1
+                TELEGRAM_RETRIES.labels(kind).inc()
+                logger.warning(f"⚠️ Flood control ({endpoint}, {kind}), повтор через {delay} с")
+                if chat_id is None:
+                    await asyncio.sleep(delay)
+
+    def get_stats(self) -> dict:
+        """Счетчики отправки и очередь ожидающих общего лимита"""
+        return {**self.stats, "queued": self.global_bucket.queued(), "chats": len(self._chat_buckets)}
+
+
+# Глобальный экземпляр
+telegram_rate_limiter = TelegramRateLimiter(
+    Config.TELEGRAM_GLOBAL_RATE, Config.TELEGRAM_CHAT_RATE, Config.TELEGRAM_CHAT_BURST, Config.TELEGRAM_MAX_RETRIES
+)
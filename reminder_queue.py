@@ -0,0 +1,126 @@
+from typing import Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Элемент очереди: (время напоминания в секундах epoch, event_id, user_id)
+Reminder = Tuple[float, int, int]
+
+
+class ReminderQueue:
+    """Индексированная min-куча напоминаний.
+
+    Хранит кортежи (remind_at, event_id, user_id) в одном списке и индекс
+    event_id -> позиция в куче, поэтому добавление, перенос и отмена
+    стоят O(log n), а все напоминания одного тика извлекаются вместе.
+    Не потокобезопасна: используется только из event loop.
+    """
+
+    def __init__(self):
+        self._heap: List[Reminder] = []
+        self._positions: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, event_id: int) -> bool:
+        return event_id in self._positions
+
+    def peek_time(self) -> Optional[float]:
+        """Время ближайшего напоминания или None, если очередь пуста"""
+        return self._heap[0][0] if self._heap else None
+
+    def push(self, event_id: int, user_id: int, remind_at: float):
+        """Добавляет напоминание или переносит существующее на новое время"""
+        index = self._positions.get(event_id)
+        if index is not None:
+            old_time = self._heap[index][0]
+            self._heap[index] = (remind_at, event_id, user_id)
+            if remind_at < old_time:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+            return
+
+        self._heap.append((remind_at, event_id, user_id))
+        self._positions[event_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def bulk_load(self, reminders: Iterable[Reminder]):
+        """Загружает много напоминаний за O(n) (heapify вместо n вставок).
+
+        event_id внутри reminders должны быть уникальны (как в таблице reminders).
+        """
+        for remind_at, event_id, user_id in reminders:
+            if event_id in self._positions:
+                self.cancel(event_id)
+            self._heap.append((remind_at, event_id, user_id))
+        for index in reversed(range(len(self._heap) // 2)):
+            self._sift_down(index)
+        self._positions = {entry[1]: index for index, entry in enumerate(self._heap)}
+
+    def cancel(self, event_id: int) -> bool:
+        """Отменяет напоминание за O(log n). Возвращает False, если его не было"""
+        index = self._positions.pop(event_id, None)
+        if index is None:
+            return False
+
+        last = self._heap.pop()
+        if index < len(self._heap):
+            # На место удаленного ставим последний элемент и восстанавливаем кучу
+            self._heap[index] = last
+            self._positions[last[1]] = index
+            self._sift_up(index)
+            self._sift_down(self._positions[last[1]])
+        return True
+
+    def cancel_user(self, user_id: int) -> int:
+        """Отменяет все напоминания пользователя (полный проход, для редких операций)"""
+        event_ids = [entry[1] for entry in self._heap if entry[2] == user_id]
+        for event_id in event_ids:
+            self.cancel(event_id)
+        return len(event_ids)
+
+    def pop_due(self, now: float) -> List[Reminder]:
+        """Извлекает все напоминания со временем не позже now"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = self._heap[0]
+            self.cancel(entry[1])
+            due.append(entry)
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._positions.clear()
+
+    def _sift_up(self, index: int):
+        heap = self._heap
+        entry = heap[index]
+        while index > 0:
+            parent = (index - 1) >> 1
+            if heap[parent] <= entry:
+                break
+            heap[index] = heap[parent]
+            self._positions[heap[index][1]] = index
+            index = parent
+        heap[index] = entry
+        self._positions[entry[1]] = index
+
+    def _sift_down(self, index: int):
+        heap = self._heap
+        size = len(heap)
+        entry = heap[index]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if entry <= heap[child]:
+                break
+            heap[index] = heap[child]
+            self._positions[heap[index][1]] = index
+            index = child
+        heap[index] = entry
+        self._positions[entry[1]] = index
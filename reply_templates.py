@@ -0,0 +1,87 @@
+import itertools
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReplyGenerator:
+    """Локальные ответы-подтверждения о запланированных событиях без запроса к LLM"""
+
+    TIMED_TEMPLATES = [
+        "Готово! {Description} — {date_phrase} в {time}.",
+        "Записал: {description}, {date_phrase} в {time}.",
+        "Отлично, {description} стоит в расписании {date_phrase} на {time}.",
+        "Договорились: {date_phrase} в {time} — {description}.",
+        "Есть! В расписании {date_phrase} в {time}: {description}.",
+    ]
+
+    RANGE_TEMPLATES = [
+        "Готово! {Description} — {date_phrase} с {time} до {end_time}.",
+        "Записал: {description}, {date_phrase}, {time}–{end_time}.",
+        "Отлично, {date_phrase} с {time} до {end_time} у вас {description}.",
+        "Договорились: {description} {date_phrase} с {time} до {end_time}.",
+        "В расписании: {description}, {date_phrase} {time}–{end_time}.",
+    ]
+
+    ALL_DAY_TEMPLATES = [
+        "Готово! {Description} — {date_phrase}, на весь день.",
+        "Записал на {date_phrase}: {description}. Время не указано, так что это задача на весь день.",
+        "Отлично, {description} стоит в расписании {date_phrase} без конкретного времени.",
+        "Договорились: {date_phrase} — {description}, в любое удобное время.",
+        "Добавил на {date_phrase}: {description}. Весь день в вашем распоряжении.",
+    ]
+
+    # Добавляется, только если напоминание действительно запланировано (event_data["reminder"]):
+    # для события меньше чем через час и для события на весь день его нет
+    REMINDER_NOTE = " Напомню за час до начала."
+
+    def __init__(self):
+        # Шаблоны выдаются по кругу, чтобы подряд идущие ответы не повторялись
+        self._timed = itertools.cycle(self.TIMED_TEMPLATES)
+        self._range = itertools.cycle(self.RANGE_TEMPLATES)
+        self._all_day = itertools.cycle(self.ALL_DAY_TEMPLATES)
+
+    @staticmethod
+    def format_date_phrase(date_str: str) -> str:
+        """Превращает YYYY-MM-DD в "сегодня", "завтра", "послезавтра" или DD.MM.YYYY"""
+        try:
+            event_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return str(date_str)
+
+        today = datetime.now().date()
+        if event_date == today:
+            return "сегодня"
+        if event_date == today + timedelta(days=1):
+            return "завтра"
+        if event_date == today + timedelta(days=2):
+            return "послезавтра"
+        return event_date.strftime("%d.%m.%Y")
+
+    def render(self, event_data: dict) -> str:
+        """Формирует подтверждение для события с временем, диапазоном или на весь день"""
+        description = event_data.get("description", "")
+        values = {
+            "description": description,
+            # Вариант с заглавной буквой для начала предложения
+            "Description": description[:1].upper() + description[1:],
+            "date_phrase": self.format_date_phrase(event_data.get("date")),
+        }
+
+        time_value = event_data.get("time")
+        if not time_value or time_value == "???":
+            template = next(self._all_day)
+        else:
+            values["time"] = time_value[:5]
+            end_time = event_data.get("end_time")
+            if end_time:
+                values["end_time"] = end_time[:5]
+                template = next(self._range)
+            else:
+                template = next(self._timed)
+
+        reply = template.format(**values)
+        if event_data.get("reminder"):
+            reply += self.REMINDER_NOTE
+        return reply
@@ -0,0 +1,200 @@
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _UserSchedule:
+    """Закэшированные события пользователя за окно [window_start, window_end]"""
+
+    __slots__ = ("window_start", "window_end", "expires_at", "keys", "timed", "undated")
+
+    def __init__(self, window_start: datetime, window_end: datetime, expires_at: float, events: List[Tuple]):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.expires_at = expires_at
+        # События с временем отсортированы по (началу, ID) - тому же ключу, что и страницы
+        # расписания в БД; keys - ключи для bisect
+        self.timed = sorted(
+            (event for event in events if event[2] is not None), key=lambda event: (event[2], event[0])
+        )
+        self.keys = [(event[2], event[0]) for event in self.timed]
+        # События без времени начала get_user_events возвращает для любого периода
+        self.undated = [event for event in events if event[2] is None]
+
+    def __len__(self) -> int:
+        return len(self.timed) + len(self.undated)
+
+
+class ScheduleCache:
+    """Потокобезопасный LRU-кэш предстоящих событий пользователей.
+
+    Для каждого пользователя хранится окно от начала текущего дня на days
+    дней вперед. Запросы get_user_events внутри окна отвечаются из кэша,
+    любая запись в события пользователя сбрасывает его окно. Общий объем
+    ограничен max_events событиями. Пользователи, у которых в окне больше
+    max_user_events событий, не кэшируются: их расписание читается из БД
+    постранично. Выключенный кэш (enabled=False) не покрывает ни один
+    период - все запросы идут в БД.
+    """
+
+    def __init__(self, max_events: int, ttl_seconds: float, days: int, max_user_events: int, enabled: bool = True):
+        self.enabled = enabled
+        self.max_events = max_events
+        self.max_user_events = max_user_events
+        self.ttl_seconds = ttl_seconds
+        self.days = days
+        self._entries: OrderedDict[int, _UserSchedule] = OrderedDict()
+        self._events_count = 0
+        # Счетчик изменений пользователя: загрузка, начатая до сброса, не попадет в кэш
+        self._generations: dict = {}
+        # Пользователи со слишком большим окном: ID -> до какого времени не пытаться кэшировать
+        self._oversized: dict = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def window(self) -> Tuple[datetime, datetime]:
+        """Окно, которое загружается в кэш для пользователя"""
+        day_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return day_start, day_start + timedelta(days=self.days)
+
+    def covers(self, start_date: datetime, end_date: datetime) -> bool:
+        """Можно ли ответить на запрос за этот период из кэша"""
+        if not self.enabled:
+            return False
+        window_start, window_end = self.window()
+        return window_start <= start_date and end_date <= window_end
+
+    def is_oversized(self, user_id: int) -> bool:
+        """У пользователя слишком много событий для кэша"""
+        with self._lock:
+            return self._oversized.get(user_id, 0) > time.monotonic()
+
+    def _lookup(self, user_id: int, start_date: datetime, end_date: datetime) -> Optional[_UserSchedule]:
+        """Запись пользователя, покрывающая период, с учетом статистики (вызывается под lock)"""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(user_id)
+        if (
+            entry is None
+            or entry.expires_at <= time.monotonic()
+            or not (entry.window_start <= start_date and end_date <= entry.window_end)
+        ):
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return entry
+
+    def get(self, user_id: int, start_date: datetime, end_date: datetime) -> Optional[List[Tuple]]:
+        """События пользователя за период (как get_user_events) или None при промахе"""
+        with self._lock:
+            entry = self._lookup(user_id, start_date, end_date)
+        if entry is None:
+            return None
+
+        # BETWEEN в запросе включает обе границы
+        first = bisect.bisect_left(entry.keys, (start_date,))
+        last = bisect.bisect_right(entry.keys, (end_date, math.inf))
+        return entry.timed[first:last] + entry.undated
+
+    def get_page(
+        self, user_id: int, since: datetime, until: datetime, now: datetime,
+        cursor: Optional[Tuple[datetime, int]], backward: bool, limit: int
+    ) -> Optional[Tuple[List[Tuple], bool]]:
+        """Страница расписания (как get_user_events_page) или None при промахе"""
+        with self._lock:
+            entry = self._lookup(user_id, since, until)
+        if entry is None:
+            return None
+
+        page = []
+        if backward:
+            index = (bisect.bisect_left(entry.keys, cursor) if cursor else len(entry.keys)) - 1
+            step = -1
+        else:
+            index = bisect.bisect_right(entry.keys, cursor) if cursor else bisect.bisect_left(entry.keys, (since,))
+            step = 1
+        while 0 <= index < len(entry.keys) and len(page) <= limit:
+            event = entry.timed[index]
+            index += step
+            # Вышли за границу периода в направлении обхода - дальше событий нет
+            if event[2] > until:
+                if not backward:
+                    break
+                continue
+            if event[2] < since:
+                if backward:
+                    break
+                continue
+            # Прошедшие события с временем не показываем, события на весь день - до конца дня
+            if event[5] or event[2] >= now:
+                page.append(event)
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        if backward:
+            page.reverse()
+        return page, has_more
+
+    def generation(self, user_id: int) -> int:
+        """Отметка перед загрузкой событий пользователя из БД"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id: int, window: Tuple[datetime, datetime], events: List[Tuple], generation: int):
+        """Сохраняет загруженное окно, если с начала загрузки события не менялись"""
+        if len(events) > self.max_user_events:
+            with self._lock:
+                self._oversized[user_id] = time.monotonic() + self.ttl_seconds
+                # Не копим отметки пользователей, у которых срок уже истек
+                if len(self._oversized) > 10000:
+                    now = time.monotonic()
+                    self._oversized = {
+                        key: value for key, value in self._oversized.items() if value > now
+                    }
+            return
+        entry = _UserSchedule(window[0], window[1], time.monotonic() + self.ttl_seconds, events)
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._remove(user_id)
+            self._entries[user_id] = entry
+            self._events_count += len(entry)
+            while self._events_count > self.max_events:
+                _, evicted = self._entries.popitem(last=False)
+                self._events_count -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, user_id: int):
+        """Сбрасывает кэш пользователя после изменения его событий"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            if self._remove(user_id):
+                self.stats["invalidations"] += 1
+
+    def _remove(self, user_id: int) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._events_count -= len(entry)
+        return True
+
+    def get_stats(self) -> dict:
+        """Возвращает статистику попаданий"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "users": len(self._entries),
+                "events": self._events_count,
+                "hit_rate": round(hit_rate, 4),
+            }
@@ -1,23 +1,61 @@
 from datetime import datetime, timedelta
-from database import db
+from database import db, adb
 from models import LLMResponse, EventConflict
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.date import DateTrigger
 from telegram import Bot
 from config import Config
+from rate_limiter import is_retryable
+from reminder_queue import ReminderQueue
+from coordination import coordinator
+from daily_digest import (
+    SLOT_MINUTES,
+    current_slot,
+    format_daily_schedule,
+    zones_at_hour,
+    zones_before_hour,
+)
+from metrics import (
+    DIGEST_LIVE_RENDERS,
+    DIGEST_SECONDS,
+    DIGEST_SENT_TOTAL,
+    REMINDER_LAG_SECONDS,
+    REMINDER_QUEUE_DEPTH,
+    TELEGRAM_SEND_ERRORS,
+)
 import asyncio
 import logging
-import re
+import time
 
 logger = logging.getLogger(__name__)
 
+# Задание рассылки ежедневного расписания: последний обработанный слот хранится в job_runs
+DIGEST_JOB = "daily_schedule"
+# Слоты, пропущенные без лидера, досылаются, пока они не старше этого срока
+DIGEST_MISFIRE_GRACE_SECONDS = SLOT_MINUTES * 60
+
 
 class Scheduler:
     def __init__(self):
         self.scheduler = AsyncIOScheduler(timezone=Config.TIMEZONE)
         self.bot = None
+        # Ограничение одновременных отправок ежедневного расписания
+        self.digest_slots = asyncio.Semaphore(Config.DIGEST_CONCURRENCY)
+        # Очередь напоминаний за час до событий и задача, которая их рассылает
+        self.reminders = ReminderQueue()
+        REMINDER_QUEUE_DEPTH.set_function(lambda: len(self.reminders))
+        self._reminder_wakeup = asyncio.Event()
+        self._reminder_task = None
+        self._reminder_batches = set()
+        # Рассылки и подготовка расписания по часовым поясам, запущенные тиками
+        self._digest_tasks = set()
+        self._loop = None
+        self._coordination_task = None
+        # Была ли реплика лидером при прошлой отметке: новый лидер досылает пропущенные слоты
+        self._was_leader = False
+        # Когда последний раз подхватывали напоминания, созданные другими репликами
+        self._reminders_synced_at = datetime.now()
         
     def set_bot(self, bot: Bot):
         """Устанавливает экземпляр бота для отправки уведомлений"""
@@ -26,139 +64,436 @@ class Scheduler:
     def start(self):
         """Запускает планировщик уведомлений"""
         try:
-            # Ежедневное расписание в 10:00
+            # Первая отметка до восстановления напоминаний: от состава реплик зависит,
+            # какие напоминания отправляет эта реплика
+            try:
+                coordinator.heartbeat()
+            except Exception as e:
+                logger.error(f"❌ Ошибка координации реплик: {e}")
+
+            # Ежедневное расписание в 10:00 по местному времени: каждые 15 минут
+            # рассылка идет пользователям тех часовых поясов, где сейчас 10:00
             self.scheduler.add_job(
-                self.send_daily_schedule,
-                CronTrigger(hour=10, minute=0, timezone=Config.TIMEZONE),
-                id='daily_schedule'
+                self.daily_schedule_tick,
+                CronTrigger(minute=f"*/{SLOT_MINUTES}", timezone="UTC"),
+                id='daily_schedule',
+                misfire_grace_time=DIGEST_MISFIRE_GRACE_SECONDS,
+                coalesce=True,
             )
+            # Запуск до рассылки: готовим сегодняшние тексты сразу
+            self.scheduler.add_job(self.prerender_pending_digests, id='digest_prerender_today')
+            
+            # Напоминания, запланированные до перезапуска
+            self._loop = asyncio.get_running_loop()
+            self.restore_reminders()
+            self._reminder_task = self._loop.create_task(self._run_reminders())
+            self._coordination_task = self._loop.create_task(coordinator.run(self._on_heartbeat))
             
             self.scheduler.start()
             logger.info("✅ Планировщик уведомлений запущен")
         except Exception as e:
             logger.error(f"❌ Ошибка запуска планировщика: {e}")
+
+    def stop(self):
+        """Останавливает планировщик и рассылку напоминаний"""
+        if self._reminder_task is not None:
+            self._reminder_task.cancel()
+            self._reminder_task = None
+        for task in self._digest_tasks:
+            task.cancel()
+        if self._coordination_task is not None:
+            self._coordination_task.cancel()
+            self._coordination_task = None
+            coordinator.stop()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
     
-    async def send_daily_schedule(self):
-        """Отправляет ежедневное расписание всем пользователей в 10:00"""
+    async def daily_schedule_tick(self):
+        """Тик раз в 15 минут: рассылка и ночная подготовка для часовых поясов, где наступил их час.
+
+        Обработанный слот отмечается в БД (job_runs). Слоты, на границе которых
+        аренды лидера не было ни у кого (лидер упал или передавал аренду),
+        новый лидер досылает, если они не старше DIGEST_MISFIRE_GRACE_SECONDS.
+        """
+        # Задания по расписанию выполняет только лидер среди реплик
+        if not coordinator.is_leader:
+            return
+        slot = current_slot()
+        claimed, previous = await adb.claim_job_slot(DIGEST_JOB, slot)
+        if not claimed:
+            return
+
+        step = timedelta(minutes=SLOT_MINUTES)
+        oldest = slot - timedelta(seconds=DIGEST_MISFIRE_GRACE_SECONDS)
+        missed, expired = [], 0
+        missed_slot = previous + step if previous is not None else slot
+        while missed_slot < slot:
+            if missed_slot >= oldest:
+                missed.append(missed_slot)
+            else:
+                expired += 1
+            missed_slot += step
+        if expired:
+            logger.error(f"❌ Слотов рассылки расписания пропущено без досылки (истек срок): {expired}")
+        for missed_slot in missed:
+            logger.warning(f"⚠️ Досылаем ежедневное расписание за пропущенный слот {missed_slot}")
+            self._start_digest_slot(missed_slot)
+        self._start_digest_slot(slot)
+
+    def _start_digest_slot(self, slot: datetime):
+        # Рассылка одного слота может идти дольше 15 минут: каждая идет отдельной
+        # задачей, чтобы тик следующего слота не был пропущен (max_instances=1)
+        for day, zones in zones_at_hour(Config.DIGEST_HOUR, slot).items():
+            self._start_digest_task(self.send_daily_schedule(day, zones))
+        for day, zones in zones_at_hour(Config.DIGEST_PRERENDER_HOUR, slot).items():
+            self._start_digest_task(self.prerender_daily_digests(day + timedelta(days=1), zones))
+
+    def _start_digest_task(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._digest_tasks.add(task)
+        task.add_done_callback(self._digest_tasks.discard)
+
+    async def prerender_pending_digests(self):
+        """Готовит сегодняшние тексты для часовых поясов, где рассылка еще впереди"""
+        if not coordinator.is_leader:
+            return
+        for day, zones in zones_before_hour(Config.DIGEST_HOUR).items():
+            await self.prerender_daily_digests(day, zones)
+
+    async def prerender_daily_digests(self, day=None, timezones: List[str] = None):
+        """Готовит тексты ежедневного расписания на день (по умолчанию - на завтра).
+
+        timezones ограничивает подготовку пользователями этих часовых поясов.
+        """
+        day = day or datetime.now().date() + timedelta(days=1)
+        try:
+            await asyncio.to_thread(db.prerender_daily_digests, day, Config.DIGEST_BATCH_SIZE, timezones)
+        except Exception as e:
+            logger.error(f"❌ Ошибка подготовки ежедневного расписания на {day}: {e}")
+
+    async def send_daily_schedule(self, day=None, timezones: List[str] = None):
+        """Отправляет ежедневное расписание на день (по умолчанию - сегодня).
+
+        Тик daily_schedule_tick передает часовые пояса, где сейчас 10:00, и их
+        местную дату; без timezones расписание получают все пользователи.
+        Тексты подготовлены заранее (prerender_daily_digests и правки при
+        изменении событий); на месте собирается только расписание
+        пользователей, для которых готового текста нет.
+        """
         if not self.bot:
             logger.error("Бот не инициализирован для отправки уведомлений")
             return
             
+        started_at = time.monotonic()
+        sent_count = 0
+        # Расписания, не отправленные из-за сбоя сети или flood control, - на второй проход
+        retry = []
+        day = day or datetime.now().date()
+        # Готовые тексты пользователей читаются одним потоковым запросом
+        batches = db.iter_daily_digests(day, Config.DIGEST_BATCH_SIZE, timezones)
         try:
-            # Получаем всех пользователей
-            users = db.get_all_users()
-            
-            for user_id in users:
-                try:
-                    await self.send_user_daily_schedule(user_id)
-                    await asyncio.sleep(0.1)  # Базовая защита от ограничений Telegram
-                except Exception as e:
-                    logger.error(f"Ошибка отправки расписания пользователю {user_id}: {e}")
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                # Отправка внутри порции идет параллельно, темп задает rate limiter
+                results = await asyncio.gather(
+                    *(self.deliver_daily_schedule(user_id, message, retry, day) for user_id, message in batch)
+                )
+                sent_count += sum(results)
                     
         except Exception as e:
             logger.error(f"Ошибка в send_daily_schedule: {e}")
+        finally:
+            await asyncio.to_thread(batches.close)
+
+        if retry:
+            logger.warning(f"⚠️ Повторная отправка ежедневного расписания {len(retry)} пользователям")
+            results = await asyncio.gather(
+                *(self.deliver_daily_schedule(user_id, message) for user_id, message in retry)
+            )
+            sent_count += sum(results)
+
+        DIGEST_SECONDS.observe(time.monotonic() - started_at)
+        logger.info(f"✅ Ежедневное расписание на {day} отправлено {sent_count} пользователям за {time.monotonic() - started_at:.1f} с")
     
     async def send_user_daily_schedule(self, user_id: int):
         """Отправляет ежедневное расписание конкретному пользователю"""
-        try:
-            # Получаем события на сегодня
-            today = datetime.now().date()
-            start_of_day = datetime.combine(today, datetime.min.time())
-            end_of_day = datetime.combine(today, datetime.max.time())
-            
-            events = db.get_user_events(user_id, start_of_day, end_of_day)
-            
-            if not events:
-                # Нет событий на сегодня
-                message = "📅 На сегодня у вас нет запланированных событий. Хорошего дня! 🌞"
-            else:
-                # Формируем сообщение с событиями
-                message = "📅 Ваше расписание на сегодня:\n\n"
-                # Регулярное выражение для удаления ведущего времени из описания
-                time_prefix_re = re.compile(r"^\s*(в\s*)?([01]?\d|2[0-3])([:.]\d{2})?\s*[-—:]?\s*", re.IGNORECASE)
-                
-                for event in events:
-                    event_id, event_description, start_time, end_time, event_priority, is_all_day = event
-                    
-                    if is_all_day:
-                        event_time_str = "📅 Весь день"
-                    else:
-                        event_time_str = start_time.strftime("%H:%M")
-                        # Убираем возможное повторение времени или шаблон диапазона в начале описания
-                        event_description = time_prefix_re.sub("", event_description).strip()
-                        event_description = re.sub(r"^\s*с\s*\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*(до|–|-|—)\s*\d{1,2}([:.]\d{2})?\s*(утра|утром|дня|вечера|вечер|ночи|ночью)?\s*", "", event_description, flags=re.IGNORECASE).strip()
-                    
-                    message += f"• {event_time_str} - {event_description}\n"
-                
-                message += "\nХорошего дня! 🚀"
-            
-            # Отправляем сообщение
-            await self.bot.send_message(chat_id=user_id, text=message)
-            
-        except Exception as e:
-            logger.error(f"Ошибка отправки ежедневного расписания пользователю {user_id}: {e}")
-    
-    def schedule_event_notification(self, user_id: int, event_id: int, event_time: datetime):
-        """Планирует уведомление за час до события"""
+        # Получаем события на сегодня
+        today = datetime.now().date()
+        start_of_day = datetime.combine(today, datetime.min.time())
+        end_of_day = datetime.combine(today, datetime.max.time())
+
+        events = await adb.get_user_events(user_id, start_of_day, end_of_day)
+        await self.deliver_daily_schedule(user_id, self.format_daily_schedule(events))
+
+    async def deliver_daily_schedule(
+        self, user_id: int, message: str = None, retry: list = None, day=None
+    ) -> bool:
+        """Отправляет готовое расписание с низшим приоритетом (лимиты и RetryAfter - в rate limiter).
+
+        Без готового текста (message=None) расписание собирается из событий дня day.
+        Если отправка не удалась из-за сбоя, который стоит повторить, и передан
+        список retry, пользователь добавляется в него.
+        """
+        async with self.digest_slots:
+            if message is None:
+                DIGEST_LIVE_RENDERS.inc()
+                day = day or datetime.now().date()
+                events = await adb.get_user_events(
+                    user_id, datetime.combine(day, datetime.min.time()), datetime.combine(day, datetime.max.time())
+                )
+                message = self.format_daily_schedule(events)
+            try:
+                await self.bot.send_message(chat_id=user_id, text=message, rate_limit_args="digest")
+                DIGEST_SENT_TOTAL.inc()
+                return True
+            except Exception as e:
+                TELEGRAM_SEND_ERRORS.labels("digest").inc()
+                logger.error(f"Ошибка отправки ежедневного расписания пользователю {user_id}: {e}")
+                if retry is not None and is_retryable(e):
+                    retry.append((user_id, message))
+                return False
+
+    # Текст расписания собирается в daily_digest: его же использует ночная подготовка в Database
+    format_daily_schedule = staticmethod(format_daily_schedule)
+
+    def schedule_event_notification(self, user_id: int, event_id: int, event_time: datetime) -> bool:
+        """Планирует уведомление за час до события. Возвращает True, если напоминание запланировано"""
         if not self.bot:
             logger.error("Бот не инициализирован для уведомлений о событиях")
-            return
+            return False
             
         try:
             # Для событий на весь день не планируем уведомления
             event = db.get_event_by_id(event_id)
             if event and event[5]:  # event[5] - это is_all_day
                 logger.info(f"⚠️ Событие {event_id} на весь день - уведомление не планируется")
-                return
+                return False
                 
             # Время уведомления - за час до события
             notification_time = event_time - timedelta(hours=1)
             
             # Если время уведомления уже прошло, не планируем
             if notification_time <= datetime.now():
-                return
+                return False
                 
-            # Планируем уведомление
-            self.scheduler.add_job(
-                self.send_event_reminder,
-                DateTrigger(run_date=notification_time, timezone=Config.TIMEZONE),
-                args=[user_id, event_id],
-                id=f'event_reminder_{event_id}'
-            )
+            # Сохраняем напоминание в БД, чтобы оно пережило перезапуск, и ставим в очередь
+            db.save_reminder(event_id, user_id, notification_time)
+            # Напоминания чужих пользователей реплика-владелец подхватит из БД
+            if coordinator.owns(user_id):
+                self._call_in_loop(self._enqueue_reminder, event_id, user_id, notification_time.timestamp())
             
             logger.info(f"✅ Запланировано уведомление для события {event_id} в {notification_time}")
+            return True
             
         except Exception as e:
             logger.error(f"Ошибка планирования уведомления: {e}")
-    
-    async def send_event_reminder(self, user_id: int, event_id: int):
-        """Отправляет напоминание о событии за час до начала"""
+            return False
+
+    def schedule_event_notifications(self, user_id: int, events: List[Tuple[int, datetime]]) -> set:
+        """Планирует уведомления за час до событий с временем одним запросом к БД.
+
+        events - пары (event_id, начало) только что сохраненных событий не на весь
+        день. Возвращает ID событий, для которых напоминание запланировано.
+        """
+        if not self.bot:
+            logger.error("Бот не инициализирован для уведомлений о событиях")
+            return set()
+
+        now = datetime.now()
+        reminders = [
+            (event_id, start_time - timedelta(hours=1))
+            for event_id, start_time in events
+            if start_time - timedelta(hours=1) > now
+        ]
         try:
-            # Получаем информацию о событии
-            event = db.get_event_by_id(event_id)
-            
-            if event and not event[5]:  # event[5] - это is_all_day, проверяем что не на весь день
-                event_time = event[2].strftime("%H:%M")
-                event_description = event[1]
-                
-                message = f"⏰ Напоминание!\n\nЧерез час у вас запланировано:\n• {event_time} - {event_description}\n\nНе забудьте! 📋"
-                
-                await self.bot.send_message(chat_id=user_id, text=message)
-                logger.info(f"✅ Отправлено напоминание пользователю {user_id} о событии {event_id}")
+            db.save_reminders_bulk(user_id, reminders)
+        except Exception as e:
+            logger.error(f"Ошибка планирования уведомлений: {e}")
+            return set()
+
+        if coordinator.owns(user_id):
+            for event_id, notification_time in reminders:
+                self._call_in_loop(self._enqueue_reminder, event_id, user_id, notification_time.timestamp())
+        logger.info(f"✅ Запланировано уведомлений: {len(reminders)} из {len(events)}")
+        return {event_id for event_id, _ in reminders}
+
+    def _call_in_loop(self, callback, *args):
+        """Выполняет callback в event loop планировщика (вызов безопасен из любого потока)"""
+        if self._loop is None:
+            # Планировщик еще не запущен: напоминание уже в БД и будет загружено при старте
+            return
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    def _enqueue_reminder(self, event_id: int, user_id: int, remind_at: float):
+        """Добавляет напоминание в очередь и будит рассылку, если оно стало ближайшим"""
+        self.reminders.push(event_id, user_id, remind_at)
+        if self.reminders.peek_time() == remind_at:
+            self._reminder_wakeup.set()
+
+    def restore_reminders(self):
+        """Восстанавливает ожидающие напоминания своей части пользователей из БД одним запросом"""
+        since = datetime.now() - timedelta(seconds=Config.REMINDER_GRACE_SECONDS)
+        self._reminders_synced_at = datetime.now()
+        reminders = db.get_pending_reminders(since, coordinator.partition)
+        self.reminders.bulk_load(
+            (remind_at.timestamp(), event_id, user_id) for event_id, user_id, remind_at in reminders
+        )
+        logger.info(f"✅ Восстановлено {len(reminders)} напоминаний")
+
+    async def _on_heartbeat(self, rebalanced: bool):
+        """После отметки реплики: досылка пропущенных слотов расписания и синхронизация напоминаний"""
+        if coordinator.is_leader and not self._was_leader:
+            # Новый лидер досылает слоты, пропущенные без лидера, не дожидаясь следующего тика
+            self._start_digest_task(self.daily_schedule_tick())
+        self._was_leader = coordinator.is_leader
+        await self._sync_reminders(rebalanced)
+
+    async def _sync_reminders(self, rebalanced: bool):
+        """После отметки реплики: при смене состава перечитывает свою часть напоминаний,
+        иначе при нескольких репликах подхватывает напоминания, созданные другими"""
+        index, count = coordinator.partition
+        if not rebalanced and count == 1:
+            return
+        since = datetime.now() - timedelta(seconds=Config.REMINDER_GRACE_SECONDS)
+        # Запас в один период - на расхождение часов и транзакции, завершившиеся после запроса
+        updated_since = None if rebalanced else self._reminders_synced_at - timedelta(
+            seconds=coordinator.heartbeat_seconds
+        )
+        self._reminders_synced_at = datetime.now()
+        reminders = await adb.get_pending_reminders(since, (index, count), updated_since)
+        entries = [(remind_at.timestamp(), event_id, user_id) for event_id, user_id, remind_at in reminders]
+        if rebalanced:
+            queue = ReminderQueue()
+            queue.bulk_load(entries)
+            self.reminders = queue
+            logger.info(f"🔀 Напоминания перераспределены: у реплики {index + 1} из {count} - {len(queue)}")
+        else:
+            for remind_at, event_id, user_id in entries:
+                self.reminders.push(event_id, user_id, remind_at)
+        self._reminder_wakeup.set()
+
+    async def _run_reminders(self):
+        """Ждет ближайшее напоминание и отправляет все, что наступили в этот тик, одной пачкой"""
+        while True:
+            try:
+                next_time = self.reminders.peek_time()
+                timeout = None if next_time is None else max(0.0, next_time - time.time())
+                try:
+                    await asyncio.wait_for(self._reminder_wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._reminder_wakeup.clear()
+
+                now = time.time()
+                due = self.reminders.pop_due(now + Config.REMINDER_TICK_SECONDS)
+                # Напоминания, опоздавшие больше чем на REMINDER_GRACE_SECONDS, уже неактуальны
+                due = [entry for entry in due if entry[0] >= now - Config.REMINDER_GRACE_SECONDS]
+                if due:
+                    # Отправка идет отдельной задачей, чтобы следующий тик не ждал медленных отправок
+                    task = asyncio.create_task(self.send_reminder_batch(due))
+                    self._reminder_batches.add(task)
+                    task.add_done_callback(self._reminder_batches.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка в очереди напоминаний: {e}")
+                await asyncio.sleep(1)
+
+    async def send_reminder_batch(self, due: list):
+        """Отправляет пачку напоминаний: одно сообщение на пользователя"""
+        try:
+            # Захват в БД до отправки: напоминание уходит один раз, даже если его
+            # держат в очереди две реплики (на время перераспределения)
+            due_before = datetime.fromtimestamp(max(remind_at for remind_at, _, _ in due))
+            claimed = await adb.claim_reminders([event_id for _, event_id, _ in due], due_before)
+            due = [entry for entry in due if entry[1] in claimed]
+            if not due:
+                return
+
+            # Исходное время напоминания из БД: у повторов в очереди стоит время повтора
+            remind_at_by_id = {event_id: remind_at.timestamp() for event_id, remind_at in claimed.items()}
+            now = time.time()
+            for _, event_id, _ in due:
+                REMINDER_LAG_SECONDS.observe(max(0.0, now - remind_at_by_id[event_id]))
+
+            # Актуальные данные событий одним запросом; удаленные события просто не найдутся
+            events = await adb.get_events_by_ids([event_id for _, event_id, _ in due])
+            events_by_user = {}
+            for _, event_id, user_id in due:
+                event = events.get(event_id)
+                if event and not event[5]:  # event[5] - это is_all_day, проверяем что не на весь день
+                    events_by_user.setdefault(user_id, []).append(event)
+
+            users = list(events_by_user.items())
+            results = await asyncio.gather(
+                *(self.send_event_reminder(user_id, user_events) for user_id, user_events in users),
+                return_exceptions=True
+            )
+            sent_count = 0
+            for (user_id, user_events), result in zip(users, results):
+                if isinstance(result, Exception):
+                    # Снимаем захват, чтобы повтор (или новый владелец) смог отправить напоминание
+                    await adb.release_reminders([event[0] for event in user_events])
+                    self._retry_reminders(user_id, user_events, remind_at_by_id)
+                else:
+                    sent_count += len(result)
+            logger.info(f"✅ Отправлено напоминаний: {sent_count} из {len(due)}")
+        except Exception as e:
+            logger.error(f"Ошибка отправки пачки напоминаний: {e}")
+
+    async def send_event_reminder(self, user_id: int, events: list) -> list:
+        """Отправляет напоминание о событиях за час до начала. Возвращает отправленные события"""
+        try:
+            lines = "\n".join(f"• {event[2].strftime('%H:%M')} - {event[1]}" for event in events)
+            message = f"⏰ Напоминание!\n\nЧерез час у вас запланировано:\n{lines}\n\nНе забудьте! 📋"
+
+            await self.bot.send_message(chat_id=user_id, text=message, rate_limit_args="reminder")
+            logger.info(f"✅ Отправлено напоминание пользователю {user_id} о событиях {[event[0] for event in events]}")
+            return events
                 
         except Exception as e:
+            TELEGRAM_SEND_ERRORS.labels("reminder").inc()
             logger.error(f"Ошибка отправки напоминания: {e}")
+            # Сбой сети или flood control - send_reminder_batch вернет напоминания в очередь
+            if is_retryable(e):
+                raise
+            return []
+
+    def _retry_reminders(self, user_id: int, events: list, remind_at_by_id: dict):
+        """Ставит неотправленные напоминания в очередь повторно, пока они не устарели.
+
+        remind_at_by_id - исходное время напоминаний (из БД), а не время
+        предыдущего повтора, поэтому повторы прекращаются через
+        REMINDER_GRACE_SECONDS после запланированного времени.
+        """
+        retry_at = time.time() + Config.REMINDER_RETRY_SECONDS
+        for event in events:
+            if retry_at - remind_at_by_id[event[0]] <= Config.REMINDER_GRACE_SECONDS:
+                # Напоминания пользователя, повторяемые в один тик, снова уйдут одним сообщением
+                self._enqueue_reminder(event[0], user_id, retry_at)
+            else:
+                logger.error(f"❌ Напоминание о событии {event[0]} пользователю {user_id} не доставлено: истек срок")
     
     def cancel_event_notification(self, event_id: int):
         """Отменяет запланированное уведомление для события"""
         try:
-            job_id = f'event_reminder_{event_id}'
-            if self.scheduler.get_job(job_id):
-                self.scheduler.remove_job(job_id)
-                logger.info(f"✅ Отменено уведомление для события {event_id}")
+            self._call_in_loop(self.reminders.cancel, event_id)
+            db.delete_reminder(event_id)
+            logger.info(f"✅ Отменено уведомление для события {event_id}")
         except Exception as e:
             logger.error(f"Ошибка отмены уведомления: {e}")
 
+    def cancel_queued_notifications(self, event_ids: list):
+        """Убирает из очереди напоминания удаленных событий (в БД они удаляются каскадно)"""
+        for event_id in event_ids:
+            self._call_in_loop(self.reminders.cancel, event_id)
+
+    def cancel_user_notifications(self, user_id: int):
+        """Отменяет все запланированные уведомления пользователя"""
+        self._call_in_loop(self.reminders.cancel_user, user_id)
+
     @staticmethod
     def process_event(
         user_id: int, llm_response: LLMResponse, username: str, goal_id: int = None
@@ -256,7 +591,7 @@ class Scheduler:
                 }
 
             # Планируем уведомление за час до события
-            scheduler_instance.schedule_event_notification(user_id, event_id, start_time)
+            reminder = scheduler_instance.schedule_event_notification(user_id, event_id, start_time)
 
             return {
                 "success": True,
@@ -266,7 +601,8 @@ class Scheduler:
                     f"Событие '{llm_response.description}' запланировано на {llm_response.date} {start_time.strftime('%H:%M')}"
                 ),
                 "event_id": event_id,
-                "is_all_day": False
+                "is_all_day": False,
+                "reminder": reminder
             }
             
         except Exception as e:
@@ -277,6 +613,88 @@ class Scheduler:
                 "is_all_day": False
             }
 
+    @staticmethod
+    def process_events_bulk(
+        user_id: int, llm_responses: List[LLMResponse], username: str, goal_id: int = None
+    ) -> List[Dict[str, Any]]:
+        """Пакетная обработка событий (например, шагов плана цели).
+
+        Все события проверяются заранее и сохраняются одним запросом.
+        Возвращает результат для каждого события в том же порядке.
+        """
+        db.user_exists(user_id, username)
+
+        results: List[Dict[str, Any]] = [None] * len(llm_responses)
+        rows = []
+        row_indexes = []
+        for index, llm_response in enumerate(llm_responses):
+            is_all_day = llm_response.time == "???"
+            try:
+                if is_all_day:
+                    start_time = datetime.strptime(f"{llm_response.date} 00:00:00", "%Y-%m-%d %H:%M:%S")
+                    end_time = datetime.strptime(f"{llm_response.date} 23:59:59", "%Y-%m-%d %H:%M:%S")
+                else:
+                    start_time = datetime.strptime(
+                        f"{llm_response.date} {llm_response.time}", "%Y-%m-%d %H:%M:%S"
+                    )
+                    if llm_response.end_time:
+                        end_time = datetime.strptime(
+                            f"{llm_response.date} {llm_response.end_time}", "%Y-%m-%d %H:%M:%S"
+                        )
+                        if end_time <= start_time:
+                            end_time += timedelta(days=1)
+                    else:
+                        end_time = start_time + timedelta(hours=1)
+            except ValueError as e:
+                results[index] = {
+                    "success": False,
+                    "message": f"Некорректные дата или время события '{llm_response.description}': {e}",
+                    "is_all_day": is_all_day
+                }
+                continue
+
+            rows.append((llm_response.description, start_time, end_time, llm_response.priority, is_all_day))
+            row_indexes.append(index)
+
+        try:
+            event_ids = db.save_events_bulk(user_id, rows, goal_id)
+        except Exception as e:
+            for index, row in zip(row_indexes, rows):
+                results[index] = {
+                    "success": False,
+                    "message": f"Не удалось сохранить событие: {e}",
+                    "is_all_day": row[4]
+                }
+            return results
+
+        # Напоминания всех новых событий с временем - одной вставкой, без чтения событий обратно
+        reminders = scheduler_instance.schedule_event_notifications(user_id, [
+            (event_id, row[1]) for row, event_id in zip(rows, event_ids)
+            if event_id is not None and not row[4]
+        ])
+
+        for index, row, event_id in zip(row_indexes, rows, event_ids):
+            description, start_time, _, _, is_all_day = row
+            if event_id is None:
+                results[index] = {
+                    "success": True,
+                    "message": f"Событие '{description}' уже существует в расписании",
+                    "event_id": None,
+                    "is_all_day": is_all_day,
+                    "duplicate": True
+                }
+                continue
+
+            results[index] = {
+                "success": True,
+                "message": f"Событие '{description}' запланировано на {start_time.strftime('%Y-%m-%d')}",
+                "event_id": event_id,
+                "is_all_day": is_all_day,
+                "reminder": event_id in reminders
+            }
+
+        return results
+
 
 # Глобальный экземпляр планировщика
 scheduler_instance = Scheduler()
\ No newline at end of file
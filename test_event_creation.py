@@ -1,3 +1,4 @@
+import asyncio
 import sys
 sys.path.append(".")
 
@@ -23,7 +24,7 @@ def test_event_creation():
         
         # Извлекаем информацию через LLM
         llm_client = LLMClient()
-        llm_response = llm_client.extract_event_info(text)
+        llm_response = asyncio.run(llm_client.extract_event_info(text))
         print(f"✅ LLM ответ: {llm_response}")
         
         # Обрабатываем событие через scheduler
@@ -1,3 +1,4 @@
+import asyncio
 import sys
 sys.path.append(".")
 
@@ -30,7 +31,7 @@ def test_events_without_time():
             
             # Извлекаем информацию через LLM
             llm_client = LLMClient()
-            llm_response = llm_client.extract_event_info(text)
+            llm_response = asyncio.run(llm_client.extract_event_info(text))
             print(f"   LLM ответ: time='{llm_response.time}', date='{llm_response.date}', description='{llm_response.description}'")
             
             # Обрабатываем событие через scheduler
@@ -0,0 +1,64 @@
+import asyncio
+import sys
+import time
+sys.path.append(".")
+
+from telegram.error import RetryAfter
+from rate_limiter import TelegramRateLimiter
+
+def test_rate_limiter():
+    """Проверяем приоритеты отправки и повтор после flood control"""
+    asyncio.run(_test_rate_limiter())
+
+async def _test_rate_limiter():
+    print("🧪 Лимит отправки сообщений в Telegram\n")
+
+    # 10 сообщений в секунду: первые 10 проходят сразу, остальные ждут в очереди
+    limiter = TelegramRateLimiter(global_rate=10, chat_rate=100, chat_burst=100, max_retries=2)
+    order = []
+
+    async def send(kind: str, chat_id: int):
+        async def callback():
+            order.append(kind)
+            return True
+        await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, kind)
+
+    started = time.perf_counter()
+    digest = [asyncio.create_task(send("digest", chat_id)) for chat_id in range(30)]
+    await asyncio.sleep(0.05)
+    # Ответ пользователю, пришедший во время рассылки, обгоняет очередь расписаний
+    await send(None, 1000)
+    reply_time = time.perf_counter() - started
+    await asyncio.gather(*digest)
+    print(f"⏱ Ответ пользователю во время рассылки: {reply_time * 1000:.0f} мс (позиция {order.index(None) + 1} из {len(order)})")
+    print(f"⏱ Рассылка 30 сообщений при лимите 10/с: {time.perf_counter() - started:.1f} с")
+    assert order.index(None) <= 11
+
+    # Flood control: запрос повторяется после паузы, все отправки ждут ее окончания
+    attempts = []
+
+    async def flooded():
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise RetryAfter(1)
+        return True
+
+    started = time.perf_counter()
+    await limiter.process_request(flooded, (), {}, "sendMessage", {"chat_id": 1}, "reminder")
+    print(f"⏱ Повтор после RetryAfter(1): через {attempts[1] - attempts[0]:.1f} с")
+    assert attempts[1] - attempts[0] >= 0.9
+
+    # Исчерпав повторы, ошибка возвращается вызывающему коду
+    async def always_flooded():
+        raise RetryAfter(0)
+
+    try:
+        await limiter.process_request(always_flooded, (), {}, "sendMessage", {"chat_id": 2}, "digest")
+        raise AssertionError("RetryAfter не передан вызывающему коду")
+    except RetryAfter:
+        pass
+    print(f"📊 {limiter.get_stats()}")
+    print("\n✅ Готово")
+
+if __name__ == "__main__":
+    test_rate_limiter()
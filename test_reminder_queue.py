@@ -0,0 +1,47 @@
+import random
+import sys
+import time
+import tracemalloc
+sys.path.append(".")
+
+from reminder_queue import ReminderQueue
+
+def test_reminder_queue(count: int = 100_000):
+    """Замеряем память и скорость очереди напоминаний"""
+
+    print(f"🧪 Очередь напоминаний: {count} записей\n")
+
+    now = time.time()
+    # Кортежи создаются внутри замера: в боте они тоже живут только в очереди
+    tracemalloc.start()
+    reminders = [(now + random.uniform(0, 86400 * 30), event_id, event_id % 5000) for event_id in range(count)]
+    queue = ReminderQueue()
+    started = time.perf_counter()
+    queue.bulk_load(reminders)
+    load_time = time.perf_counter() - started
+    del reminders
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"💾 Память: {memory / 1024 / 1024:.1f} МБ ({memory / count:.0f} байт на напоминание)")
+    print(f"⏱ Загрузка: {load_time * 1000:.0f} мс")
+
+    started = time.perf_counter()
+    for event_id in range(count, count + 10_000):
+        queue.push(event_id, event_id % 5000, now + random.uniform(0, 86400 * 30))
+    print(f"⏱ Добавление: {(time.perf_counter() - started) / 10_000 * 1e6:.1f} мкс")
+
+    started = time.perf_counter()
+    for event_id in random.sample(range(count), 10_000):
+        queue.cancel(event_id)
+    print(f"⏱ Отмена: {(time.perf_counter() - started) / 10_000 * 1e6:.1f} мкс")
+
+    started = time.perf_counter()
+    due = queue.pop_due(now + 86400)
+    print(f"⏱ Извлечение {len(due)} напоминаний за сутки: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    assert all(entry[0] <= now + 86400 for entry in due)
+    assert queue.peek_time() is None or queue.peek_time() > now + 86400
+    print("\n✅ Готово")
+
+if __name__ == "__main__":
+    test_reminder_queue()
@@ -43,7 +43,7 @@ def test_schedule_display():
             # Проверим, есть ли вообще события в БД
             print("\n🔍 Проверяем все события в БД...")
             try:
-                with db.conn.cursor() as cur:
+                with db.cursor() as cur:
                     cur.execute("SELECT COUNT(*) FROM events")
                     total_events = cur.fetchone()[0]
                     print(f"📊 Всего событий в БД: {total_events}")
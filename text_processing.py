@@ -0,0 +1,86 @@
+import re
+
+# Все шаблоны компилируются один раз при импорте и используются обработчиками,
+# парсерами и рендерингом расписания
+
+PERIOD_WORDS = r"(утра|утром|дня|вечера|вечер|ночи|ночью)"
+
+# --- Очистка описаний при выводе расписания ---
+
+# Ведущее слово относительной даты ("завтра встреча")
+_RELATIVE_DATE_PREFIX = r"(?:(?:сегодня|завтра|послезавтра|после\s+завтра)\b\s*)?"
+# Ведущее время в описании ("в 9", "08:30", "8.30", и т.п.)
+# (число, за которым идут еще цифры, - не время: "2024 отчет")
+_TIME_PREFIX = r"(?:\s*(в\s*)?([01]?\d|2[0-3])([:.]\d{2})?(?!\d)\s*[-—:]?\s*)?"
+# Диапазон "с .. до .." в начале описания
+_RANGE_PREFIX = (
+    r"(?:\s*с\s*\d{1,2}([:.]\d{2})?\s*" + PERIOD_WORDS + r"?\s*(до|–|-|—)\s*"
+    r"\d{1,2}([:.]\d{2})?\s*" + PERIOD_WORDS + r"?\s*)?"
+)
+# Один проход вместо трех замен: слово даты, затем время, затем диапазон
+DESCRIPTION_PREFIX_RE = re.compile(r"^\s*" + _RELATIVE_DATE_PREFIX + _TIME_PREFIX + _RANGE_PREFIX, re.IGNORECASE)
+
+# --- Распознавание даты и времени в сообщении ---
+
+RELATIVE_DATE_RE = re.compile(r"\b(сегодня|завтра|послезавтра|после завтра)\b")
+MONTH_RE = re.compile(r"\b(январ|феврал|март|апрел|ма[йi]|июн|июл|август|сентябр|октябр|ноябр|декабр)\w*\b")
+ISO_DATE_RE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+NUMERIC_DATE_RE = re.compile(r"\b\d{1,2}[./-]\d{1,2}(?:[./-]\d{2,4})?\b")
+CLOCK_TIME_RE = re.compile(r"\b\d{1,2}([:.]\d{2})?\b")
+
+# --- Упрощенный разбор события без LLM ---
+
+TIME_RANGE_RE = re.compile(
+    r"(?:с\s*)?(\d{1,2})(?:[.:](\d{2}))?\s*" + PERIOD_WORDS + r"?\s*(?:до|–|-|—)\s*"
+    r"(\d{1,2})(?:[.:](\d{2}))?\s*" + PERIOD_WORDS + r"?"
+)
+LOOSE_TIME_RE = re.compile(r"(\d{1,2})[.:]?\s*(\d{2})?")
+LEADING_DATE_WORD_RE = re.compile(r"^(сегодня|завтра|послезавтра|после завтра|я)\s+", re.IGNORECASE)
+HOUR_WORD_RE = re.compile(r"\bв\s+\d{1,2}\b")
+DATE_AND_HOUR_RE = re.compile(r"(сегодня|завтра|послезавтра|в\s+\d+[:.]?\d*)", re.IGNORECASE)
+SPACES_RE = re.compile(r"\s+")
+
+# --- Команды удаления ---
+
+DELETE_KEYWORDS = ("удали", "убери", "remove", "delete", "отмени")
+DELETE_COMMAND_RE = re.compile(r"(удали|убери|remove|delete|отмени|отмена)\s+(.*)")
+DELETE_RELATIVE_DATE_RE = re.compile(r"(сегодня|завтра|послезавтра|после завтра)")
+DELETE_DATE_RES = (
+    re.compile(r"(\d{4}-\d{2}-\d{2})"),  # YYYY-MM-DD
+    re.compile(r"(\d{2}\.\d{2}\.\d{4})"),  # DD.MM.YYYY
+    re.compile(r"(\d{2}/\d{2}/\d{4})"),  # DD/MM/YYYY
+)
+LEADING_V_RE = re.compile(r"^в\s*")
+LEADING_NA_RE = re.compile(r"^на\s*")
+DATE_SEPARATOR_RE = re.compile(r"[.\-/]")
+
+
+def clean_description(description: str) -> str:
+    """Убирает из начала описания слово даты, время и диапазон времени (они уже показаны отдельно)"""
+    cleaned = DESCRIPTION_PREFIX_RE.sub("", description, count=1).strip()
+    # Описание целиком из даты или времени оставляем как есть
+    return cleaned or description.strip()
+
+
+def has_explicit_date(text_lower: str) -> bool:
+    """В тексте явно указана дата: относительная, месяцем или числами"""
+    return bool(
+        RELATIVE_DATE_RE.search(text_lower)
+        or MONTH_RE.search(text_lower)
+        or ISO_DATE_RE.search(text_lower)
+        or NUMERIC_DATE_RE.search(text_lower)
+    )
+
+
+def has_time(text_lower: str) -> bool:
+    """В тексте есть время: число часов или слово «час»"""
+    return CLOCK_TIME_RE.search(text_lower) is not None or "час" in text_lower
+
+
+def collapse_spaces(text: str) -> str:
+    return SPACES_RE.sub(" ", text).strip()
+
+
+def display_description(description: str, is_all_day: bool) -> str:
+    """Описание для вывода в расписании: у событий со временем - без даты и времени в начале"""
+    return description if is_all_day else clean_description(description)
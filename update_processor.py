@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Any, Awaitable
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import Config
+from metrics import UPDATE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatQueue:
+    """Очередь обновлений одного чата: FIFO-lock и число ожидающих обновлений"""
+
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений разных чатов со строгим порядком внутри чата.
+
+    Обновления одного чата выполняются по очереди (asyncio.Lock выдает
+    доступ в порядке запросов), поэтому состояние диалога в user_data не
+    ломается. Обновления разных чатов обрабатываются одновременно, но не
+    больше max_concurrent_updates сразу. Слот занимается только после
+    того, как подошла очередь чата, так что длинная очередь одного чата
+    не блокирует остальных. max_pending_updates ограничивает общее число
+    принятых в обработку обновлений (выполняемых и ожидающих).
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.concurrency = max_concurrent_updates
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._chats: dict = {}
+        self.stats = {"processed": 0, "failed": 0, "running": 0, "waiting": 0, "max_chat_queue": 0}
+
+    @staticmethod
+    def _chat_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        self.stats["waiting"] += 1
+        key = self._chat_key(update)
+        if key is None:
+            # Обновления без чата (например, опросы) не упорядочиваем
+            await self._run(coroutine)
+            return
+
+        queue = self._chats.get(key)
+        if queue is None:
+            queue = self._chats[key] = _ChatQueue()
+        queue.pending += 1
+        self.stats["max_chat_queue"] = max(self.stats["max_chat_queue"], queue.pending)
+        try:
+            async with queue.lock:
+                await self._run(coroutine)
+        finally:
+            queue.pending -= 1
+            if queue.pending == 0:
+                del self._chats[key]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._slots:
+            self.stats["waiting"] -= 1
+            self.stats["running"] += 1
+            started = time.perf_counter()
+            try:
+                await coroutine
+                self.stats["processed"] += 1
+            except Exception:
+                # Ошибки обработчиков логирует Application, здесь только считаем
+                self.stats["failed"] += 1
+                raise
+            finally:
+                self.stats["running"] -= 1
+                UPDATE_SECONDS.observe(time.perf_counter() - started)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def get_stats(self) -> dict:
+        """Метрики очередей обработки обновлений"""
+        return {**self.stats, "concurrency": self.concurrency, "active_chats": len(self._chats)}
+
+
+# Глобальный экземпляр
+update_processor = PerChatUpdateProcessor(Config.UPDATE_CONCURRENCY, Config.UPDATE_MAX_PENDING)
@@ -0,0 +1,107 @@
+import hmac
+from typing import Callable
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import Application
+import uvicorn
+from config import Config
+from database import adb
+import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_web_app(application: Application, get_metrics: Callable[[], dict]) -> Starlette:
+    """HTTP-приложение: прием обновлений Telegram, health check и метрики.
+
+    /metrics отдает метрики в формате Prometheus, /stats - внутренние счетчики в JSON.
+    """
+
+    async def telegram_webhook(request: Request) -> Response:
+        # Telegram передает секрет из setWebhook в заголовке каждого запроса
+        secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(secret, Config.WEBHOOK_SECRET):
+            logger.warning("⚠️ Запрос к webhook с неверным секретом")
+            return Response(status_code=403)
+
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logger.error(f"❌ Некорректное обновление в webhook: {e}")
+            return Response(status_code=400)
+
+        # Обработка идет в фоне, Telegram сразу получает ответ
+        await application.update_queue.put(update)
+        return Response()
+
+    async def health_check(request: Request) -> Response:
+        return JSONResponse({"status": "healthy", "message": "Telegram bot is running"})
+
+    async def detailed_health(request: Request) -> Response:
+        if not await adb.ping():
+            return JSONResponse({"status": "degraded", "database": "unavailable"}, status_code=503)
+        return JSONResponse({"status": "ok"})
+
+    async def prometheus_metrics(request: Request) -> Response:
+        body, content_type = metrics.render()
+        return Response(body, media_type=content_type)
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse({"update_queue": application.update_queue.qsize(), **get_metrics()})
+
+    routes = [
+        Route("/", health_check, methods=["GET"]),
+        Route("/health", detailed_health, methods=["GET"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"]),
+        Route("/stats", stats, methods=["GET"]),
+    ]
+    if Config.WEBHOOK_URL:
+        routes.append(Route(Config.WEBHOOK_PATH, telegram_webhook, methods=["POST"]))
+    return Starlette(routes=routes)
+
+
+async def serve(application: Application, get_metrics: Callable[[], dict]):
+    """Запускает бота и HTTP-сервер в одном event loop.
+
+    С WEBHOOK_URL обновления приходят через webhook, без него - через polling
+    (HTTP-сервер с health check и метриками работает в обоих режимах).
+    """
+    server = uvicorn.Server(uvicorn.Config(
+        create_web_app(application, get_metrics),
+        host=Config.WEBHOOK_LISTEN,
+        port=Config.PORT,
+        log_level="warning",
+    ))
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+        if Config.WEBHOOK_URL:
+            webhook_url = Config.WEBHOOK_URL.rstrip("/") + Config.WEBHOOK_PATH
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=Config.WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"✅ Webhook установлен: {webhook_url}")
+        else:
+            # Webhook, оставшийся от прошлого запуска, не дает работать polling
+            await application.bot.delete_webhook()
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            logger.info("✅ Бот получает обновления через polling")
+
+        try:
+            logger.info(f"🌐 HTTP-сервер слушает порт {Config.PORT}")
+            await server.serve()
+        finally:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            if application.post_shutdown:
+                await application.post_shutdown(application)